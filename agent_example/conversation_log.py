@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话历史后端
+可插拔的对话历史存储：默认的内存后端只保留最近的记录；持久化后端把记录以NDJSON追加写入
+分段日志文件，后台线程成组提交（一次fsync覆盖一批记录），并定期清理过期分段、合并小分段。
+历史查询通过mmap逐行扫描日志文件，不把历史读入内存
+
+用法：
+    python conversation_log.py query <日志目录> [--agent ID] [--contains 文本] [--since 秒] [--limit N]
+    python conversation_log.py stats <日志目录>
+    python conversation_log.py compact <日志目录>
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+SEGMENT_SUFFIX = '.ndjson'
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str)
+            + '\n').encode('utf-8')
+
+
+def _matches(record: Dict[str, Any], since: Optional[float], until: Optional[float],
+             agent_id: Optional[str], contains: Optional[str]) -> bool:
+    ts = record.get("ts", 0)
+    if since is not None and ts < since:
+        return False
+    if until is not None and ts > until:
+        return False
+    if agent_id is not None and agent_id not in (record.get("agent_id"), record.get("pool_id")):
+        return False
+    if contains is not None:
+        values = list(record.values())
+        values.extend(v for value in record.values() if isinstance(value, dict) for v in value.values())
+        if not any(isinstance(value, str) and contains in value for value in values):
+            return False
+    return True
+
+
+class HistoryBackend(ABC):
+    """对话历史后端基类
+
+    记录为可JSON序列化的字典，append 时自动加上时间戳 "ts"（秒）。
+    recent 返回内存中保留的最近记录（按 agent_id 分别保留 keep_recent 条），
+    query 按时间、Agent与文本查询全部可用的历史；agent_id 为Agent池的ID时匹配池中所有实例的记录。
+    """
+
+    def __init__(self, keep_recent: int = 100):
+        self.keep_recent = keep_recent
+        self._recent: Dict[Optional[str], deque] = {}
+        self._recent_lock = threading.Lock()
+
+    def _remember(self, record: Dict[str, Any]):
+        agent_id = record.get("agent_id")
+        with self._recent_lock:
+            buffer = self._recent.get(agent_id)
+            if buffer is None:
+                buffer = self._recent[agent_id] = deque(maxlen=self.keep_recent)
+            buffer.append(record)
+
+    def recent(self, agent_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近的记录，按时间先后排列"""
+        with self._recent_lock:
+            records = list(self._recent.get(agent_id, ()))
+        return records[-limit:] if limit else records
+
+    @abstractmethod
+    def append(self, record: Dict[str, Any]) -> None:
+        """追加一条记录"""
+        pass
+
+    @abstractmethod
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              agent_id: Optional[str] = None, contains: Optional[str] = None,
+              limit: Optional[int] = None, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        """查询历史记录"""
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryHistory(HistoryBackend):
+    """内存后端：只保留每个Agent最近的记录，进程退出后丢失"""
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._remember({"ts": time.time(), **record})
+
+    def query(self, since=None, until=None, agent_id=None, contains=None,
+              limit=None, newest_first=False):
+        with self._recent_lock:
+            records = sorted((r for buffer in self._recent.values() for r in buffer),
+                             key=lambda r: r["ts"], reverse=newest_first)
+        count = 0
+        for record in records:
+            if limit is not None and count >= limit:
+                return
+            if _matches(record, since, until, agent_id, contains):
+                count += 1
+                yield record
+
+
+class HistoryReader:
+    """通过mmap查询分段日志
+
+    段文件名以段内第一条记录的时间（毫秒）开头，段内记录不早于该时间、不晚于下一段的开始时间，
+    按时间查询时可以跳过整段；Agent与文本条件先在原始字节上筛选，命中的行才解析JSON。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def segments(self) -> List[str]:
+        """按时间先后排列的段文件名"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith(SEGMENT_SUFFIX))
+
+    @staticmethod
+    def segment_start(name: str) -> float:
+        return int(name.split('-', 1)[0]) / 1000
+
+    def open_segments(self, names: Optional[List[str]] = None) -> List[Any]:
+        """映射段文件，返回 [(段名, mmap)]；空文件与已被删除的段跳过"""
+        mapped = []
+        for name in names if names is not None else self.segments():
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        continue
+                    mapped.append((name, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+            except FileNotFoundError:
+                continue
+        return mapped
+
+    def query(self, since=None, until=None, agent_id=None, contains=None,
+              limit=None, newest_first=False, mapped=None):
+        """按条件查询记录；mapped 为调用方已映射的段（保证与合并操作一致的快照）"""
+        if mapped is None:
+            mapped = self.open_segments()
+        needles = []
+        if agent_id is not None:
+            # 按带引号的字符串值预筛：Agent池的ID出现在 pool_id 而不是 agent_id 中
+            needles.append(json.dumps(agent_id, ensure_ascii=False).encode('utf-8'))
+        if contains is not None:
+            # 与写入时相同的转义方式，匹配JSON文本中的字符串
+            needles.append(json.dumps(contains, ensure_ascii=False)[1:-1].encode('utf-8'))
+
+        order = list(range(len(mapped)))
+        if newest_first:
+            order.reverse()
+        count = 0
+        try:
+            for i in order:
+                name, data = mapped[i]
+                start = self.segment_start(name)
+                end = self.segment_start(mapped[i + 1][0]) if i + 1 < len(mapped) else None
+                if until is not None and start > until:
+                    continue
+                # 文件名精确到毫秒，留出1毫秒余量
+                if since is not None and end is not None and end + 0.001 < since:
+                    continue
+                for line in self._lines(data, newest_first):
+                    if any(needle not in line for needle in needles):
+                        continue
+                    record = json.loads(line)
+                    if _matches(record, since, until, agent_id, contains):
+                        yield record
+                        count += 1
+                        if limit is not None and count >= limit:
+                            return
+        finally:
+            for _, data in mapped:
+                data.close()
+
+    @staticmethod
+    def _lines(data, reverse=False) -> Iterator[bytes]:
+        """逐行产出完整的行；末尾没有换行的行可能正在写入，跳过"""
+        end = data.rfind(b'\n') + 1
+        if not reverse:
+            position = 0
+            while position < end:
+                newline = data.find(b'\n', position, end)
+                yield data[position:newline]
+                position = newline + 1
+        else:
+            position = end - 1
+            while position > 0:
+                start = data.rfind(b'\n', 0, position) + 1
+                yield data[start:position]
+                position = start - 1
+
+    def stats(self) -> Dict[str, Any]:
+        names = self.segments()
+        sizes = []
+        for name in names:
+            try:
+                sizes.append(os.path.getsize(os.path.join(self.directory, name)))
+            except FileNotFoundError:
+                pass
+        return {
+            "segments": len(sizes),
+            "bytes": sum(sizes),
+            "oldest": self.segment_start(names[0]) if names else None,
+            "newest": self.segment_start(names[-1]) if names else None
+        }
+
+
+class SegmentedLogHistory(HistoryBackend):
+    """持久化后端：NDJSON分段日志，成组提交，后台清理与合并
+
+    append 只把编码后的记录放入缓冲区并立即返回；写入线程每隔 commit_interval 秒把缓冲区
+    一次写入当前段并fsync，高并发时一次fsync覆盖许多条记录。需要确认落盘时调用 sync。
+    当前段超过 segment_bytes 后切换到新段。维护线程每隔 maintenance_interval 秒执行 maintain：
+    删除超过 retention_seconds 的段、总大小超过 retention_bytes 时从最旧的段开始删除，
+    再把相邻的小段合并为一个段。同一目录同一时间只应有一个写入进程。
+    写入或fsync出错（磁盘满、目录被删除等）后写入线程停止，未落盘的记录丢弃，
+    之后的 append 与等待这些记录的 sync 抛出 RuntimeError（__cause__ 为原始的 OSError）。
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 commit_interval: float = 0.05, keep_recent: int = 100,
+                 retention_seconds: Optional[float] = None, retention_bytes: Optional[int] = None,
+                 maintenance_interval: Optional[float] = 60, fsync: bool = True):
+        super().__init__(keep_recent)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.retention_seconds = retention_seconds
+        self.retention_bytes = retention_bytes
+        self.fsync = fsync
+        self.reader = HistoryReader(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[Any] = []  # [(时间戳, 编码后的行)]
+        self._appended = 0
+        self._committed = 0
+        self._closing = False
+        self._error: Optional[OSError] = None  # 写入线程遇到的错误，出错后不再接受追加
+        # 段列表的变更（切换、删除、合并）与查询时的映射互斥，查询看到一致的段集合
+        self._segments_lock = threading.Lock()
+        self._sequence = 0
+        self._instance = os.urandom(3).hex()  # 同一进程中的多个实例写同一目录时段名也不会重复
+        self._file = None
+        self._current = None  # 当前段在第一次写入时创建，空段不会留下文件
+        self.stats = {"records": 0, "commits": 0, "bytes": 0, "compactions": 0, "deleted_segments": 0}
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        self._maintenance_stop = threading.Event()
+        self._maintainer = None
+        if maintenance_interval:
+            self._maintainer = threading.Thread(target=self._maintenance_loop, args=(maintenance_interval,),
+                                                name="history-maintenance", daemon=True)
+            self._maintainer.start()
+
+    def _open_segment(self, first_ts: float):
+        """以第一条记录的时间命名并创建新段"""
+        with self._segments_lock:
+            self._sequence += 1
+            # 文件名按时间排序：不早于已有的段
+            existing = self.reader.segments()
+            start_ms = int(first_ts * 1000)
+            if existing:
+                start_ms = max(start_ms, int(existing[-1].split('-', 1)[0]))
+            self._current = (f"{start_ms:013d}-{os.getpid()}-{self._instance}-{self._sequence:06d}"
+                             f"{SEGMENT_SUFFIX}")
+            self._file = open(os.path.join(self.directory, self._current), 'ab')
+
+    def _seal_segment(self):
+        with self._segments_lock:
+            self._file.close()
+            self._file = None
+            self._current = None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        record = {"ts": time.time(), **record}
+        line = _encode(record)
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("对话历史已关闭")
+            self._check_writer()
+            self._pending.append((record["ts"], line))
+            self._appended += 1
+            self._cond.notify()
+        self._remember(record)
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """等待调用前追加的记录全部落盘，返回是否在超时前完成；写入线程出错时抛出 RuntimeError"""
+        with self._cond:
+            target = self._appended
+            if self._cond.wait_for(lambda: self._committed >= target or self._error is not None, timeout):
+                if self._committed < target:
+                    self._check_writer()
+                return True
+            return False
+
+    def _check_writer(self):
+        """调用方需持有 _cond"""
+        if self._error is not None:
+            raise RuntimeError(f"对话历史写入失败: {self._error}") from self._error
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing)
+                if not self._pending and self._closing:
+                    return
+                closing = self._closing
+            if not closing and self.commit_interval:
+                # 等待一个提交间隔，让并发的追加合并到同一次写入和fsync
+                time.sleep(self.commit_interval)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                target = self._appended
+            data = b''.join(line for _, line in batch)
+            try:
+                if self._file is None:
+                    self._open_segment(batch[0][0])
+                self._file.write(data)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                self._fail(e)
+                return
+            with self._cond:
+                self._committed = target
+                self.stats["records"] += len(batch)
+                self.stats["commits"] += 1
+                self.stats["bytes"] += len(data)
+                self._cond.notify_all()
+            if self._file.tell() >= self.segment_bytes:
+                self._seal_segment()
+
+    def _fail(self, error: OSError):
+        """写入失败：丢弃未落盘的记录，唤醒所有等待的 sync，之后的追加直接报错
+
+        出错的批次可能只写入了一部分，继续写会在段中留下不完整的行，因此不再重试。
+        """
+        print(f"对话历史写入出错，停止写入: {error}")
+        with self._cond:
+            self._error = error
+            self._pending = []
+            self._cond.notify_all()
+        with self._segments_lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                self._file = None
+                self._current = None
+
+    def _maintenance_loop(self, interval: float):
+        while not self._maintenance_stop.wait(interval):
+            try:
+                self.maintain()
+            except OSError as e:
+                print(f"对话历史维护出错: {e}")
+
+    def _sealed_segments(self) -> List[str]:
+        return [name for name in self.reader.segments() if name != self._current]
+
+    def maintain(self) -> Dict[str, int]:
+        """执行一次清理与合并，返回删除与合并的段数"""
+        deleted = self._apply_retention()
+        merged = self.compact()
+        return {"deleted": deleted, "merged": merged}
+
+    def _apply_retention(self) -> int:
+        deleted = 0
+        with self._segments_lock:
+            sealed = self._sealed_segments()
+            paths = {name: os.path.join(self.directory, name) for name in sealed}
+            if self.retention_seconds is not None:
+                cutoff = time.time() - self.retention_seconds
+                for name in list(sealed):
+                    # 段文件的修改时间即其中最新记录的写入时间
+                    if os.path.getmtime(paths[name]) < cutoff:
+                        os.remove(paths[name])
+                        sealed.remove(name)
+                        deleted += 1
+            if self.retention_bytes is not None:
+                total = sum(os.path.getsize(os.path.join(self.directory, name))
+                            for name in self.reader.segments())
+                for name in list(sealed):
+                    if total <= self.retention_bytes:
+                        break
+                    total -= os.path.getsize(paths[name])
+                    os.remove(paths[name])
+                    sealed.remove(name)
+                    deleted += 1
+        self.stats["deleted_segments"] += deleted
+        return deleted
+
+    def compact(self) -> int:
+        """把相邻的小段（小于 segment_bytes 的四分之一）合并，返回被合并掉的段数
+
+        合并按字节拼接，不重新编码；合并结果沿用第一段的文件名，保持时间顺序，
+        修改时间设为组内最新的段的修改时间，按时间清理时仍以其中最新的记录为准。
+        """
+        small = self.segment_bytes // 4
+        sealed = self._sealed_segments()
+        sizes = {name: os.path.getsize(os.path.join(self.directory, name)) for name in sealed}
+        groups, group, group_size = [], [], 0
+        for name in sealed:
+            size = sizes[name]
+            if size < small and group_size + size <= self.segment_bytes:
+                group.append(name)
+                group_size += size
+                continue
+            if len(group) > 1:
+                groups.append(group)
+            group, group_size = ([name], size) if size < small else ([], 0)
+        if len(group) > 1:
+            groups.append(group)
+
+        merged = 0
+        for group in groups:
+            target = os.path.join(self.directory, group[0])
+            temp_path = target + '.compact'
+            newest = max(os.stat(os.path.join(self.directory, name)).st_mtime_ns for name in group)
+            with open(temp_path, 'wb') as out:
+                for name in group:
+                    with open(os.path.join(self.directory, name), 'rb') as src:
+                        while True:
+                            chunk = src.read(1024 * 1024)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.utime(temp_path, ns=(newest, newest))
+            with self._segments_lock:
+                os.replace(temp_path, target)
+                for name in group[1:]:
+                    os.remove(os.path.join(self.directory, name))
+            merged += len(group) - 1
+        if merged:
+            self.stats["compactions"] += 1
+        return merged
+
+    def query(self, since=None, until=None, agent_id=None, contains=None,
+              limit=None, newest_first=False):
+        """查询已落盘的历史（尚在缓冲区中的记录在下一次提交后可见）"""
+        with self._segments_lock:
+            mapped = self.reader.open_segments()
+        return self.reader.query(since, until, agent_id, contains, limit, newest_first, mapped)
+
+    def close(self):
+        """写入剩余的记录并停止后台线程"""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._maintenance_stop.set()
+        if self._maintainer is not None:
+            self._maintainer.join()
+        if self._file is not None:
+            self._seal_segment()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对话历史日志工具')
+    parser.add_argument('command', choices=['query', 'stats', 'compact'])
+    parser.add_argument('directory', help='日志目录')
+    parser.add_argument('--agent', help='只查询指定Agent的记录')
+    parser.add_argument('--contains', help='记录中包含的文本')
+    parser.add_argument('--since', type=float, help='只查询最近多少秒内的记录')
+    parser.add_argument('--limit', type=int, default=20, help='最多输出条数（默认20）')
+    args = parser.parse_args()
+
+    reader = HistoryReader(args.directory)
+    if args.command == 'stats':
+        print(json.dumps(reader.stats(), ensure_ascii=False, indent=2))
+    elif args.command == 'compact':
+        log = SegmentedLogHistory(args.directory, maintenance_interval=None)
+        try:
+            print(f"合并了 {log.compact()} 个段")
+        finally:
+            log.close()
+    else:
+        since = time.time() - args.since if args.since else None
+        for record in reader.query(since=since, agent_id=args.agent, contains=args.contains,
+                                   limit=args.limit, newest_first=True):
+            print(json.dumps(record, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
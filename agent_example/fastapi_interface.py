@@ -18,6 +18,7 @@ from typing import Dict, Any
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from text_analyzer import SmartAgent
+from conversation_log import SegmentedLogHistory
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -26,8 +27,9 @@ app = FastAPI(
     version="2.0.0"
 )
 
-# 初始化Agent
-agent = SmartAgent()
+# 初始化Agent；设置 AGENT_HISTORY_DIR 后对话历史持久化到该目录的分段日志中
+HISTORY_DIR = os.environ.get("AGENT_HISTORY_DIR")
+agent = SmartAgent(history=SegmentedLogHistory(HISTORY_DIR) if HISTORY_DIR else None)
 
 # 请求模型
 class TextRequest(BaseModel):
@@ -576,6 +578,11 @@ async def health_check():
         "framework": "FastAPI"
     }
 
+@app.on_event("shutdown")
+def close_history():
+    """写入尚未落盘的对话历史"""
+    agent.history.close()
+
 @app.get("/api/docs")
 async def get_api_docs():
     """API文档重定向"""
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+词典模糊匹配索引
+SymSpell式删除字典：建索引时为每个词条生成删去至多 k 个字的所有变体，查询时同样生成查询词的
+删除变体并查表，只对命中的少量候选计算编辑距离，不需要逐条扫描词典。
+十万条成语、k=1 时单次查询在微秒级
+
+用法：
+    python fuzzy_index.py <词典文件> <查询>...   # 词典每行一条
+"""
+
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+@dataclass
+class FuzzyMatch:
+    """模糊匹配结果：词条、编辑距离与建索引时附带的值（如类别）"""
+    entry: str
+    distance: int
+    value: Any = None
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """删去至多 max_distance 个字得到的全部变体（含原词）"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """编辑距离（相邻字互换算一次），超过 max_distance 时返回 max_distance + 1"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class FuzzyIndex:
+    """编辑距离不超过 max_distance 的近似查找索引
+
+    短于 min_length 的词条与查询只做精确匹配（两个字的词差一个字就是另一个词）。
+    距离相同时优先较长的词条，再按加入顺序，因此先加入的词典优先。
+    """
+
+    def __init__(self, max_distance: int = 1, min_length: int = 3):
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.entries: List[str] = []
+        self.values: List[Any] = []
+        self.ids: Dict[str, int] = {}
+        self.deletes: Dict[str, List[int]] = {}
+        self.lengths: Set[int] = set()
+
+    def add(self, entry: str, value: Any = None):
+        """加入词条，重复的词条保留第一次加入的值"""
+        if not entry or entry in self.ids:
+            return
+        i = len(self.entries)
+        self.ids[entry] = i
+        self.entries.append(entry)
+        self.values.append(value)
+        self.lengths.add(len(entry))
+        if len(entry) >= self.min_length:
+            for variant in _deletes(entry, self.max_distance):
+                self.deletes.setdefault(variant, []).append(i)
+
+    def update(self, entries: Iterable[str], value: Any = None):
+        for entry in entries:
+            self.add(entry, value)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, entry: str) -> bool:
+        return entry in self.ids
+
+    def _better(self, distance: int, i: int, best: Optional[tuple]) -> bool:
+        return best is None or (distance, -len(self.entries[i]), i) < best
+
+    def lookup(self, term: str, max_distance: Optional[int] = None) -> Optional[FuzzyMatch]:
+        """与 term 编辑距离最小的词条，没有距离不超过 max_distance 的词条时返回None"""
+        k = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if term in self.ids:
+            i = self.ids[term]
+            return FuzzyMatch(term, 0, self.values[i])
+        if k == 0 or len(term) < self.min_length:
+            return None
+        best = None
+        for i in self._candidates(term, k):
+            distance = edit_distance(term, self.entries[i], k)
+            if distance <= k and self._better(distance, i, best):
+                best = (distance, -len(self.entries[i]), i)
+        if best is None:
+            return None
+        return FuzzyMatch(self.entries[best[2]], best[0], self.values[best[2]])
+
+    def _candidates(self, term: str, k: int) -> Set[int]:
+        candidates = set()
+        deletes = self.deletes
+        for variant in _deletes(term, k):
+            ids = deletes.get(variant)
+            if ids:
+                candidates.update(ids)
+        return candidates
+
+    def contained(self, text: str) -> List[FuzzyMatch]:
+        """text 中包含的全部词条（精确匹配），较长的在前，长度相同时按加入顺序"""
+        found = set()
+        for length in self.lengths:
+            for start in range(len(text) - length + 1):
+                i = self.ids.get(text[start:start + length])
+                if i is not None:
+                    found.add(i)
+        return [FuzzyMatch(self.entries[i], 0, self.values[i])
+                for i in sorted(found, key=lambda i: (-len(self.entries[i]), i))]
+
+    def search(self, text: str, max_distance: Optional[int] = None,
+               max_text_length: int = 32) -> Optional[FuzzyMatch]:
+        """在 text 的所有子串中找与某个词条最接近的一处（如句子中写错的成语）
+
+        max_distance 为0时只找包含的词条（精确匹配，不受 max_text_length 限制）。
+        只检查长度与词条相差不超过 k 的子串；超过 max_text_length 的长文本不做模糊匹配。
+        """
+        k = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if (k and len(text) > max_text_length) or not self.entries:
+            return None
+        widths = sorted({length + d for length in self.lengths for d in range(-k, k + 1)
+                         if 0 < length + d <= len(text)}, reverse=True)
+        best = None
+        for width in widths:
+            for start in range(len(text) - width + 1):
+                match = self.lookup(text[start:start + width], k)
+                if match is None:
+                    continue
+                i = self.ids[match.entry]
+                if self._better(match.distance, i, best):
+                    best = (match.distance, -len(match.entry), i)
+        if best is None:
+            return None
+        return FuzzyMatch(self.entries[best[2]], best[0], self.values[best[2]])
+
+
+def load_lexicon(path: str) -> List[str]:
+    """读取词典文件：每行一条，忽略空行与 # 开头的注释"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return 1
+    started = time.perf_counter()
+    index = FuzzyIndex()
+    index.update(load_lexicon(sys.argv[1]))
+    print(f"{len(index)} 条词条，{len(index.deletes)} 个删除变体，"
+          f"建索引 {time.perf_counter() - started:.2f} 秒")
+    for query in sys.argv[2:]:
+        started = time.perf_counter()
+        match = index.search(query)
+        elapsed = (time.perf_counter() - started) * 1e6
+        result = f"{match.entry}（距离 {match.distance}）" if match else "无匹配"
+        print(f"{query}\t{result}\t{elapsed:.0f} 微秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,18 +6,25 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
+import asyncio
 import json
-import re
+import time
 from datetime import datetime
 
+from conversation_log import HistoryBackend, MemoryHistory
+from fuzzy_index import FuzzyIndex, load_lexicon
+from related_index import RelatedIndex
+from segmenter import Segmenter
+
 class AgentType(Enum):
     """Agent类型枚举"""
     TEXT_ANALYZER = "text_analyzer"
     CHAT_BOT = "chat_bot"
     DATA_PROCESSOR = "data_processor"
+    CLASSIFIER = "classifier"
 
 class ResponseStatus(Enum):
     """响应状态枚举"""
@@ -25,6 +32,16 @@ class ResponseStatus(Enum):
     ERROR = "error"
     PENDING = "pending"
 
+class DispatchStrategy(Enum):
+    """Agent池的分发策略"""
+    LEAST_LOADED = "least_loaded"  # 分给在途请求最少的实例，相同时轮转
+    ROUND_ROBIN = "round_robin"    # 依次轮转
+
+class MergePolicy(Enum):
+    """多Agent结果合并策略"""
+    HIGHEST_CONFIDENCE = "highest_confidence"  # 取置信度最高的结果
+    FIRST_LISTED = "first_listed"              # 按Agent列表顺序取第一个成功的结果
+
 @dataclass
 class AgentMessage:
     """Agent消息数据结构"""
@@ -42,12 +59,21 @@ class AgentResponse:
     suggestions: List[str] = field(default_factory=list)
 
 class BaseAgent(ABC):
-    """Agent基类"""
+    """Agent基类
+    
+    process 中没有 await、整段都在计算的Agent应把 blocking 设为True，由 run 放到线程中执行：
+    在事件循环中直接执行会阻塞其他Agent，期限也无法生效。
+    """
     
-    def __init__(self, agent_id: str, agent_type: AgentType):
+    blocking = False
+    
+    def __init__(self, agent_id: str, agent_type: AgentType,
+                 history: Optional[HistoryBackend] = None):
         self.agent_id = agent_id
         self.agent_type = agent_type
-        self.conversation_history: List[AgentMessage] = []
+        self.pool_id: Optional[str] = None  # 作为Agent池的实例时为池的ID
+        # 对话历史后端，默认只在内存中保留最近100条；可换成 SegmentedLogHistory 持久化
+        self.history: HistoryBackend = history or MemoryHistory(keep_recent=100)
         self.stats = {
             "total_requests": 0,
             "successful_responses": 0,
@@ -60,11 +86,41 @@ class BaseAgent(ABC):
         """处理消息的核心方法"""
         pass
     
+    async def run(self, message: AgentMessage) -> AgentResponse:
+        """在事件循环中调用 process；blocking 的Agent在线程中执行
+        
+        线程中的计算无法被中途取消：超时后调用方不再等待，计算仍会执行完。
+        """
+        if self.blocking:
+            return await asyncio.to_thread(asyncio.run, self.process(message))
+        return await self.process(message)
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        """本Agent最近的对话记录"""
+        return self.history.recent(self.agent_id)
+    
+    def query_history(self, since: Optional[float] = None, contains: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """查询本Agent的对话历史，最新的在前"""
+        return list(self.history.query(since=since, agent_id=self.agent_id, contains=contains,
+                                       limit=limit, newest_first=True))
+    
+    def set_history(self, history: HistoryBackend):
+        """更换对话历史后端"""
+        self.history = history
+    
     def add_to_history(self, message: AgentMessage):
-        """添加到对话历史"""
-        self.conversation_history.append(message)
-        if len(self.conversation_history) > 100:  # 限制历史记录大小
-            self.conversation_history.pop(0)
+        """添加到对话历史；池中的实例记录带上 "pool_id"，可以按池的ID查询"""
+        record = {
+            "agent_id": self.agent_id,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat(),
+            "metadata": message.metadata
+        }
+        if self.pool_id is not None:
+            record["pool_id"] = self.pool_id
+        self.history.append(record)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取Agent统计信息"""
@@ -96,12 +152,38 @@ class TextCategory(Enum):
     UNKNOWN = "未知"
 
 class SimpleTextAgent(BaseAgent):
-    """简单的文本分析Agent"""
+    """简单的文本分析Agent
     
-    def __init__(self, agent_id: str = "text_analyzer_001"):
+    lexicon_files 为 {类别: 词典文件} 的附加词典（每行一条）；成语与歇后语在加载时建立模糊匹配索引，
+    写错不超过 max_edit_distance 个字时仍能识别，置信度按编辑距离降低。
+    每个请求先分词一次，名词、疑问句、命令句的规则都在词上判断（“电脑桌”不算名词“电脑”）。
+    related_index_path 为 related_index.py 离线生成的相关词条索引；未指定时第一次生成建议前按当前词典计算。
+    """
+    
+    def __init__(self, agent_id: str = "text_analyzer_001",
+                 lexicon_files: Optional[Dict[TextCategory, str]] = None,
+                 max_edit_distance: int = 1,
+                 related_index_path: Optional[str] = None):
         super().__init__(agent_id, AgentType.TEXT_ANALYZER)
+        self.lexicon_files = lexicon_files or {}
+        self.max_edit_distance = max_edit_distance
+        self.related_index_path = related_index_path
+        self._related_index: Optional[RelatedIndex] = None
         self._load_patterns()
     
+    @property
+    def related_index(self) -> RelatedIndex:
+        """成语、歇后语的相关词条索引"""
+        if self._related_index is None:
+            if self.related_index_path:
+                self._related_index = RelatedIndex.load(self.related_index_path)
+            else:
+                self._related_index = RelatedIndex.build({
+                    category.value: self.patterns[category]
+                    for category in (TextCategory.IDIOM, TextCategory.XIEHOUYU)
+                })
+        return self._related_index
+    
     def _load_patterns(self):
         """加载文本模式"""
         self.patterns = {
@@ -116,12 +198,27 @@ class SimpleTextAgent(BaseAgent):
                 "电脑", "手机", "汽车", "房子", "学校", "公司", "朋友", "家人"
             ]
         }
+        for category, path in self.lexicon_files.items():
+            self.patterns[category] = list(dict.fromkeys(self.patterns[category] + load_lexicon(path)))
+        
+        # 模糊匹配索引，成语优先于歇后语
+        self.fuzzy_index = FuzzyIndex(max_distance=self.max_edit_distance)
+        self.fuzzy_index.update(self.patterns[TextCategory.IDIOM], TextCategory.IDIOM)
+        self.fuzzy_index.update(self.patterns[TextCategory.XIEHOUYU], TextCategory.XIEHOUYU)
         
-        # 正则表达式模式
-        self.regex_patterns = {
-            TextCategory.QUESTION: r'.*\?|.*？|什么|怎么|为什么|如何',
-            TextCategory.COMMAND: r'请|帮我|给我|需要|应该|必须'
+        # 疑问句、命令句的关键词，按分词结果匹配
+        self.keywords = {
+            TextCategory.QUESTION: {"?", "？", "什么", "怎么", "怎么样", "什么样", "为什么", "如何"},
+            TextCategory.COMMAND: {"请", "帮我", "给我", "需要", "应该", "必须"}
         }
+        self.nouns = set(self.patterns[TextCategory.NOUN])
+        
+        # 分词词典：内置常用词加上本Agent的全部词条
+        self.segmenter = Segmenter()
+        for category, entries in self.patterns.items():
+            self.segmenter.add_words(entries)
+        for words in self.keywords.values():
+            self.segmenter.add_words(word for word in words if len(word) > 1)
     
     async def process(self, message: AgentMessage) -> AgentResponse:
         """处理文本分析请求"""
@@ -140,19 +237,32 @@ class SimpleTextAgent(BaseAgent):
                 return response
             
             # 分析文本
-            category, confidence = self._analyze_text(text)
-            suggestions = self._generate_suggestions(text, category)
-            explanation = self._generate_explanation(text, category, confidence)
+            tokens = self.segmenter.cut(text)
+            category, confidence, matched = self._analyze_text(text, tokens)
+            corrected = matched is not None and matched not in text
+            # 句子中包含的名词：建议与解释围绕名词本身
+            partial_noun = category == TextCategory.NOUN and matched != text
+            subject = matched if corrected or partial_noun else text
+            suggestions = self._generate_suggestions(subject, category, matched)
+            explanation = self._generate_explanation(subject, category, confidence)
+            if corrected:
+                explanation = f"'{text}'可能是'{matched}'的误写。" + explanation
+            elif partial_noun:
+                explanation = f"'{text}'中包含名词'{matched}'。" + explanation
             
+            metadata = {
+                "original_text": text,
+                "category": category.value,
+                "text_length": len(text),
+                "tokens": list(tokens)
+            }
+            if matched is not None:
+                metadata["matched_entry"] = matched
             response = AgentResponse(
                 content=explanation,
                 status=ResponseStatus.SUCCESS,
                 confidence=confidence,
-                metadata={
-                    "original_text": text,
-                    "category": category.value,
-                    "text_length": len(text)
-                },
+                metadata=metadata,
                 suggestions=suggestions
             )
             
@@ -169,51 +279,62 @@ class SimpleTextAgent(BaseAgent):
                 suggestions=["请稍后重试", "检查输入内容格式"]
             )
     
-    def _analyze_text(self, text: str) -> Tuple[TextCategory, float]:
-        """分析文本类别"""
+    def _analyze_text(self, text: str,
+                      tokens: Optional[Tuple[str, ...]] = None) -> Tuple[TextCategory, float, Optional[str]]:
+        """分析文本类别，返回（类别，置信度，匹配到的词条）；tokens 为已有的分词结果"""
         text = text.strip()
+        if tokens is None:
+            tokens = self.segmenter.cut(text)
         
-        # 检查成语
-        for idiom in self.patterns[TextCategory.IDIOM]:
-            if idiom in text:
-                return TextCategory.IDIOM, 0.95
+        # 检查成语、歇后语：在索引中查找文本的子串，不逐条扫描词典；成语优先于歇后语，
+        # 同一类别包含多个词条时取最长的
+        matches = self.fuzzy_index.contained(text)
+        for category, confidence in ((TextCategory.IDIOM, 0.95), (TextCategory.XIEHOUYU, 0.90)):
+            for match in matches:
+                if match.value == category:
+                    return category, confidence, match.entry
         
-        # 检查歇后语
-        for xiehouyu in self.patterns[TextCategory.XIEHOUYU]:
-            if xiehouyu in text:
-                return TextCategory.XIEHOUYU, 0.90
+        # 检查名词：整段文本就是名词时置信度更高
+        for token in tokens:
+            if token in self.nouns:
+                return TextCategory.NOUN, 0.85 if token == text else 0.75, token
         
-        # 检查名词
-        for noun in self.patterns[TextCategory.NOUN]:
-            if noun in text:
-                return TextCategory.NOUN, 0.85
+        # 模糊匹配成语、歇后语：置信度按错字占词条的比例降低
+        match = self.fuzzy_index.search(text)
+        if match is not None:
+            base = 0.95 if match.value == TextCategory.IDIOM else 0.90
+            return match.value, round(base * (1 - match.distance / (len(match.entry) + 1)), 2), match.entry
         
         # 检查疑问句
-        if re.search(self.regex_patterns[TextCategory.QUESTION], text, re.IGNORECASE):
-            return TextCategory.QUESTION, 0.80
+        if not self.keywords[TextCategory.QUESTION].isdisjoint(tokens):
+            return TextCategory.QUESTION, 0.80, None
         
         # 检查命令句
-        if re.search(self.regex_patterns[TextCategory.COMMAND], text, re.IGNORECASE):
-            return TextCategory.COMMAND, 0.75
+        if not self.keywords[TextCategory.COMMAND].isdisjoint(tokens):
+            return TextCategory.COMMAND, 0.75, None
         
         # 检查是否为常规句子
         if len(text) > 5 and any(p in text for p in '，。！？；：'):
-            return TextCategory.REGULAR_SENTENCE, 0.70
+            return TextCategory.REGULAR_SENTENCE, 0.70, None
         
-        return TextCategory.UNKNOWN, 0.50
+        return TextCategory.UNKNOWN, 0.50, None
     
-    def _generate_suggestions(self, text: str, category: TextCategory) -> List[str]:
-        """生成建议"""
+    def _generate_suggestions(self, text: str, category: TextCategory,
+                              entry: Optional[str] = None) -> List[str]:
+        """生成建议；entry 为匹配到的词条，成语、歇后语的建议中列出索引里与它相关的词条"""
+        related = []
+        if entry and category in (TextCategory.IDIOM, TextCategory.XIEHOUYU):
+            related = self.related_index.related(category.value, entry, limit=3)
         suggestions_map = {
             TextCategory.IDIOM: [
                 f"{text}的出处和典故",
-                f"与{text}意思相近的成语",
+                f"与{entry}相关的成语：{'、'.join(related)}" if related else f"与{text}意思相近的成语",
                 f"{text}的英文翻译"
             ],
             TextCategory.XIEHOUYU: [
                 f"{text}的下半句是什么？",
                 f"{text}的寓意和启示",
-                f"类似{text}的歇后语"
+                f"类似{entry}的歇后语：{'、'.join(related)}" if related else f"类似{text}的歇后语"
             ],
             TextCategory.NOUN: [
                 f"关于{text}的详细介绍",
@@ -259,11 +380,106 @@ class SimpleTextAgent(BaseAgent):
         base_explanation = explanations.get(category, "文本分析完成")
         return f"{base_explanation} (置信度: {confidence:.1%})"
 
+class AgentPool(BaseAgent):
+    """同一Agent ID下的一组实例
+    
+    每个实例有各自的统计与对话历史，请求之间不共享可变状态；池只在事件循环线程中
+    维护每个实例的在途请求数，统计在查询时才汇总，处理请求时没有额外的争用。
+    实例为 blocking 或把计算放到进程中执行时，多个请求可以真正并行。
+    """
+    
+    def __init__(self, agent_id: str, factory: Callable[[str], BaseAgent], size: int = 4,
+                 strategy: DispatchStrategy = DispatchStrategy.LEAST_LOADED):
+        if size < 1:
+            raise ValueError("Agent池至少需要一个实例")
+        self.instances: List[BaseAgent] = [factory(f"{agent_id}#{i}") for i in range(size)]
+        for instance in self.instances:
+            instance.pool_id = agent_id
+        super().__init__(agent_id, self.instances[0].agent_type)
+        self.strategy = strategy
+        self.in_flight = [0] * size
+        self.dispatched = [0] * size
+        self._next = 0
+    
+    def _pick(self) -> int:
+        """选择实例序号"""
+        size = len(self.instances)
+        start = self._next
+        self._next = (start + 1) % size
+        if self.strategy == DispatchStrategy.ROUND_ROBIN:
+            return start
+        # 从轮转位置开始找在途请求最少的实例，负载相同时各实例轮流承担
+        return min(((start + i) % size for i in range(size)), key=lambda i: self.in_flight[i])
+    
+    async def process(self, message: AgentMessage) -> AgentResponse:
+        """分发给一个实例处理"""
+        index = self._pick()
+        self.in_flight[index] += 1
+        self.dispatched[index] += 1
+        try:
+            response = await self.instances[index].run(message)
+        finally:
+            self.in_flight[index] -= 1
+        response.metadata.setdefault("instance_id", self.instances[index].agent_id)
+        return response
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        """各实例最近的对话记录，按时间先后合并"""
+        return sorted((record for instance in self.instances for record in instance.conversation_history),
+                      key=lambda record: record["ts"])
+    
+    def query_history(self, since: Optional[float] = None, contains: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """合并各实例的对话历史，最新的在前"""
+        records = [record for instance in self.instances
+                   for record in instance.query_history(since, contains, limit)]
+        records.sort(key=lambda record: record["ts"], reverse=True)
+        return records[:limit]
+    
+    def set_history(self, history: HistoryBackend):
+        """各实例共用同一个对话历史后端，记录中的 agent_id 为实例ID，pool_id 为池的ID"""
+        super().set_history(history)
+        for instance in self.instances:
+            instance.set_history(history)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """汇总各实例的统计信息"""
+        instance_stats = [instance.get_stats() for instance in self.instances]
+        total = sum(stats["total_requests"] for stats in instance_stats)
+        successful = sum(stats["successful_responses"] for stats in instance_stats)
+        uptime = datetime.now() - self.stats["start_time"]
+        
+        return {
+            "agent_id": self.agent_id,
+            "agent_type": self.agent_type.value,
+            "total_requests": total,
+            "successful_responses": successful,
+            "error_responses": sum(stats["error_responses"] for stats in instance_stats),
+            "success_rate": round(successful / total * 100, 2) if total > 0 else 0,
+            "uptime_seconds": int(uptime.total_seconds()),
+            "conversation_length": sum(stats["conversation_length"] for stats in instance_stats),
+            "pool_size": len(self.instances),
+            "strategy": self.strategy.value,
+            "instances": [
+                {
+                    "agent_id": stats["agent_id"],
+                    "in_flight": self.in_flight[i],
+                    "dispatched": self.dispatched[i],
+                    "total_requests": stats["total_requests"]
+                }
+                for i, stats in enumerate(instance_stats)
+            ]
+        }
+
 class AgentManager:
     """Agent管理器"""
     
     def __init__(self):
         self.agents: Dict[str, BaseAgent] = {}
+        self.history: Optional[HistoryBackend] = None
+        # 统计版本号：注册Agent或处理请求后递增，统计快照据此判断是否需要重建
+        self.version = 0
         self._initialize_agents()
     
     def _initialize_agents(self):
@@ -273,7 +489,23 @@ class AgentManager:
     
     def register_agent(self, agent: BaseAgent):
         """注册Agent"""
+        if self.history is not None:
+            agent.set_history(self.history)
         self.agents[agent.agent_id] = agent
+        self.version += 1
+    
+    def set_history(self, history: HistoryBackend):
+        """所有Agent（包括之后注册的）共用同一个对话历史后端"""
+        self.history = history
+        for agent in self.agents.values():
+            agent.set_history(history)
+    
+    def register_pool(self, agent_id: str, factory: Callable[[str], BaseAgent], size: int = 4,
+                      strategy: DispatchStrategy = DispatchStrategy.LEAST_LOADED) -> AgentPool:
+        """以同一个ID注册一组Agent实例，factory 接收实例ID并返回新的Agent"""
+        pool = AgentPool(agent_id, factory, size, strategy)
+        self.register_agent(pool)
+        return pool
     
     def get_agent(self, agent_id: str) -> Optional[BaseAgent]:
         """获取Agent"""
@@ -301,7 +533,90 @@ class AgentManager:
             )
         
         agent_message = AgentMessage(content=message)
-        return await agent.process(agent_message)
+        try:
+            return await agent.run(agent_message)
+        finally:
+            self.version += 1
+    
+    async def process_with_agents(
+        self,
+        agent_ids: Optional[List[str]],
+        message: str,
+        timeout: Optional[float] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+        merge: MergePolicy = MergePolicy.HIGHEST_CONFIDENCE
+    ) -> AgentResponse:
+        """把同一条消息并发分发给多个Agent，按合并策略返回一个结果
+        
+        每个Agent有自己的期限（deadlines 中的秒数，未指定时用 timeout，None表示不限时），
+        超时的Agent被取消（blocking 的Agent在线程中执行，超时后不再等待其结果），
+        只合并按时成功返回的结果，总耗时取决于最慢的Agent或期限，而不是各Agent耗时之和。
+        agent_ids 为None时分发给所有已注册的Agent。
+        返回结果的 metadata 中 "agent_id" 为被采用的Agent，"fanout" 为每个Agent的状态与耗时。
+        """
+        agent_ids = list(agent_ids) if agent_ids else list(self.agents)
+        deadlines = deadlines or {}
+        agent_message = AgentMessage(content=message)
+        
+        async def run(agent_id: str) -> Dict[str, Any]:
+            agent = self.get_agent(agent_id)
+            if not agent:
+                return {"agent_id": agent_id, "status": "not_found", "response": None, "elapsed_ms": 0.0}
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(agent.run(agent_message),
+                                                  deadlines.get(agent_id, timeout))
+                status = response.status.value
+            except asyncio.TimeoutError:
+                response, status = None, "timeout"
+            except Exception as e:
+                response = AgentResponse(content=f"Agent执行出错: {str(e)}",
+                                         status=ResponseStatus.ERROR, confidence=0.0)
+                status = ResponseStatus.ERROR.value
+            return {
+                "agent_id": agent_id,
+                "status": status,
+                "response": response,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+        
+        outcomes = await asyncio.gather(*(run(agent_id) for agent_id in agent_ids))
+        self.version += 1
+        fanout = [
+            {
+                "agent_id": outcome["agent_id"],
+                "status": outcome["status"],
+                "confidence": outcome["response"].confidence if outcome["response"] else None,
+                "elapsed_ms": outcome["elapsed_ms"]
+            }
+            for outcome in outcomes
+        ]
+        
+        succeeded = [outcome for outcome in outcomes
+                     if outcome["response"] and outcome["response"].status == ResponseStatus.SUCCESS]
+        if not succeeded:
+            return AgentResponse(
+                content="没有Agent在期限内成功返回结果",
+                status=ResponseStatus.ERROR,
+                confidence=0.0,
+                metadata={"fanout": fanout},
+                suggestions=["可用的Agent: " + ", ".join(self.agents.keys()), "适当放宽期限后重试"]
+            )
+        
+        if merge == MergePolicy.HIGHEST_CONFIDENCE:
+            # 置信度相同时保留列表中靠前的Agent
+            chosen = max(succeeded, key=lambda outcome: outcome["response"].confidence)
+        else:
+            chosen = succeeded[0]
+        response = chosen["response"]
+        return AgentResponse(
+            content=response.content,
+            status=response.status,
+            confidence=response.confidence,
+            metadata={**response.metadata, "agent_id": chosen["agent_id"],
+                      "merge_policy": merge.value, "fanout": fanout},
+            suggestions=list(response.suggestions)
+        )
 
 # 全局Agent管理器实例
 agent_manager = AgentManager()
@@ -311,6 +626,15 @@ async def analyze_text(text: str, agent_id: str = "main_text_analyzer") -> Agent
     """快速分析文本"""
     return await agent_manager.process_with_agent(agent_id, text)
 
+async def analyze_text_multi(
+    text: str,
+    agent_ids: Optional[List[str]] = None,
+    timeout: Optional[float] = 2.0,
+    merge: MergePolicy = MergePolicy.HIGHEST_CONFIDENCE
+) -> AgentResponse:
+    """用多个Agent并发分析文本并合并结果"""
+    return await agent_manager.process_with_agents(agent_ids, text, timeout=timeout, merge=merge)
+
 def get_system_stats() -> Dict[str, Any]:
     """获取系统统计信息"""
     return {
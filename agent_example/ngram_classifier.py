@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字符n-gram线性分类器
+把文本切成字符n-gram并哈希到固定维度的稀疏特征，用softmax线性模型打分。
+一批文本的特征提取全部在NumPy数组上完成，打分是一次稀疏矩阵×稠密权重的乘法，只使用CPU。
+安装了SciPy时用其CSR矩阵相乘，否则用NumPy按类别累加，结果相同
+
+权重文件为 .npz：weights（特征数×类别数）、bias、classes（类别名）、ngram（最小n、最大n、特征数）
+
+用法：
+    python ngram_classifier.py train <训练数据.tsv> -o <权重.npz> [--epochs 20]
+    python ngram_classifier.py predict <权重.npz> <文本>...
+    python ngram_classifier.py bench <权重.npz> [--texts 文本文件] [--batch 1024]
+
+训练数据每行为“类别<Tab>文本”，类别使用 TextCategory 的值（名词、成语、疑问句……）
+"""
+
+import argparse
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import scipy.sparse
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+from model import (AgentMessage, AgentResponse, AgentType, BaseAgent, ResponseStatus,
+                   SimpleTextAgent, TextCategory)
+
+# 多项式滚动哈希的基数与混合常数（murmur3 finalizer）；uint64 运算溢出即取模，结果与进程无关
+_BASE = np.uint64(1000003)
+_MIX1 = np.uint64(0xff51afd7ed558ccd)
+_MIX2 = np.uint64(0xc4ceb9fe1a85ec53)
+_SHIFT = np.uint64(33)
+
+
+class NgramFeaturizer:
+    """把一批文本转换为哈希n-gram稀疏特征（COO三元组：行号、特征号、值）
+
+    每个n-gram出现一次记一个值 1/sqrt(该文本的n-gram总数)，文本之间长度不同也可比较。
+    """
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 3), n_features: int = 2 ** 18):
+        if n_features & (n_features - 1):
+            raise ValueError(f"特征数必须是2的幂: {n_features}")
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+
+    def transform(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        texts = [text.strip().lower() for text in texts]
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        # 整批文本拼成一个码位数组，n-gram只在同一文本内部取
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        ends = np.cumsum(lengths)
+        doc = np.repeat(np.arange(len(texts)), lengths)
+        mask = np.uint64(self.n_features - 1)
+
+        rows, cols = [], []
+        hashed = np.zeros(len(codes), dtype=np.uint64)
+        for n in range(1, self.ngram_range[1] + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                break
+            # hashed[i] 为从 i 开始、长度为 n 的n-gram的滚动哈希
+            hashed = hashed[:count] * _BASE + codes[n - 1:]
+            if n < self.ngram_range[0]:
+                continue
+            valid = np.arange(count) + n <= ends[doc[:count]]
+            h = hashed[valid] + np.uint64(n * int(_MIX2) & 0xFFFFFFFFFFFFFFFF)  # 区分不同长度
+            h ^= h >> _SHIFT
+            h *= _MIX1
+            h ^= h >> _SHIFT
+            rows.append(doc[:count][valid])
+            cols.append((h & mask).astype(np.int64))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        totals = np.bincount(rows, minlength=len(texts))
+        values = 1.0 / np.sqrt(totals[rows], dtype=np.float32)
+        return rows, cols, values.astype(np.float32)
+
+
+def _sparse_dot(rows, cols, values, n_rows, weights):
+    """稀疏矩阵（COO）× 稠密矩阵"""
+    if HAS_SCIPY:
+        matrix = scipy.sparse.csr_matrix((values, (rows, cols)), shape=(n_rows, weights.shape[0]))
+        return np.asarray(matrix @ weights)
+    gathered = weights[cols] * values[:, None]
+    return np.stack([np.bincount(rows, weights=gathered[:, c], minlength=n_rows)
+                     for c in range(weights.shape[1])], axis=1)
+
+
+def _sparse_tdot(rows, cols, values, n_features, dense):
+    """稀疏矩阵的转置 × 稠密矩阵，训练时计算权重梯度"""
+    if HAS_SCIPY:
+        matrix = scipy.sparse.csr_matrix((values, (rows, cols)), shape=(dense.shape[0], n_features))
+        return np.asarray(matrix.T @ dense)
+    scattered = dense[rows] * values[:, None]
+    return np.stack([np.bincount(cols, weights=scattered[:, c], minlength=n_features)
+                     for c in range(dense.shape[1])], axis=1)
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+class NgramClassifier:
+    """哈希字符n-gram上的softmax线性分类器"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, classes: Sequence[str],
+                 featurizer: NgramFeaturizer):
+        if weights.shape != (featurizer.n_features, len(classes)) or bias.shape != (len(classes),):
+            raise ValueError(f"权重形状 {weights.shape} 与特征数、类别数不一致")
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.bias = bias.astype(np.float32)
+        self.classes = list(classes)
+        self.featurizer = featurizer
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """一批文本的各类别概率（文本数×类别数）"""
+        rows, cols, values = self.featurizer.transform(texts)
+        scores = _sparse_dot(rows, cols, values, len(texts), self.weights) + self.bias
+        return _softmax(scores.astype(np.float64))
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """一批文本的（类别，概率）"""
+        if not texts:
+            return []
+        proba = self.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        return [(self.classes[i], float(p)) for i, p in zip(best, proba[np.arange(len(best)), best])]
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str],
+              ngram_range: Tuple[int, int] = (1, 3), n_features: int = 2 ** 18,
+              epochs: int = 20, batch_size: int = 256, learning_rate: float = 2.0,
+              l2: float = 1e-6, seed: int = 0) -> 'NgramClassifier':
+        """小批量梯度下降训练"""
+        featurizer = NgramFeaturizer(ngram_range, n_features)
+        classes = sorted(set(labels))
+        index = {label: i for i, label in enumerate(classes)}
+        targets = np.array([index[label] for label in labels])
+        texts = list(texts)
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                rows, cols, values = featurizer.transform([texts[i] for i in batch])
+                proba = _softmax(_sparse_dot(rows, cols, values, len(batch), weights) + bias)
+                proba[np.arange(len(batch)), targets[batch]] -= 1  # 交叉熵对打分的梯度
+                proba /= len(batch)
+                weights *= np.float32(1 - learning_rate * l2)
+                weights -= learning_rate * _sparse_tdot(rows, cols, values, n_features,
+                                                        proba).astype(np.float32)
+                bias -= learning_rate * proba.sum(axis=0).astype(np.float32)
+        return cls(weights, bias, classes, featurizer)
+
+    def save(self, path: str):
+        low, high = self.featurizer.ngram_range
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            classes=np.array(self.classes),
+                            ngram=np.array([low, high, self.featurizer.n_features]))
+
+    @classmethod
+    def load(cls, path: str) -> 'NgramClassifier':
+        with np.load(path, allow_pickle=False) as data:
+            low, high, n_features = (int(v) for v in data["ngram"])
+            return cls(data["weights"], data["bias"], [str(c) for c in data["classes"]],
+                       NgramFeaturizer((low, high), n_features))
+
+
+class NgramClassifierAgent(BaseAgent):
+    """用n-gram分类器代替规则级联打分的文本分析Agent
+
+    置信度为模型给出的概率，元数据中包含各类别的概率，建议列出概率次高的类别；
+    只依赖权重，不加载规则Agent的词典、模糊匹配索引与分词器。analyze_batch 一次为整批文本打分。
+    打分在线程中执行（blocking），与其他Agent并发时不阻塞事件循环。
+    """
+
+    blocking = True
+
+    def __init__(self, classifier: NgramClassifier, agent_id: str = "ngram_classifier"):
+        super().__init__(agent_id, AgentType.CLASSIFIER)
+        categories = {category.value: category for category in TextCategory}
+        unknown = [label for label in classifier.classes if label not in categories]
+        if unknown:
+            raise ValueError(f"权重中的类别不是 TextCategory: {unknown}")
+        self.categories = [categories[label] for label in classifier.classes]
+        self.classifier = classifier
+
+    async def process(self, message: AgentMessage) -> AgentResponse:
+        """为单条文本打分"""
+        try:
+            self.stats["total_requests"] += 1
+
+            text = message.content.strip()
+            if not text:
+                self.stats["error_responses"] += 1
+                return AgentResponse(
+                    content="输入为空",
+                    status=ResponseStatus.ERROR,
+                    confidence=0.0,
+                    suggestions=["请输入一些文本进行分析"]
+                )
+
+            proba = self.classifier.predict_proba([text])[0]
+            order = np.argsort(-proba)
+            category = self.categories[order[0]]
+            confidence = float(proba[order[0]])
+            others = [f"{self.categories[i].value}（{proba[i]:.1%}）" for i in order[1:3]]
+            response = AgentResponse(
+                content=f"'{text}'被分类为{category.value}，模型概率 {confidence:.1%}。",
+                status=ResponseStatus.SUCCESS,
+                confidence=confidence,
+                metadata={
+                    "original_text": text,
+                    "category": category.value,
+                    "text_length": len(text),
+                    "probabilities": {label.value: round(float(p), 4)
+                                      for label, p in zip(self.categories, proba)}
+                },
+                suggestions=[f"其他可能的类别：{'、'.join(others)}"] if others else []
+            )
+
+            self.stats["successful_responses"] += 1
+            self.add_to_history(message)
+            return response
+
+        except Exception as e:
+            self.stats["error_responses"] += 1
+            return AgentResponse(
+                content=f"分析过程中出现错误: {str(e)}",
+                status=ResponseStatus.ERROR,
+                confidence=0.0,
+                suggestions=["请稍后重试", "检查输入内容格式"]
+            )
+
+    def analyze_batch(self, texts: Sequence[str]) -> List[Tuple[TextCategory, float]]:
+        if not texts:
+            return []
+        proba = self.classifier.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        return [(self.categories[i], float(proba[row, i])) for row, i in enumerate(best)]
+
+
+def _read_tsv(path: str) -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            label, sep, text = line.rstrip('\n').partition('\t')
+            if sep and text.strip():
+                labels.append(label)
+                texts.append(text)
+    return texts, labels
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='字符n-gram线性分类器')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='训练并保存权重')
+    train.add_argument('data', help='训练数据（类别<Tab>文本）')
+    train.add_argument('-o', '--output', required=True, help='权重文件（.npz）')
+    train.add_argument('--epochs', type=int, default=20)
+    train.add_argument('--features', type=int, default=2 ** 18, help='哈希特征数（2的幂）')
+    train.add_argument('--max-n', type=int, default=3, help='最长n-gram')
+
+    predict = commands.add_parser('predict', help='对文本分类')
+    predict.add_argument('weights')
+    predict.add_argument('texts', nargs='+')
+
+    bench = commands.add_parser('bench', help='比较整批打分与逐条打分的吞吐量')
+    bench.add_argument('weights')
+    bench.add_argument('--texts', help='文本文件，每行一条（默认使用内置示例）')
+    bench.add_argument('--batch', type=int, default=1024)
+    bench.add_argument('--count', type=int, default=20000, help='文本条数')
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        texts, labels = _read_tsv(args.data)
+        started = time.perf_counter()
+        model = NgramClassifier.train(texts, labels, ngram_range=(1, args.max_n),
+                                      n_features=args.features, epochs=args.epochs)
+        model.save(args.output)
+        correct = sum(label == predicted for label, (predicted, _) in
+                      zip(labels, model.predict(texts)))
+        print(f"{len(texts)} 条，{len(model.classes)} 类，训练 {time.perf_counter() - started:.1f} 秒，"
+              f"训练集准确率 {correct / max(1, len(texts)):.1%}，已保存到 {args.output}")
+        return 0
+
+    model = NgramClassifier.load(args.weights)
+    if args.command == 'predict':
+        for text, (label, proba) in zip(args.texts, model.predict(args.texts)):
+            print(f"{text}\t{label}\t{proba:.3f}")
+        return 0
+
+    if args.texts:
+        with open(args.texts, encoding='utf-8') as f:
+            samples = [line.strip() for line in f if line.strip()]
+    else:
+        samples = ["一心一意", "泥菩萨过河", "电脑", "今天天气怎么样？", "请帮我完成这个任务",
+                   "这是一个普通的句子，包含一些标点。"]
+    texts = [samples[i % len(samples)] for i in range(args.count)]
+
+    started = time.perf_counter()
+    for start in range(0, len(texts), args.batch):
+        model.predict(texts[start:start + args.batch])
+    batched = time.perf_counter() - started
+
+    single = texts[:max(1, len(texts) // 20)]
+    started = time.perf_counter()
+    for text in single:
+        model.predict([text])
+    per_text = (time.perf_counter() - started) / len(single) * len(texts)
+
+    rules = SimpleTextAgent("bench_rules")
+    started = time.perf_counter()
+    for text in texts:
+        rules._analyze_text(text)
+    cascade = time.perf_counter() - started
+
+    print(f"{len(texts)} 条文本（{'SciPy' if HAS_SCIPY else 'NumPy'} 稀疏乘法）")
+    print(f"  整批打分（每批 {args.batch}）: {len(texts) / batched:,.0f} 条/秒")
+    print(f"  逐条打分: {len(texts) / per_text:,.0f} 条/秒")
+    print(f"  规则级联（参考）: {len(texts) / cascade:,.0f} 条/秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
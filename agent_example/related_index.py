@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相关词条索引
+离线为词典中的每个成语/歇后语预先算出最相关的 k 个同类词条，生成建议时只需一次字典查找。
+相关度为按逆文档频率加权的共有汉字余弦相似度：经倒排索引只与至少共有一个字的词条比较，
+“一”“不”这类常见字权重低，共有少见字的词条排在前面
+
+用法：
+    python related_index.py build -o related.json [--idioms 成语文件] [--xiehouyu 歇后语文件] [-k 5]
+    python related_index.py show related.json <词条>...
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+VERSION = 1
+
+
+def build_neighbors(entries: Iterable[str], k: int = 5, max_df: float = 0.05) -> Dict[str, List[str]]:
+    """计算每个词条最相关的 k 个词条（不含自身，没有共有字的词条不算相关）
+
+    大词典中出现在超过 max_df 比例词条中的字只参与相似度的分母，不用来找候选，
+    避免常见字的倒排表让计算量变成平方级。
+    """
+    entries = list(dict.fromkeys(entries))
+    chars = [set(entry) for entry in entries]
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for i, entry_chars in enumerate(chars):
+        for char in entry_chars:
+            postings[char].append(i)
+
+    n = len(entries)
+    idf = {char: math.log((n + 1) / (len(ids) + 0.5)) for char, ids in postings.items()}
+    weight = {char: value * value for char, value in idf.items()}
+    norms = [math.sqrt(sum(weight[char] for char in entry_chars)) or 1.0 for entry_chars in chars]
+    limit = max(100, int(n * max_df))
+
+    neighbors = {}
+    for i, entry_chars in enumerate(chars):
+        scores: Dict[int, float] = defaultdict(float)
+        for char in entry_chars:
+            ids = postings[char]
+            if len(ids) > limit:
+                continue
+            w = weight[char]
+            for j in ids:
+                scores[j] += w
+        scores.pop(i, None)
+        # 余弦相似度的分母中本词条的范数对所有候选相同，排序时省略
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1] / norms[item[0]], -item[0]))
+        neighbors[entries[i]] = [entries[j] for j, _ in best]
+    return neighbors
+
+
+class RelatedIndex:
+    """相关词条索引：{类别: {词条: [相关词条]}}"""
+
+    def __init__(self, neighbors: Optional[Dict[str, Dict[str, List[str]]]] = None, k: int = 5):
+        self.neighbors = neighbors or {}
+        self.k = k
+
+    @classmethod
+    def build(cls, lexicons: Dict[str, Iterable[str]], k: int = 5) -> 'RelatedIndex':
+        """按类别分别计算，lexicons 为 {类别: 词条列表}"""
+        return cls({category: build_neighbors(entries, k) for category, entries in lexicons.items()}, k)
+
+    def related(self, category: str, entry: str, limit: Optional[int] = None) -> List[str]:
+        """entry 的相关词条，不在索引中时返回空列表"""
+        return self.neighbors.get(category, {}).get(entry, [])[:limit]
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.neighbors.values())
+
+    def save(self, path: str):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": VERSION, "k": self.k, "neighbors": self.neighbors},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RelatedIndex':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"不支持的相关词条索引版本: {path}")
+        return cls(data["neighbors"], data["k"])
+
+
+def main():
+    from model import SimpleTextAgent, TextCategory  # model 导入本模块，在这里导入避免循环
+
+    parser = argparse.ArgumentParser(description='相关词条索引')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='离线生成索引文件')
+    build.add_argument('-o', '--output', required=True, help='索引文件（.json）')
+    build.add_argument('--idioms', help='附加成语词典（每行一条）')
+    build.add_argument('--xiehouyu', help='附加歇后语词典（每行一条）')
+    build.add_argument('-k', type=int, default=5, help='每个词条保留的相关词条数')
+    show = commands.add_parser('show', help='查看词条的相关词条')
+    show.add_argument('index')
+    show.add_argument('entries', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        index = RelatedIndex.load(args.index)
+        for entry in args.entries:
+            for category in index.neighbors:
+                related = index.related(category, entry)
+                if related:
+                    print(f"{entry}（{category}）: {'、'.join(related)}")
+        return 0
+
+    lexicon_files = {}
+    if args.idioms:
+        lexicon_files[TextCategory.IDIOM] = args.idioms
+    if args.xiehouyu:
+        lexicon_files[TextCategory.XIEHOUYU] = args.xiehouyu
+    # 与Agent使用同一份词典：内置词条加上附加词典
+    patterns = SimpleTextAgent("related_index_build", lexicon_files=lexicon_files).patterns
+    started = time.perf_counter()
+    index = RelatedIndex.build({category.value: patterns[category]
+                                for category in (TextCategory.IDIOM, TextCategory.XIEHOUYU)}, args.k)
+    index.save(args.output)
+    print(f"{len(index)} 个词条，k={args.k}，耗时 {time.perf_counter() - started:.1f} 秒，已保存到 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,15 +9,34 @@ import sys
 import os
 import uvicorn
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
 import asyncio
+from datetime import datetime
 
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from model import agent_manager, AgentMessage, analyze_text, get_system_stats
+from model import (agent_manager, AgentMessage, MergePolicy, analyze_text, analyze_text_multi,
+                   get_system_stats)
+from conversation_log import SegmentedLogHistory
+from stats_snapshot import StatsSnapshotService
+
+# 设置 AGENT_HISTORY_DIR 后对话历史持久化到该目录的分段日志中
+HISTORY_DIR = os.environ.get("AGENT_HISTORY_DIR")
+if HISTORY_DIR:
+    agent_manager.set_history(SegmentedLogHistory(HISTORY_DIR))
+
+# 设置 AGENT_NGRAM_WEIGHTS 后加载n-gram分类器权重，注册为 ngram_classifier
+NGRAM_WEIGHTS = os.environ.get("AGENT_NGRAM_WEIGHTS")
+if NGRAM_WEIGHTS:
+    from ngram_classifier import NgramClassifier, NgramClassifierAgent
+    agent_manager.register_agent(NgramClassifierAgent(NgramClassifier.load(NGRAM_WEIGHTS)))
+
+# /stats、/agents 返回预先生成的快照，Agent状态变化后最多延迟1秒更新；/health 实时生成
+snapshots = StatsSnapshotService(agent_manager, get_system_stats, "简单Agent系统", "2.1.0")
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -44,6 +63,12 @@ class BatchAnalysisRequest(BaseModel):
     texts: List[str] = Field(..., description="要分析的文本列表", min_items=1, max_items=10)
     agent_id: str = Field(default="main_text_analyzer", description="使用的Agent ID")
 
+class MultiAgentAnalysisRequest(BaseModel):
+    text: str = Field(..., description="要分析的文本", min_length=1, max_length=1000)
+    agent_ids: Optional[List[str]] = Field(default=None, description="参与分析的Agent ID，默认全部")
+    timeout: float = Field(default=2.0, gt=0, le=30, description="每个Agent的期限（秒）")
+    merge: MergePolicy = Field(default=MergePolicy.HIGHEST_CONFIDENCE, description="结果合并策略")
+
 # 响应模型
 class AnalysisResult(BaseModel):
     content: str
@@ -67,8 +92,10 @@ async def root():
         "endpoints": {
             "analyze": "/analyze",
             "batch_analyze": "/batch_analyze",
+            "analyze_multi": "/analyze_multi",
             "agents": "/agents",
             "stats": "/stats",
+            "history": "/history",
             "health": "/health"
         },
         "docs": "/docs"
@@ -92,6 +119,25 @@ async def analyze_single(request: TextAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze_multi", response_model=AnalysisResult)
+async def analyze_multi(request: MultiAgentAnalysisRequest):
+    """用多个Agent并发分析同一文本，返回按合并策略选出的结果"""
+    try:
+        response = await analyze_text_multi(request.text, request.agent_ids,
+                                            request.timeout, request.merge)
+        
+        return AnalysisResult(
+            content=response.content,
+            category=response.metadata.get("category", "unknown"),
+            confidence=response.confidence,
+            suggestions=response.suggestions,
+            metadata=response.metadata,
+            timestamp=response.metadata.get("timestamp", "")
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/batch_analyze", response_model=List[AnalysisResult])
 async def analyze_batch(request: BatchAnalysisRequest):
     """批量分析文本"""
@@ -112,29 +158,60 @@ async def analyze_batch(request: BatchAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/agents", response_model=SystemInfo)
+def snapshot_headers() -> Dict[str, str]:
+    """X-Snapshot-Age：快照已生成的秒数，后台刷新出错时会持续增长"""
+    return {"X-Snapshot-Age": str(snapshots.age())}
+
+# 直接返回预先序列化的字节，不经过 response_model 校验；responses 只用于接口文档
+@app.get("/agents", response_class=Response, responses={200: {"model": SystemInfo}})
 async def list_agents():
     """列出所有可用Agent"""
-    return SystemInfo(
-        version="2.1.0",
-        agents=agent_manager.list_agents(),
-        timestamp=get_system_stats()["timestamp"]
-    )
+    return Response(content=snapshots.body("agents"), media_type="application/json",
+                    headers=snapshot_headers())
 
-@app.get("/stats", response_model=Dict[str, Any])
+@app.get("/stats", response_class=Response, responses={200: {"model": Dict[str, Any]}})
 async def get_stats():
     """获取系统统计信息"""
-    return get_system_stats()
+    return Response(content=snapshots.body("stats"), media_type="application/json",
+                    headers=snapshot_headers())
+
+@app.get("/history", response_model=List[Dict[str, Any]])
+async def query_history(agent_id: Optional[str] = None, contains: Optional[str] = None,
+                        since_seconds: Optional[float] = None, limit: int = 50):
+    """查询对话历史，最新的在前；未启用持久化时只包含内存中的最近记录"""
+    limit = min(limit, 500)
+    since = datetime.now().timestamp() - since_seconds if since_seconds else None
+    if agent_manager.history is not None:
+        return list(agent_manager.history.query(since=since, agent_id=agent_id, contains=contains,
+                                                limit=limit, newest_first=True))
+    
+    if agent_id and not agent_manager.get_agent(agent_id):
+        raise HTTPException(status_code=404, detail=f"未找到Agent: {agent_id}")
+    agents = [agent_manager.get_agent(agent_id)] if agent_id else agent_manager.agents.values()
+    records = [record for agent in agents
+               for record in agent.query_history(since=since, contains=contains, limit=limit)]
+    records.sort(key=lambda record: record["ts"], reverse=True)
+    return records[:limit]
+
+@app.on_event("startup")
+async def start_snapshots():
+    """启动统计快照的后台刷新"""
+    snapshots.start()
+
+@app.on_event("shutdown")
+async def stop_snapshots():
+    await snapshots.stop()
+
+@app.on_event("shutdown")
+def close_history():
+    """写入尚未落盘的对话历史"""
+    if agent_manager.history is not None:
+        agent_manager.history.close()
 
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    return {
-        "status": "healthy",
-        "service": "简单Agent系统",
-        "uptime": get_system_stats()["timestamp"],
-        "agents_count": len(agent_manager.list_agents())
-    }
+    return snapshots.health()
 
 @app.get("/demo")
 async def run_demo():
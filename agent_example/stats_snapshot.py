@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计快照服务
+定时检查Agent管理器的版本号，统计有变化时才重新汇总各Agent的统计，并把 /stats、/agents
+的响应预先序列化为JSON字节，请求时直接返回快照，不再逐次调用每个Agent的 get_stats。
+/health 不使用快照，每次实时生成，后台刷新停止时也能如实反映服务状态
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+
+class StatsSnapshot:
+    """一次汇总得到的响应数据与序列化结果"""
+
+    def __init__(self, version: int, payloads: Dict[str, Dict[str, Any]]):
+        self.version = version
+        self.created = time.monotonic()
+        self.payloads = payloads
+        self.bodies = {name: json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+                       for name, payload in payloads.items()}
+
+
+class StatsSnapshotService:
+    """统计快照服务
+
+    manager 为 AgentManager，其 version 在注册Agent与处理请求时递增；build_stats 返回系统统计
+    （如 model.get_system_stats，包含 agents 与 timestamp），/agents 的内容由它派生。
+    refresh_interval 秒检查一次版本号，有变化才重建快照，因此快照最多落后一个间隔；
+    没有变化时也每隔 max_age 秒重建一次，让时间戳与运行时长保持更新。
+    没有启动后台任务时，第一次读取会同步生成快照。
+    后台刷新出错时打印错误并继续按间隔重试，期间继续返回旧快照，可通过 age() 判断快照是否过期。
+    """
+
+    def __init__(self, manager, build_stats: Callable[[], Dict[str, Any]], service: str,
+                 version: str, refresh_interval: float = 1.0, max_age: float = 30.0):
+        self.manager = manager
+        self.build_stats = build_stats
+        self.service = service
+        self.service_version = version
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._snapshot: Optional[StatsSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def refresh(self) -> StatsSnapshot:
+        """重新汇总统计并替换快照（整体替换引用，读取方不会看到半成品）"""
+        version = self.manager.version
+        stats = self.build_stats()
+        payloads = {
+            "stats": stats,
+            "agents": {
+                "version": self.service_version,
+                "agents": stats["agents"],
+                "timestamp": stats["timestamp"]
+            }
+        }
+        self._snapshot = StatsSnapshot(version, payloads)
+        self.refreshes += 1
+        return self._snapshot
+
+    @property
+    def snapshot(self) -> StatsSnapshot:
+        return self._snapshot or self.refresh()
+
+    def body(self, name: str) -> bytes:
+        """预先序列化的响应体：stats 或 agents"""
+        return self.snapshot.bodies[name]
+
+    def payload(self, name: str) -> Dict[str, Any]:
+        return self.snapshot.payloads[name]
+
+    def age(self) -> Optional[float]:
+        """当前快照已生成的秒数，尚未生成时为None"""
+        snapshot = self._snapshot
+        return round(time.monotonic() - snapshot.created, 3) if snapshot else None
+
+    def health(self) -> Dict[str, Any]:
+        """实时生成的健康检查内容：只读取Agent数量，不汇总统计
+
+        snapshot_age 为当前快照已生成的秒数；refresh_errors/last_refresh_error 为后台刷新的出错次数与最近一次错误
+        """
+        return {
+            "status": "healthy",
+            "service": self.service,
+            "uptime": datetime.now().isoformat(),
+            "agents_count": len(self.manager.agents),
+            "snapshot_age": self.age(),
+            "refresh_errors": self.errors,
+            "last_refresh_error": self.last_error
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            snapshot = self._snapshot
+            if (snapshot is None or snapshot.version != self.manager.version
+                    or time.monotonic() - snapshot.created >= self.max_age):
+                # 某次汇总出错（例如某个Agent的 get_stats 抛异常）不能结束后台任务，否则快照永久停止更新
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    print(f"统计快照刷新出错: {e}")
+
+    def start(self):
+        """在当前事件循环中启动后台刷新任务"""
+        self.refresh()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
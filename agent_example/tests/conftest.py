@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块按脚本方式互相导入（如 from conversation_log import ...），测试时把上级目录加入路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,158 @@
+import errno
+import os
+import time
+
+import pytest
+
+import conversation_log
+from conversation_log import MemoryHistory, SegmentedLogHistory
+
+
+@pytest.fixture
+def make_history(tmp_path):
+    histories = []
+
+    def make(**kwargs):
+        kwargs.setdefault("commit_interval", 0)
+        kwargs.setdefault("maintenance_interval", None)
+        kwargs.setdefault("fsync", False)
+        history = SegmentedLogHistory(str(tmp_path), **kwargs)
+        histories.append(history)
+        return history
+
+    yield make
+    for history in histories:
+        history.close()
+
+
+def write(history, records):
+    """逐条追加并等待落盘；segment_bytes 很小时每次提交后都会切换新段"""
+    for record in records:
+        history.append(record)
+        assert history.sync(timeout=5)
+
+
+def age(directory, names, seconds):
+    old = time.time() - seconds
+    for name in names:
+        os.utime(os.path.join(directory, name), (old, old))
+
+
+def test_query_filters_and_order(make_history):
+    history = make_history()
+    write(history, [{"agent_id": "a", "content": "一心一意"},
+                    {"agent_id": "b", "content": "电脑"},
+                    {"agent_id": "a", "content": "泥菩萨过河"}])
+
+    assert [r["content"] for r in history.query(agent_id="a")] == ["一心一意", "泥菩萨过河"]
+    assert [r["content"] for r in history.query(newest_first=True, limit=2)] == ["泥菩萨过河", "电脑"]
+    assert [r["agent_id"] for r in history.query(contains="电脑")] == ["b"]
+    assert [r["content"] for r in history.recent("a")] == ["一心一意", "泥菩萨过河"]
+
+
+def test_pool_id_matches_instances(make_history):
+    history = make_history()
+    write(history, [{"agent_id": "pool#0", "pool_id": "pool", "content": "x"},
+                    {"agent_id": "pool#1", "pool_id": "pool", "content": "y"},
+                    {"agent_id": "other", "content": "pool"}])
+
+    assert [r["agent_id"] for r in history.query(agent_id="pool")] == ["pool#0", "pool#1"]
+    assert [r["content"] for r in history.query(agent_id="pool#1")] == ["y"]
+
+
+def test_segments_rotate_and_reopen(tmp_path, make_history):
+    history = make_history(segment_bytes=1)
+    write(history, [{"agent_id": "a", "content": str(i)} for i in range(3)])
+    history.close()
+
+    assert len(history.reader.segments()) == 3
+    reopened = make_history()
+    assert [r["content"] for r in reopened.query()] == ["0", "1", "2"]
+
+
+def test_instances_use_distinct_segment_names(tmp_path, make_history):
+    first = make_history()
+    second = make_history()
+    write(first, [{"agent_id": "a", "content": "1"}])
+    write(second, [{"agent_id": "b", "content": "2"}])
+
+    assert len(os.listdir(tmp_path)) == 2
+    assert sorted(r["content"] for r in first.query()) == ["1", "2"]
+
+
+def test_compact_merges_small_segments_and_keeps_newest_mtime(tmp_path, make_history):
+    history = make_history(segment_bytes=1)
+    write(history, [{"agent_id": "a", "content": str(i)} for i in range(4)])
+    history.close()  # 关闭时封存当前段，全部段都可以合并
+    names = history.reader.segments()
+    assert len(names) == 4
+    for i, name in enumerate(names):
+        age(tmp_path, [name], 1000 - i * 100)
+    newest = os.path.getmtime(os.path.join(tmp_path, names[-1]))
+
+    history.segment_bytes = 4096
+    assert history.compact() == 3
+    assert history.reader.segments() == names[:1]
+    assert os.path.getmtime(os.path.join(tmp_path, names[0])) == pytest.approx(newest)
+    assert [r["content"] for r in history.query()] == ["0", "1", "2", "3"]
+
+
+def test_retention_expires_compacted_segments(tmp_path, make_history):
+    history = make_history(segment_bytes=1, retention_seconds=500)
+    write(history, [{"agent_id": "a", "content": str(i)} for i in range(3)])
+    history.close()
+    age(tmp_path, history.reader.segments(), 1000)
+    history.segment_bytes = 4096
+    assert history.compact() == 2
+
+    assert history.maintain() == {"deleted": 1, "merged": 0}
+    assert history.reader.segments() == []
+    assert list(history.query()) == []
+
+
+def test_retention_keeps_recent_segments(tmp_path, make_history):
+    history = make_history(segment_bytes=1, retention_seconds=500)
+    write(history, [{"agent_id": "a", "content": str(i)} for i in range(3)])
+    names = history.reader.segments()
+    age(tmp_path, names[:2], 1000)
+
+    assert history.maintain()["deleted"] == 2
+    assert [r["content"] for r in history.query()] == ["2"]
+
+
+def test_retention_bytes_drops_oldest_first(make_history):
+    history = make_history(segment_bytes=1)
+    write(history, [{"agent_id": "a", "content": str(i)} for i in range(4)])
+    history.retention_bytes = sum(os.path.getsize(os.path.join(history.directory, name))
+                                  for name in history.reader.segments()[-2:])
+
+    assert history.maintain()["deleted"] == 2
+    assert [r["content"] for r in history.query()] == ["2", "3"]
+
+
+def test_memory_history_keeps_recent_per_agent():
+    history = MemoryHistory(keep_recent=2)
+    for i in range(3):
+        history.append({"agent_id": "a", "content": str(i)})
+
+    assert [r["content"] for r in history.recent("a")] == ["1", "2"]
+    assert [r["content"] for r in history.query(agent_id="a", newest_first=True)] == ["2", "1"]
+
+
+def test_write_error_fails_waiters_and_later_appends(make_history, monkeypatch):
+    history = make_history(fsync=True)
+    write(history, [{"agent_id": "a", "content": "已落盘"}])
+
+    def fail(fd):
+        raise OSError(errno.ENOSPC, "磁盘已满")
+
+    monkeypatch.setattr(conversation_log.os, "fsync", fail)
+    history.append({"agent_id": "a", "content": "写入失败"})
+    with pytest.raises(RuntimeError) as info:
+        history.sync(timeout=5)
+    assert isinstance(info.value.__cause__, OSError)
+    with pytest.raises(RuntimeError):
+        history.append({"agent_id": "a", "content": "之后的追加"})
+
+    history.close()
+    assert [record["content"] for record in history.query()][0] == "已落盘"
@@ -0,0 +1,70 @@
+import pytest
+
+from fuzzy_index import FuzzyIndex, edit_distance
+
+
+@pytest.fixture
+def index():
+    index = FuzzyIndex(max_distance=1)
+    index.update(["一心一意", "三心二意", "万无一失"], "成语")
+    index.update(["泥菩萨过河", "八仙过海"], "歇后语")
+    return index
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("一心一意", "一心一意", 0),
+    ("一心一意", "一心一义", 1),   # 替换
+    ("一心一意", "一心意", 1),     # 删除
+    ("一心一意", "一心意一", 1),   # 相邻互换
+    ("一心一意", "三心二意", 2),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 2) == distance
+
+
+def test_edit_distance_stops_at_limit():
+    assert edit_distance("一心一意", "万无一失", 1) == 2
+
+
+def test_lookup_exact_and_misspelled(index):
+    assert index.lookup("一心一意").distance == 0
+    match = index.lookup("一心一义")
+    assert (match.entry, match.distance, match.value) == ("一心一意", 1, "成语")
+    assert index.lookup("一心一义", max_distance=0) is None
+    assert index.lookup("完全不同的词") is None
+
+
+def test_short_entries_only_match_exactly():
+    index = FuzzyIndex(max_distance=1, min_length=3)
+    index.add("电脑")
+    assert index.lookup("电脑") is not None
+    assert index.lookup("电视") is None
+
+
+def test_duplicate_keeps_first_value(index):
+    index.add("一心一意", "歇后语")
+    assert len(index) == 5
+    assert index.lookup("一心一意").value == "成语"
+
+
+def test_search_inside_sentence(index):
+    match = index.search("他做事一心一义，从不分心")
+    assert (match.entry, match.distance) == ("一心一意", 1)
+    assert index.search("今天天气怎么样") is None
+
+
+def test_search_prefers_exact_then_longer(index):
+    assert index.search("泥菩萨过河，一心一意").entry == "泥菩萨过河"
+    assert index.search("一心一意地泥菩萨过哥").entry == "一心一意"
+
+
+def test_search_skips_fuzzy_for_long_text(index):
+    text = "一心一义" + "的" * 40
+    assert index.search(text) is None
+    assert index.search("一心一意" + "的" * 40, max_distance=0).entry == "一心一意"
+
+
+def test_contained_lists_every_exact_entry(index):
+    matches = index.contained("一心一意地泥菩萨过河")
+    assert [(m.entry, m.value) for m in matches] == [("泥菩萨过河", "歇后语"), ("一心一意", "成语")]
+    assert index.contained("一心一义") == []
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from conversation_log import SegmentedLogHistory
+from model import AgentManager, AgentMessage, SimpleTextAgent, TextCategory
+
+
+@pytest.fixture(scope="module")
+def agent():
+    return SimpleTextAgent("test_agent")
+
+
+def analyze(agent, text):
+    return asyncio.run(agent.process(AgentMessage(content=text)))
+
+
+def test_whole_text_noun(agent):
+    response = analyze(agent, "电脑")
+    assert response.metadata["category"] == TextCategory.NOUN.value
+    assert response.confidence == 0.85
+
+
+def test_noun_inside_sentence_is_less_certain(agent):
+    response = analyze(agent, "我的电脑坏了")
+    assert response.metadata["category"] == TextCategory.NOUN.value
+    assert response.confidence == 0.75
+    assert response.metadata["matched_entry"] == "电脑"
+    assert response.suggestions[0] == "关于电脑的详细介绍"
+
+
+def test_idiom_takes_precedence_over_xiehouyu(agent):
+    response = analyze(agent, "一心一意地泥菩萨过河")
+    assert response.metadata["category"] == TextCategory.IDIOM.value
+    assert response.metadata["matched_entry"] == "一心一意"
+
+
+def test_misspelled_idiom_is_corrected(agent):
+    response = analyze(agent, "一心一义")
+    assert response.metadata["category"] == TextCategory.IDIOM.value
+    assert response.metadata["matched_entry"] == "一心一意"
+    assert response.confidence == 0.76
+    assert "误写" in response.content
+
+
+@pytest.mark.parametrize("text, category", [
+    ("今天天气怎么样？", TextCategory.QUESTION),
+    ("请帮我完成这个任务", TextCategory.COMMAND),
+])
+def test_keyword_rules(agent, text, category):
+    assert analyze(agent, text).metadata["category"] == category.value
+
+
+def test_keywords_match_whole_tokens_only(agent):
+    # “邀请”中的“请”不是命令关键词
+    assert analyze(agent, "邀请朋友").metadata["category"] != TextCategory.COMMAND.value
+
+
+class SlowAgent(SimpleTextAgent):
+    """整段都在计算、从不 await 的Agent"""
+
+    blocking = True
+
+    def _analyze_text(self, text, tokens=None):
+        time.sleep(0.3)
+        return super()._analyze_text(text, tokens)
+
+
+def test_deadline_applies_to_blocking_agent():
+    manager = AgentManager()
+    manager.register_agent(SimpleTextAgent("fast"))
+    manager.register_agent(SlowAgent("slow"))
+
+    async def run():
+        # 在事件循环内计时：asyncio.run 退出时还会等待线程中的计算结束
+        started = time.perf_counter()
+        response = await manager.process_with_agents(["fast", "slow"], "一心一意",
+                                                     deadlines={"slow": 0.05})
+        return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(run())
+    assert elapsed < 0.25
+    assert response.metadata["agent_id"] == "fast"
+    assert {item["agent_id"]: item["status"] for item in response.metadata["fanout"]} == {
+        "fast": "success", "slow": "timeout"}
+
+
+def test_blocking_pool_instances_run_in_parallel():
+    manager = AgentManager()
+    manager.register_pool("pool", SlowAgent, size=3)
+
+    async def run():
+        return await asyncio.gather(*(manager.process_with_agent("pool", "电脑") for _ in range(3)))
+
+    started = time.perf_counter()
+    responses = asyncio.run(run())
+    assert time.perf_counter() - started < 0.6
+    assert sorted(r.metadata["instance_id"] for r in responses) == ["pool#0", "pool#1", "pool#2"]
+
+
+def test_pool_history_is_reachable_by_pool_id(tmp_path):
+    manager = AgentManager()
+    manager.register_pool("pool", SimpleTextAgent, size=2)
+    for text in ["一心一意", "电脑"]:
+        asyncio.run(manager.process_with_agent("pool", text))
+    pool = manager.get_agent("pool")
+    assert [r["content"] for r in pool.query_history()] == ["电脑", "一心一意"]
+    assert len(pool.conversation_history) == 2
+
+    history = SegmentedLogHistory(str(tmp_path), commit_interval=0, maintenance_interval=None, fsync=False)
+    try:
+        manager.set_history(history)
+        asyncio.run(manager.process_with_agent("pool", "泥菩萨过河"))
+        history.sync()
+        records = list(history.query(agent_id="pool"))
+        assert [(r["pool_id"], r["content"]) for r in records] == [("pool", "泥菩萨过河")]
+        assert records[0]["agent_id"] in ("pool#0", "pool#1")
+    finally:
+        history.close()
@@ -0,0 +1,61 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from model import AgentManager, AgentType, BaseAgent, ResponseStatus, TextCategory
+from ngram_classifier import NgramClassifier, NgramClassifierAgent
+
+SAMPLES = {
+    TextCategory.IDIOM.value: ["一心一意", "七上八下", "五花八门", "九牛一毛", "十全十美", "百发百中"],
+    TextCategory.QUESTION.value: ["今天天气怎么样？", "你叫什么名字？", "为什么天是蓝的？",
+                                  "明天去哪里？", "这是什么东西？", "怎么去学校？"],
+    TextCategory.COMMAND.value: ["请帮我关门", "请把书给我", "帮我打开电脑", "请马上出发",
+                                 "给我一杯水", "请安静一点"],
+}
+
+
+@pytest.fixture(scope="module")
+def weights(tmp_path_factory):
+    texts = [text for entries in SAMPLES.values() for text in entries]
+    labels = [label for label, entries in SAMPLES.items() for _ in entries]
+    model = NgramClassifier.train(texts, labels, n_features=2 ** 12, epochs=60)
+    path = str(tmp_path_factory.mktemp("ngram") / "ngram.npz")
+    model.save(path)
+    return model, path, texts, labels
+
+
+def test_train_save_load_predict(weights):
+    model, path, texts, labels = weights
+    loaded = NgramClassifier.load(path)
+    assert loaded.classes == model.classes
+    np.testing.assert_allclose(loaded.predict_proba(texts), model.predict_proba(texts))
+    assert [label for label, _ in loaded.predict(texts)] == labels
+
+
+def test_agent_registers_and_responds(weights):
+    _, path, _, _ = weights
+    agent = NgramClassifierAgent(NgramClassifier.load(path))
+    assert isinstance(agent, BaseAgent) and agent.blocking
+    assert not hasattr(agent, "fuzzy_index") and not hasattr(agent, "segmenter")
+
+    manager = AgentManager()
+    manager.register_agent(agent)
+    assert manager.get_agent("ngram_classifier") is agent
+    assert agent.get_stats()["agent_type"] == AgentType.CLASSIFIER.value
+
+    response = asyncio.run(manager.process_with_agent("ngram_classifier", "请帮我关门"))
+    assert response.status == ResponseStatus.SUCCESS
+    assert response.metadata["category"] == TextCategory.COMMAND.value
+    assert response.confidence == pytest.approx(response.metadata["probabilities"]["命令句"], abs=1e-4)
+    assert sum(response.metadata["probabilities"].values()) == pytest.approx(1, abs=1e-3)
+    assert agent.conversation_history[-1]["content"] == "请帮我关门"
+
+    empty = asyncio.run(manager.process_with_agent("ngram_classifier", "   "))
+    assert empty.status == ResponseStatus.ERROR
+
+
+def test_weights_with_unknown_classes_are_rejected():
+    model = NgramClassifier.train(["甲", "乙"], ["甲类", "乙类"], n_features=2 ** 8, epochs=1)
+    with pytest.raises(ValueError):
+        NgramClassifierAgent(model)
@@ -0,0 +1,54 @@
+import pytest
+
+from segmenter import Segmenter, Trie
+
+
+def test_trie_frequencies_and_prefixes():
+    trie = Trie()
+    trie.add("电脑", 10)
+    trie.add("电脑桌", 5)
+    trie.add("电脑", 20)
+    assert trie.get("电脑") == 20
+    assert trie.total == 25
+    assert "电" not in trie
+    assert trie.prefixes("电脑桌上", 0) == [(2, 20), (3, 5)]
+
+
+@pytest.mark.parametrize("sentence, tokens", [
+    ("我的电脑桌上有一部手机", ("我", "的", "电脑桌", "上", "有", "一", "部", "手机")),
+    ("今天天气怎么样？", ("今天", "天气", "怎么样", "？")),
+    ("邀请朋友", ("邀请", "朋友")),
+])
+def test_builtin_dictionary(sentence, tokens):
+    assert Segmenter().cut(sentence) == tokens
+
+
+def test_non_han_blocks_and_whitespace():
+    assert Segmenter().cut("用 Python3.11 写代码!") == ("用", "Python3.11", "写", "代", "码", "!")
+
+
+def test_custom_words_and_cache_invalidation():
+    segmenter = Segmenter({"一心": 10, "一意": 10})
+    assert segmenter.cut("一心一意") == ("一心", "一意")
+    segmenter.cut("一心一意")
+    assert segmenter.cache_info().hits == 1
+
+    segmenter.add_word("一心一意", 1000)
+    assert segmenter.cache_info().currsize == 0
+    assert segmenter.cut("一心一意") == ("一心一意",)
+
+
+def test_add_word_keeps_existing_frequency():
+    segmenter = Segmenter({"电脑": 50})
+    segmenter.add_word("电脑")
+    assert segmenter.trie.get("电脑") == 50
+    segmenter.add_word("电视")
+    assert segmenter.trie.get("电视") > 0
+
+
+def test_load_dictionary_file(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("# 注释\n泥菩萨 200\n过河\n", encoding="utf-8")
+    segmenter = Segmenter({})
+    segmenter.load(str(path))
+    assert segmenter.cut("泥菩萨过河") == ("泥菩萨", "过河")
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime
+
+from stats_snapshot import StatsSnapshotService
+
+
+class FakeManager:
+    def __init__(self):
+        self.version = 0
+        self.agents = {}
+
+
+def test_refresh_errors_do_not_stop_background_task():
+    manager = FakeManager()
+    calls = []
+
+    def build_stats():
+        calls.append(manager.version)
+        if len(calls) == 2:
+            raise RuntimeError("get_stats 失败")
+        return {"agents": [], "timestamp": datetime.now().isoformat(), "version": manager.version}
+
+    service = StatsSnapshotService(manager, build_stats, "测试", "1.0", refresh_interval=0.01)
+
+    async def run():
+        service.start()
+        manager.version = 1  # 第一次后台刷新失败
+        await asyncio.sleep(0.05)
+        assert service.errors == 1 and "get_stats 失败" in service.last_error
+        manager.version = 2  # 任务仍在运行，后续变化照常刷新
+        await asyncio.sleep(0.05)
+        await service.stop()
+
+    asyncio.run(run())
+    assert service.payload("stats")["version"] == 2
+    health = service.health()
+    assert health["refresh_errors"] == 1
+    assert health["snapshot_age"] is not None and service.age() >= 0
@@ -11,6 +11,10 @@ from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+from conversation_log import HistoryBackend, MemoryHistory
+from related_index import RelatedIndex
+from segmenter import Segmenter
+
 class TextCategory(Enum):
     """文本类别枚举"""
     NOUN = "名词"
@@ -35,6 +39,15 @@ class TextAnalyzer:
         self.idiom_patterns = self._load_idioms()
         self.xiehouyu_patterns = self._load_xiehouyu()
         self.noun_patterns = self._load_nouns()
+        # 分词词典包含全部词条，名词按分词结果判断
+        self.segmenter = Segmenter()
+        self.segmenter.add_words(self.idiom_patterns + self.xiehouyu_patterns + self.noun_patterns)
+        self.noun_set = set(self.noun_patterns)
+        # 成语、歇后语的相关词条，生成建议时直接查表
+        self.related_index = RelatedIndex.build({
+            TextCategory.IDIOM.value: self.idiom_patterns,
+            TextCategory.XIEHOUYU.value: self.xiehouyu_patterns
+        })
     
     def _load_idioms(self) -> List[str]:
         """加载常见成语模式"""
@@ -80,9 +93,10 @@ class TextAnalyzer:
         if self._is_xiehouyu(text):
             return self._analyze_xiehouyu(text)
         
-        # 检查是否为名词
-        if self._is_noun(text):
-            return self._analyze_noun(text)
+        # 检查是否包含名词
+        noun = self._find_noun(self.segmenter.cut(text))
+        if noun:
+            return self._analyze_noun(text, noun)
         
         # 默认为常规句子
         return self._analyze_sentence(text)
@@ -95,15 +109,16 @@ class TextAnalyzer:
         """判断是否为歇后语"""
         return any(xiehouyu in text for xiehouyu in self.xiehouyu_patterns)
     
-    def _is_noun(self, text: str) -> bool:
-        """判断是否为名词"""
-        return text in self.noun_patterns
+    def _find_noun(self, tokens) -> Optional[str]:
+        """分词结果中的第一个名词"""
+        return next((token for token in tokens if token in self.noun_set), None)
     
     def _analyze_idiom(self, text: str) -> AnalysisResult:
         """分析成语"""
+        related = self.related_index.related(TextCategory.IDIOM.value, text, limit=3)
         suggestions = [
             f"{text}的下一句",
-            f"与{text}意思相近的成语",
+            f"与{text}相关的成语：{'、'.join(related)}" if related else f"与{text}意思相近的成语",
             f"{text}的英文翻译"
         ]
         
@@ -117,10 +132,12 @@ class TextAnalyzer:
     
     def _analyze_xiehouyu(self, text: str) -> AnalysisResult:
         """分析歇后语"""
+        entry = next(xiehouyu for xiehouyu in self.xiehouyu_patterns if xiehouyu in text)
+        related = self.related_index.related(TextCategory.XIEHOUYU.value, entry, limit=3)
         suggestions = [
             f"{text}的下一句是什么？",
             f"{text}的寓意",
-            f"类似{text}的歇后语"
+            f"类似{entry}的歇后语：{'、'.join(related)}" if related else f"类似{text}的歇后语"
         ]
         
         return AnalysisResult(
@@ -131,21 +148,25 @@ class TextAnalyzer:
             explanation=f"'{text}'是一个歇后语的前半部分，通常后面跟着形象的比喻或双关语"
         )
     
-    def _analyze_noun(self, text: str) -> AnalysisResult:
+    def _analyze_noun(self, text: str, noun: str) -> AnalysisResult:
         """分析名词"""
         suggestions = [
-            f"关于{text}的详细介绍",
-            f"{text}的种类和分类",
-            f"如何选择合适的{text}",
-            f"{text}的发展趋势"
+            f"关于{noun}的详细介绍",
+            f"{noun}的种类和分类",
+            f"如何选择合适的{noun}",
+            f"{noun}的发展趋势"
         ]
         
+        if noun == text:
+            explanation = f"'{text}'是一个具体名词，可以进一步探讨其属性、特征或相关话题"
+        else:
+            explanation = f"'{text}'中包含名词'{noun}'，可以进一步探讨其属性、特征或相关话题"
         return AnalysisResult(
             original_text=text,
             category=TextCategory.NOUN,
-            confidence=0.85,
+            confidence=0.85 if noun == text else 0.75,
             suggestions=suggestions,
-            explanation=f"'{text}'是一个具体名词，可以进一步探讨其属性、特征或相关话题"
+            explanation=explanation
         )
     
     def _analyze_sentence(self, text: str) -> AnalysisResult:
@@ -174,19 +195,34 @@ class TextAnalyzer:
 class SmartAgent:
     """智能Agent主类"""
     
-    def __init__(self):
+    agent_id = "smart_agent"
+    
+    def __init__(self, history: Optional[HistoryBackend] = None):
         self.analyzer = TextAnalyzer()
-        self.conversation_history = []
+        # 对话历史后端，默认只在内存中保留最近100条；统计使用计数器，不依赖完整历史
+        self.history = history or MemoryHistory(keep_recent=100)
+        self.total_analyses = 0
+        self.category_counts: Dict[str, int] = {}
+    
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """最近的对话记录"""
+        return self.history.recent(self.agent_id)
     
     def process_input(self, user_input: str) -> Dict:
         """处理用户输入"""
         result = self.analyzer.analyze(user_input)
         
         # 保存对话历史
-        self.conversation_history.append({
+        self.history.append({
+            "agent_id": self.agent_id,
             "input": user_input,
-            "result": result
+            "category": result.category.value,
+            "confidence": result.confidence
         })
+        self.total_analyses += 1
+        category = result.category.value
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
         
         return {
             "status": "success",
@@ -201,17 +237,9 @@ class SmartAgent:
     
     def get_stats(self) -> Dict:
         """获取使用统计"""
-        if not self.conversation_history:
-            return {"total_analyses": 0, "categories": {}}
-        
-        categories = {}
-        for item in self.conversation_history:
-            cat = item["result"].category.value
-            categories[cat] = categories.get(cat, 0) + 1
-        
         return {
-            "total_analyses": len(self.conversation_history),
-            "categories": categories
+            "total_analyses": self.total_analyses,
+            "categories": dict(self.category_counts)
         }
 
 def main():
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬虫吞吐量基准
+在后台启动本地替身网站（fixture_site.py），用临时目录运行爬虫并报告每分钟下载的小说数
+
+用法：
+    python bench_crawl.py [--books 100] [--latency 20] [--error-rate 0.02] [--rate-limit 50]
+    python bench_crawl.py --workers 4          # 通过共享队列启动多个工作进程
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fixture_site import FixtureSite
+from frontier import Frontier
+from novel_spider import NovelSpider
+from postprocess import default_pipeline
+from rate_control import AdaptiveRateController
+
+
+def make_spider(args, site_url, download_dir):
+    """按基准参数配置爬虫：本地站点不需要防反爬延时，只保留可选的固定延时或自适应限速"""
+    spider = NovelSpider(site_url, download_dir)
+    spider.parser_backend = args.parser
+    spider.range_workers = args.range_workers
+    delay = (args.delay, args.delay)
+    spider.request_delay = spider.page_delay = spider.download_delay = delay
+    spider.retry_delay = (0.1, 0.2)
+    if args.adaptive:
+        spider.rate_controller = AdaptiveRateController(initial_rate=args.adaptive)
+    if args.postprocess:
+        spider.postprocess = default_pipeline()
+        spider.postprocess_workers = args.postprocess
+    return spider
+
+
+def run_worker(args, site_url, download_dir, frontier_path, worker_id):
+    spider = make_spider(args, site_url, download_dir)
+    spider.frontier = Frontier(frontier_path, host_interval=args.host_interval, retry_delay=1)
+    spider.worker_id = worker_id
+    try:
+        spider.run_worker()
+    finally:
+        spider.frontier.close()
+        spider.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫吞吐量基准')
+    parser.add_argument('--books', type=int, default=100, help='小说数量')
+    parser.add_argument('--per-page', type=int, default=25, help='每页小说数')
+    parser.add_argument('--txt-size', type=int, default=200, help='正文大小（KB）')
+    parser.add_argument('--latency', type=float, default=20, help='站点基础延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=10, help='站点随机附加延迟（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='站点返回503的比例')
+    parser.add_argument('--rate-limit', type=float, help='站点每秒允许的请求数')
+    parser.add_argument('--delay', type=float, default=0, help='爬虫固定请求延时（秒）')
+    parser.add_argument('--adaptive', type=float, help='启用自适应限速，参数为初始速率（次/秒）')
+    parser.add_argument('--parser', default='auto', help='解析后端')
+    parser.add_argument('--range-workers', type=int, default=1, help='分段下载连接数')
+    parser.add_argument('--postprocess', type=int, default=0, help='后处理进程数（默认0，不处理）')
+    parser.add_argument('--categories',
+                        help='多分类模式，格式为 分类:小说数,...，例如 1:200,2:20,3:20')
+    parser.add_argument('--concurrency', type=int, default=4, help='多分类模式的全局并发数')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='共享队列工作进程数（默认0，即单进程 crawl_pages）')
+    parser.add_argument('--host-interval', type=float, default=0,
+                        help='共享队列的主机请求间隔（秒）')
+    parser.add_argument('--keep', action='store_true', help='保留下载目录')
+    args = parser.parse_args()
+
+    categories = None
+    if args.categories:
+        categories = {}
+        for item in args.categories.split(','):
+            category, count = item.split(':')
+            categories[int(category)] = int(count)
+
+    site = FixtureSite(books=args.books, per_page=args.per_page, txt_size=args.txt_size * 1024,
+                       latency=args.latency / 1000, jitter=args.jitter / 1000,
+                       error_rate=args.error_rate, rate_limit=args.rate_limit,
+                       categories=categories)
+    site_url = site.start()
+    download_dir = tempfile.mkdtemp(prefix='bench_crawl_')
+    print(f"替身网站: {site_url}，{site.books} 本小说 / {site.pages} 页，下载目录: {download_dir}")
+
+    start = time.perf_counter()
+    try:
+        if categories:
+            spider = make_spider(args, site_url, download_dir)
+            spider.write_report = False
+            try:
+                spider.crawl_categories(list(categories),
+                                        max(site.pages_for(c) for c in categories),
+                                        args.concurrency)
+            finally:
+                spider.close()
+        elif args.workers:
+            frontier_path = os.path.join(download_dir, 'frontier.db')
+            seeder = make_spider(args, site_url, download_dir)
+            seeder.frontier = Frontier(frontier_path)
+            # crawl_pages 从第1页爬到 max_pages + 1 页，这里保持相同的页数
+            seeder.seed_frontier(1, site.pages - 1)
+            seeder.frontier.close()
+            seeder.close()
+
+            processes = [multiprocessing.Process(
+                target=run_worker,
+                args=(args, site_url, download_dir, frontier_path, f"bench-{i}"))
+                for i in range(args.workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        else:
+            spider = make_spider(args, site_url, download_dir)
+            spider.write_report = False
+            try:
+                spider.crawl_pages(1, site.pages - 1)
+            finally:
+                spider.close()
+        elapsed = time.perf_counter() - start
+
+        spider = make_spider(args, site_url, download_dir)
+        downloaded = spider.state.counts().get('done', 0)
+        spider.close()
+    finally:
+        site.stop()
+        if not args.keep:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    print("-" * 72)
+    if categories:
+        mode = f"多分类 {len(categories)} 个，并发 {args.concurrency}"
+    elif args.workers:
+        mode = f"共享队列 x{args.workers}"
+    else:
+        mode = "单进程"
+    print(f"模式: {mode}，"
+          f"耗时 {elapsed:.1f} 秒，下载 {downloaded}/{site.books} 本")
+    print(f"吞吐量: {downloaded / elapsed * 60:.1f} 本/分钟")
+    print(f"站点统计: 请求 {site.stats['requests']} 次，{site.stats['bytes'] / 1024 / 1024:.1f} MB，"
+          f"状态码 {site.stats['status']}，按类型 {site.stats['paths']}")
+    return 0 if downloaded == site.books else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
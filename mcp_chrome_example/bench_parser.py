@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析后端性能对比
+在 fixtures/ 中保存的页面上比较各解析后端的吞吐量（页/秒）
+
+用法：
+    python bench_parser.py [重复次数]
+"""
+
+import os
+import sys
+import time
+
+import page_parser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# (页面文件, 解析函数)
+CASES = [
+    ('list_page.html', page_parser.parse_novel_list),
+    ('detail_page.html', page_parser.find_download_hrefs),
+    ('detail_page_text_link.html', page_parser.find_download_hrefs),
+    ('read_page.html', page_parser.find_txt_href),
+]
+
+
+def available_backends():
+    """当前环境可用的解析后端"""
+    return [b for b in page_parser.BACKENDS if b != 'lxml' or page_parser.HAS_LXML]
+
+
+def bench(func, html, backend, rounds):
+    """返回每秒解析页数"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(html, backend)
+    return rounds / (time.perf_counter() - start)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    backends = available_backends()
+
+    print(f"重复次数: {rounds}，后端: {', '.join(backends)}")
+    print("-" * 72)
+    for filename, func in CASES:
+        with open(os.path.join(FIXTURE_DIR, filename), 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        # 先确认各后端结果一致，再比较速度
+        expected = func(html, 'bs4')
+        for backend in backends:
+            if func(html, backend) != expected:
+                print(f"{filename}: {backend} 的解析结果与bs4不一致")
+                return 1
+
+        baseline = None
+        for backend in backends:
+            pages_per_sec = bench(func, html, backend, rounds)
+            baseline = baseline or pages_per_sec
+            print(f"{filename:<28} {func.__name__:<20} {backend:<7} "
+                  f"{pages_per_sec:>9.1f} 页/秒  x{pages_per_sec / baseline:.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节索引
+一次流式扫描找出UTF-8小说文件中的章节标题（第X章、序章、番外等），把每章的字节偏移
+写入紧凑的二进制索引文件（<文件>.chapters），阅读时通过mmap直接定位任意章节或字节区间
+
+用法：
+    python chapter_index.py build <小说文件>...
+    python chapter_index.py show <小说文件> [章节序号]
+"""
+
+import mmap
+import os
+import re
+import struct
+import sys
+
+INDEX_SUFFIX = '.chapters'
+
+# 索引文件头：魔数、版本、偏移宽度（4或8字节）、章节数、正文大小、正文修改时间（纳秒）
+MAGIC = b'CHIX'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHIQQ')
+
+# 章节标题只在行首匹配，允许前导空白（含全角空格）；超过长度上限的行视为正文。
+# “第X章”后可以直接接标题（第一章天命），其他单位后必须是行尾、空白或分隔符，
+# 避免“第一节课”“第二部分”这类正文被当成标题
+NUMERALS = ['零', '〇', '一', '二', '两', '三', '四', '五', '六', '七', '八', '九',
+            '十', '百', '千', '万', '壹', '贰', '叁', '肆', '伍', '陆', '柒', '捌', '玖', '拾', '佰', '仟']
+UNITS = ['章', '节', '回', '卷', '集', '部', '篇']
+SPECIAL = ['序章', '序言', '楔子', '引子', '尾声', '后记', '番外', '终章', '完本感言']
+SEPARATORS = ['：', ':', '、', '．', '.', '·', '—', '-', '（', '(', '【', '[']
+# 标题中不会出现的句读；紧接标题词、没有分隔的文字中出现逗号时也是正文
+SENTENCE_MARKS = '。；'
+
+
+def _alternation(words):
+    """字节正则中不能用字符类匹配多字节字符，改用UTF-8编码后的分支"""
+    return b'|'.join(re.escape(word.encode('utf-8')) for word in words)
+
+
+# 在UTF-8字节上直接匹配，不需要先解码整个文件；全角数字为 EF BC 90-99
+_BREAK = rb'(?=[ \t\r]|\xe3\x80\x80|$|' + _alternation(SEPARATORS) + rb')'
+HEADING_RE = re.compile(
+    rb'^(?:[ \t]|\xe3\x80\x80)*(?:'
+    + '第'.encode('utf-8') + rb'(?:[0-9]|\xef\xbc[\x90-\x99]|' + _alternation(NUMERALS) + rb')+'
+    + rb'(?:' + '章'.encode('utf-8')
+    + rb'|(?:' + _alternation([unit for unit in UNITS if unit != '章']) + rb')' + _BREAK + rb')'
+    + rb'|' + _alternation(SPECIAL) + rb')',
+    re.MULTILINE)
+MAX_HEADING_BYTES = 150
+
+
+def reads_like_body(rest):
+    """标题词之后的文字 rest 是否像正文段落：含句号、分号，或没有分隔直接接着带逗号的句子"""
+    if any(mark in rest for mark in SENTENCE_MARKS):
+        return True
+    return bool(rest) and not rest[0].isspace() and rest[0] not in SEPARATORS and '，' in rest
+
+
+def is_heading(line):
+    """一行文本（str）是否为章节标题"""
+    data = line.encode('utf-8')
+    match = HEADING_RE.match(data)
+    return (match is not None and len(data) <= MAX_HEADING_BYTES
+            and not reads_like_body(data[match.end():].decode('utf-8', errors='replace')))
+
+
+class ChapterIndexer:
+    """流式章节扫描器：按块 feed 文件内容，close 返回 [(字节偏移, 标题)]"""
+
+    def __init__(self, max_heading_bytes=MAX_HEADING_BYTES):
+        self.max_heading_bytes = max_heading_bytes
+        self.entries = []
+        self.offset = 0         # 缓冲区起点在文件中的偏移
+        self.buffer = b''       # 上一块末尾不完整的一行
+        self.skip_line = False  # 当前行已超过标题长度上限，跳到下一个换行
+
+    def feed(self, data):
+        if self.skip_line:
+            newline = data.find(b'\n')
+            if newline == -1:
+                self.offset += len(data)
+                return
+            self.offset += newline + 1
+            data = data[newline + 1:]
+            self.skip_line = False
+
+        buffer = self.buffer + data
+        end = buffer.rfind(b'\n') + 1
+        if end:
+            self._scan(buffer, end)
+        rest = buffer[end:]
+        if len(rest) > self.max_heading_bytes:
+            # 超长的行不可能是标题，不再缓存
+            self.offset += len(buffer)
+            self.buffer = b''
+            self.skip_line = True
+        else:
+            self.offset += end
+            self.buffer = rest
+
+    def close(self):
+        if self.buffer:
+            self._scan(self.buffer, len(self.buffer))
+            self.offset += len(self.buffer)
+            self.buffer = b''
+        return self.entries
+
+    def _scan(self, buffer, end):
+        for match in HEADING_RE.finditer(buffer, 0, end):
+            start = match.start()
+            line_end = buffer.find(b'\n', start, end)
+            if line_end == -1:
+                line_end = end
+            if line_end - start > self.max_heading_bytes:
+                continue
+            if reads_like_body(buffer[match.end():line_end].decode('utf-8', errors='replace').rstrip()):
+                continue
+            title = buffer[start:line_end].decode('utf-8', errors='replace').strip()
+            self.entries.append((self.offset + start, title))
+
+
+def index_path_for(path):
+    return path + INDEX_SUFFIX
+
+
+def build_index(path, index_path=None, chunk_size=1024 * 1024):
+    """扫描小说文件并写入章节索引，返回章节数"""
+    index_path = index_path or index_path_for(path)
+    stat = os.stat(path)
+    indexer = ChapterIndexer()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            indexer.feed(chunk)
+    entries = indexer.close()
+    write_index(index_path, entries, stat.st_size, stat.st_mtime_ns)
+    return len(entries)
+
+
+def write_index(index_path, entries, file_size, mtime_ns=0):
+    """写入索引文件
+
+    布局：文件头 | 章节偏移[n+1]（最后一项为文件大小） | 标题偏移[n+1]（uint32） | 标题（UTF-8）
+    偏移为定宽整数，按序号直接计算位置读取，不需要解析整个索引。
+    """
+    width = 4 if file_size < 2 ** 32 else 8
+    offset_format = '<%d%s' % (len(entries) + 1, 'I' if width == 4 else 'Q')
+
+    titles = [title.encode('utf-8') for _, title in entries]
+    title_offsets = [0]
+    for title in titles:
+        title_offsets.append(title_offsets[-1] + len(title))
+
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, 0, len(entries), file_size, mtime_ns))
+        f.write(struct.pack(offset_format, *([offset for offset, _ in entries] + [file_size])))
+        f.write(struct.pack('<%dI' % len(title_offsets), *title_offsets))
+        f.write(b''.join(titles))
+    os.replace(temp_path, index_path)
+
+
+def index_is_current(path, index_path=None):
+    """索引存在且与正文的大小和修改时间一致"""
+    index_path = index_path or index_path_for(path)
+    try:
+        with open(index_path, 'rb') as f:
+            header = f.read(HEADER.size)
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if len(header) < HEADER.size:
+        return False
+    magic, version, _, _, _, file_size, mtime_ns = HEADER.unpack(header)
+    return (magic == MAGIC and version == VERSION
+            and file_size == stat.st_size and mtime_ns == stat.st_mtime_ns)
+
+
+def ensure_index(path, index_path=None):
+    """索引不存在或已过期时重建，返回是否重建"""
+    if index_is_current(path, index_path):
+        return False
+    build_index(path, index_path)
+    return True
+
+
+class ChapterReader:
+    """通过mmap按章节随机读取小说，不把文件整体读入内存
+
+    正文第一个章节标题之前的内容（书名、简介等）不计入章节，可用 preface 读取。
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or index_path_for(path)
+        self._file = open(path, 'rb')
+        self._index_file = open(self.index_path, 'rb')
+        try:
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, width, _, count, file_size, _ = HEADER.unpack_from(self._index, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不是有效的章节索引: {self.index_path}")
+            if file_size != os.fstat(self._file.fileno()).st_size:
+                raise ValueError(f"章节索引已过期，请重新生成: {self.index_path}")
+            self._data = (mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                          if file_size else b'')
+        except BaseException:
+            self.close()
+            raise
+
+        self.count = count
+        self.size = file_size
+        self._offset_format = '<I' if width == 4 else '<Q'
+        self._width = width
+        self._offsets_at = HEADER.size
+        self._title_offsets_at = self._offsets_at + (count + 1) * width
+        self._titles_at = self._title_offsets_at + (count + 1) * 4
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _offset(self, i):
+        return struct.unpack_from(self._offset_format, self._index,
+                                  self._offsets_at + i * self._width)[0]
+
+    def _check(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(f"章节序号超出范围: {i}（共 {self.count} 章）")
+        return i
+
+    def title(self, i):
+        """第 i 章（从0开始）的标题"""
+        i = self._check(i)
+        start, end = struct.unpack_from('<II', self._index, self._title_offsets_at + i * 4)
+        return bytes(self._index[self._titles_at + start:self._titles_at + end]).decode('utf-8')
+
+    def titles(self):
+        return [self.title(i) for i in range(self.count)]
+
+    def chapter_range(self, i):
+        """第 i 章在文件中的字节区间 (start, end)，包含标题行"""
+        i = self._check(i)
+        return self._offset(i), self._offset(i + 1)
+
+    def chapter_bytes(self, i):
+        start, end = self.chapter_range(i)
+        return bytes(self._data[start:end])
+
+    def chapter(self, i):
+        """第 i 章的文本"""
+        return self.chapter_bytes(i).decode('utf-8', errors='replace')
+
+    def preface(self):
+        """第一章之前的内容"""
+        end = self._offset(0) if self.count else self.size
+        return bytes(self._data[:end]).decode('utf-8', errors='replace')
+
+    def read_range(self, start, end):
+        """读取任意字节区间"""
+        start = max(0, start)
+        end = min(self.size, end)
+        return bytes(self._data[start:end]) if start < end else b''
+
+    def find(self, keyword):
+        """标题包含关键字的章节序号列表"""
+        return [i for i in range(self.count) if keyword in self.title(i)]
+
+    def close(self):
+        for name in ('_data', '_index'):
+            value = getattr(self, name, None)
+            if isinstance(value, mmap.mmap):
+                value.close()
+        for name in ('_file', '_index_file'):
+            value = getattr(self, name, None)
+            if value is not None:
+                value.close()
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'show'):
+        print(__doc__)
+        return 1
+
+    if sys.argv[1] == 'build':
+        for path in sys.argv[2:]:
+            print(f"{path}: {build_index(path)} 章")
+        return 0
+
+    path = sys.argv[2]
+    ensure_index(path)
+    with ChapterReader(path) as reader:
+        if len(sys.argv) > 3:
+            sys.stdout.write(reader.chapter(int(sys.argv[3])))
+            return 0
+        for i, title in enumerate(reader.titles()):
+            start, end = reader.chapter_range(i)
+            print(f"{i:>5}  {title}  [{start}, {end})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬取计量
+按阶段记录每个请求的延迟、字节数、状态码和重试次数，以及工作与等待耗时，
+运行结束时生成包含吞吐量与分位数统计的JSON报告
+"""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, p):
+    """最近秩法分位数（秩为 ceil(p/100 * n)），sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    # 先乘后除，整数百分位不会因浮点误差多进一位
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100.0) - 1))
+    return sorted_values[index]
+
+
+class CrawlMetrics:
+    """爬取计量，线程安全
+
+    阶段（stage）是任意字符串，爬虫使用 list、detail、read、probe、download、
+    parse、write、store 等。请求类阶段记录延迟和字节数；所有阶段都可以
+    记录工作耗时（timer）与等待耗时（add_sleep）。
+    """
+
+    def __init__(self, slowest=10):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.slowest_limit = slowest
+
+        self.latencies = defaultdict(list)
+        self.status_counts = defaultdict(lambda: defaultdict(int))
+        self.bytes = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.work_seconds = defaultdict(float)
+        self.sleep_seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.slowest = []  # (延迟, 阶段, URL, 状态码)
+
+    def record_request(self, stage, url, status, latency, nbytes=0, retries=0):
+        """记录一次请求；status 为None表示超时或连接失败"""
+        with self.lock:
+            self.latencies[stage].append(latency)
+            self.status_counts[stage][str(status) if status is not None else 'error'] += 1
+            self.bytes[stage] += nbytes
+            self.retries[stage] += retries
+            if status is None:
+                self.errors[stage] += 1
+            if len(self.slowest) < self.slowest_limit or latency > self.slowest[-1][0]:
+                self.slowest.append((latency, stage, url, status))
+                self.slowest.sort(key=lambda item: -item[0])
+                del self.slowest[self.slowest_limit:]
+
+    def add_bytes(self, stage, nbytes):
+        """记录流式读取的响应体字节数"""
+        with self.lock:
+            self.bytes[stage] += nbytes
+
+    def add_sleep(self, stage, seconds):
+        """记录限速等待耗时"""
+        if seconds > 0:
+            with self.lock:
+                self.sleep_seconds[stage] += seconds
+
+    def add_work(self, stage, seconds):
+        """记录工作耗时"""
+        with self.lock:
+            self.work_seconds[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        """统计代码块的工作耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_work(stage, time.perf_counter() - start)
+
+    def incr(self, name, count=1):
+        """累加计数器"""
+        with self.lock:
+            self.counters[name] += count
+
+    def report(self, extra=None):
+        """生成报告字典"""
+        with self.lock:
+            elapsed = time.perf_counter() - self.start
+            stages = {}
+            names = (set(self.latencies) | set(self.work_seconds)
+                     | set(self.sleep_seconds) | set(self.bytes))
+            for stage in sorted(names):
+                latencies = sorted(self.latencies.get(stage, []))
+                stages[stage] = {
+                    'requests': len(latencies),
+                    'status': dict(self.status_counts.get(stage, {})),
+                    'errors': self.errors.get(stage, 0),
+                    'retries': self.retries.get(stage, 0),
+                    'bytes': self.bytes.get(stage, 0),
+                    'bytes_per_sec': round(self.bytes.get(stage, 0) / elapsed, 1) if elapsed else 0.0,
+                    'latency': {
+                        'mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+                        'p50': percentile(latencies, 50),
+                        'p90': percentile(latencies, 90),
+                        'p99': percentile(latencies, 99),
+                        'max': latencies[-1] if latencies else None
+                    },
+                    'work_seconds': round(self.work_seconds.get(stage, 0.0), 3),
+                    'sleep_seconds': round(self.sleep_seconds.get(stage, 0.0), 3)
+                }
+
+            total_bytes = sum(self.bytes.values())
+            report = {
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+                'elapsed_seconds': round(elapsed, 3),
+                'total_requests': sum(len(v) for v in self.latencies.values()),
+                'total_bytes': total_bytes,
+                'bytes_per_sec': round(total_bytes / elapsed, 1) if elapsed else 0.0,
+                'sleep_seconds': round(sum(self.sleep_seconds.values()), 3),
+                'counters': dict(self.counters),
+                'stages': stages,
+                'slowest_requests': [
+                    {'latency': latency, 'stage': stage, 'url': url, 'status': status}
+                    for latency, stage, url, status in self.slowest
+                ]
+            }
+
+        minutes = elapsed / 60.0
+        if minutes and 'downloaded' in report['counters']:
+            report['books_per_min'] = round(report['counters']['downloaded'] / minutes, 2)
+        if extra:
+            report.update(extra)
+        return report
+
+    def write_report(self, path, extra=None):
+        """把报告写入JSON文件，返回报告字典"""
+        report = self.report(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬取状态持久化
+使用SQLite记录每本小说的下载状态、内容哈希与缓存校验头，支持增量重爬
+"""
+
+import sqlite3
+import threading
+import time
+
+# 下载状态
+STATUS_SEEN = 'seen'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class CrawlState:
+    """爬取状态库，一本小说（以详情页URL为键）对应一行记录"""
+
+    def __init__(self, db_path, journal_mode='WAL', timeout=30):
+        """多台机器通过网络文件系统共享状态库时，journal_mode 应使用 DELETE，
+        WAL 依赖共享内存，只适用于同一台机器上的多个进程"""
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+        with self.lock, self.conn:
+            self.conn.execute(f'PRAGMA journal_mode={journal_mode}')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS books (
+                    url TEXT PRIMARY KEY,
+                    book_id TEXT,
+                    title TEXT,
+                    author TEXT,
+                    status TEXT NOT NULL DEFAULT 'seen',
+                    download_url TEXT,
+                    file_path TEXT,
+                    content_hash TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    first_seen REAL,
+                    last_seen REAL,
+                    last_checked REAL,
+                    downloaded_at REAL,
+                    last_seen_run TEXT
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_books_book_id ON books (book_id)')
+            # 旧版状态库没有 last_seen_run 列
+            columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(books)')]
+            if 'last_seen_run' not in columns:
+                self.conn.execute('ALTER TABLE books ADD COLUMN last_seen_run TEXT')
+
+    def get(self, url):
+        """查询一本小说的记录，不存在返回None"""
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM books WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def is_done(self, url):
+        """是否已经下载完成"""
+        record = self.get(url)
+        return record is not None and record['status'] == STATUS_DONE
+
+    def mark_seen(self, novel, book_id=None, run_id=None):
+        """记录在列表页中出现的小说；run_id 为本次运行的标识，用于判断运行内的重复"""
+        with self.lock, self.conn:
+            self._upsert_seen(novel, book_id, run_id)
+
+    def see(self, novel, book_id=None, run_id=None):
+        """原子地查询并记录一本出现在列表页中的小说，返回记录之前的状态（新小说为None）"""
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT * FROM books WHERE url = ?',
+                                    (novel['url'],)).fetchone()
+            self._upsert_seen(novel, book_id, run_id)
+        return dict(row) if row else None
+
+    def _upsert_seen(self, novel, book_id, run_id):
+        now = time.time()
+        self.conn.execute('''
+            INSERT INTO books (url, book_id, title, author, status, first_seen, last_seen,
+                               last_seen_run)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                book_id = COALESCE(excluded.book_id, books.book_id),
+                title = excluded.title,
+                author = excluded.author,
+                last_seen = excluded.last_seen,
+                last_seen_run = COALESCE(excluded.last_seen_run, books.last_seen_run)
+        ''', (novel['url'], book_id, novel['title'], novel['author'],
+              STATUS_SEEN, now, now, run_id))
+
+    def max_rowid(self):
+        with self.lock:
+            return self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM books').fetchone()[0]
+
+    def urls_since(self, rowid=0, batch_size=10000):
+        """按插入顺序逐批产出 rowid 大于给定值的 (rowid, url)，用于增量同步URL过滤器"""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT rowid, url FROM books WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], row[1]
+            rowid = rows[-1][0]
+
+    def mark_downloaded(self, url, download_url, file_path, content_hash,
+                        etag=None, last_modified=None):
+        """记录下载成功"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('''
+                UPDATE books SET status = ?, download_url = ?, file_path = ?,
+                    content_hash = ?, etag = ?, last_modified = ?,
+                    attempts = attempts + 1, last_checked = ?, downloaded_at = ?
+                WHERE url = ?
+            ''', (STATUS_DONE, download_url, file_path, content_hash,
+                  etag, last_modified, now, now, url))
+
+    def mark_unchanged(self, url):
+        """条件请求返回304，只更新检查时间"""
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE books SET last_checked = ? WHERE url = ?',
+                              (time.time(), url))
+
+    def mark_failed(self, url):
+        """记录下载失败；已完成的记录保持完成状态"""
+        with self.lock, self.conn:
+            self.conn.execute('''
+                UPDATE books SET attempts = attempts + 1,
+                    status = CASE WHEN status = ? THEN status ELSE ? END
+                WHERE url = ?
+            ''', (STATUS_DONE, STATUS_FAILED, url))
+
+    def counts(self):
+        """按状态统计记录数"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT status, COUNT(*) AS n FROM books GROUP BY status').fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
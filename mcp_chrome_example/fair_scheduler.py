@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公平调度
+多个任务队列共享一个全局并发额度：每次有空闲额度时按轮转顺序从下一个有待处理任务的队列中
+取任务，任务量大的队列不会饿死小队列；只有一个队列有任务时它可以用满全部额度
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class TaskQueue:
+    """单个队列的待处理任务与统计"""
+
+    def __init__(self, name, limit=None):
+        self.name = name
+        self.limit = limit  # 该队列同时运行的任务上限，None表示只受全局额度限制
+        self.pending = deque()
+        self.running = 0
+        self.dispatched = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def ready(self):
+        return bool(self.pending) and (self.limit is None or self.running < self.limit)
+
+    def stats(self):
+        return {'pending': len(self.pending), 'running': self.running,
+                'dispatched': self.dispatched, 'completed': self.completed,
+                'failed': self.failed, 'busy_seconds': round(self.busy_seconds, 3)}
+
+
+class FairScheduler:
+    """轮转公平调度器
+
+    concurrency 为全局并发额度（同时运行的任务数，也就是同时占用的连接数）。
+    handler(queue_name, task) 在工作线程中执行，返回的可迭代对象中的每一项
+    (task, front) 加入同一队列；front 为True时插到队首。
+    """
+
+    def __init__(self, concurrency=4, per_queue_limit=None):
+        self.concurrency = concurrency
+        self.per_queue_limit = per_queue_limit
+        self.queues = OrderedDict()
+        self.lock = threading.Lock()
+        self._order = deque()  # 轮转顺序
+
+    def add_queue(self, name, limit=None):
+        if name not in self.queues:
+            self.queues[name] = TaskQueue(name, limit if limit is not None else self.per_queue_limit)
+            self._order.append(name)
+        return self.queues[name]
+
+    def push(self, name, task, front=False):
+        queue = self.add_queue(name)
+        with self.lock:
+            if front:
+                queue.pending.appendleft(task)
+            else:
+                queue.pending.append(task)
+
+    def _next(self):
+        """按轮转顺序取下一个可运行的任务，没有返回None"""
+        with self.lock:
+            for _ in range(len(self._order)):
+                name = self._order[0]
+                self._order.rotate(-1)
+                queue = self.queues[name]
+                if queue.ready():
+                    queue.running += 1
+                    queue.dispatched += 1
+                    return queue, queue.pending.popleft()
+        return None
+
+    def _run_task(self, handler, queue, task):
+        start = time.perf_counter()
+        try:
+            return handler(queue.name, task) or ()
+        finally:
+            # 在工作线程中执行：+= 不是原子操作，与 stats() 的读取同样需要加锁
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                queue.busy_seconds += elapsed
+
+    def run(self, handler):
+        """运行直到所有队列都处理完"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            running = {}
+            while True:
+                while len(running) < self.concurrency:
+                    picked = self._next()
+                    if picked is None:
+                        break
+                    queue, task = picked
+                    running[executor.submit(self._run_task, handler, queue, task)] = queue
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    queue = running.pop(future)
+                    with self.lock:
+                        queue.running -= 1
+                    try:
+                        follow_ups = future.result()
+                    except Exception as e:
+                        print(f"[{queue.name}] 任务出错: {e}")
+                        queue.failed += 1
+                        continue
+                    queue.completed += 1
+                    for task, front in follow_ups:
+                        self.push(queue.name, task, front)
+
+    def stats(self):
+        with self.lock:
+            return {name: queue.stats() for name, queue in self.queues.items()}
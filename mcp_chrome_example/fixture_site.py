@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地替身网站
+模拟奇书网的列表页、详情页与TXT下载，页面为GBK编码的合成内容（按书籍ID确定性生成），
+也可以从目录中读取录制的页面；支持配置延迟、错误注入、限流（429 + Retry-After）与Range请求
+
+用法：
+    python fixture_site.py [--port 8000] [--books 300] [--latency 50] [--error-rate 0.05] [--rate-limit 20]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 合成正文使用的字符，都能用GBK编码
+CHARS = '天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏剑尊仙魔神灵星域帝道武界'
+
+LIST_PATH = '/xuanhuanxiaoshuo/'
+LIST_PAGE_RE = re.compile(r'^/list/(\d+)_(\d+)\.html$')
+BOOK_RE = re.compile(r'^/book/(\d+)/?$')
+DOWNLOAD_PATH = '/modules/article/txtarticle.php'
+
+# 每个分类的书籍ID区间：分类c从 first_id + (c-1) * CATEGORY_STRIDE 开始
+CATEGORY_STRIDE = 100000
+
+# 服务器启动时间作为所有下载的Last-Modified
+STARTED = formatdate(time.time(), usegmt=True)
+
+
+class FixtureSite:
+    """合成站点的内容与行为配置
+
+    books       小说数量，ID从 first_id 开始连续编号
+    categories  {分类ID: 小说数量}，默认只有分类1（即 books 本）；分类1的第1页同时挂在玄幻栏目地址
+    per_page    每个列表页的小说数（另有 featured 本推荐小说，重复出现在每一页）
+    txt_size    每本小说正文的大致字节数
+    latency     每个请求的基础延迟（秒），实际延迟在 [latency, latency + jitter] 之间
+    error_rate  返回503的请求比例
+    rate_limit  每秒允许的请求数，超过返回429和Retry-After；None表示不限流
+    pages_dir   录制页面目录，存在 <pages_dir>/<请求路径> 时直接返回该文件
+    """
+
+    def __init__(self, books=300, per_page=50, featured=8, txt_size=200 * 1024,
+                 latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None,
+                 retry_after=1, pages_dir=None, first_id=1000, seed=0, categories=None):
+        self.categories = dict(categories) if categories else {1: books}
+        self.books = sum(self.categories.values())
+        self.per_page = per_page
+        self.featured = featured
+        self.txt_size = txt_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.pages_dir = pages_dir
+        self.first_id = first_id
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.tokens = float(rate_limit or 0)
+        self.token_time = time.monotonic()
+        self.stats = {'requests': 0, 'bytes': 0, 'status': {}, 'paths': {}}
+
+        self.server = None
+        self.thread = None
+
+        # 正文生成较慢，缓存最近请求的小说，避免分段请求和重试时重复生成
+        self.txt = lru_cache(maxsize=64)(self.txt)
+
+    # ------------------------------------------------------------ 内容
+
+    @property
+    def pages(self):
+        """分类1的列表页数"""
+        return self.pages_for(1)
+
+    def pages_for(self, category):
+        return max(1, -(-self.categories.get(category, 0) // self.per_page))
+
+    def category_start(self, category):
+        return self.first_id + (category - 1) * CATEGORY_STRIDE
+
+    def _text(self, rng, length):
+        return ''.join(rng.choice(CHARS) for _ in range(length))
+
+    def book(self, book_id):
+        """书名与作者，按ID确定性生成"""
+        rng = random.Random(f"{self.seed}-{book_id}")
+        return self._text(rng, rng.randint(3, 6)), self._text(rng, 3)
+
+    def list_page(self, page, root, category=1):
+        first = self.category_start(category)
+        count = self.categories[category]
+        start = first + (page - 1) * self.per_page
+        ids = range(start, min(start + self.per_page, first + count))
+
+        parts = ['<!DOCTYPE html>\n<html>\n<head>\n'
+                 '<meta http-equiv="Content-Type" content="text/html; charset=gbk" />\n'
+                 '<title>玄幻小说</title>\n</head>\n<body>\n<div class="wrap"><div class="focus">\n']
+        for book_id in range(first, first + min(self.featured, count)):
+            title, author = self.book(book_id)
+            parts.append(f'<div class="item"><div class="image"><a href="{root}/book/{book_id}/">'
+                         f'<img src="/cover/{book_id}.jpg" alt="{title}"/></a></div>\n'
+                         f'<dl><dt><span>{author}</span><a href="{root}/book/{book_id}/">{title}</a>'
+                         f'</dt><dd>……</dd></dl></div>\n')
+        parts.append('</div><div class="box"><h2>最近更新</h2><ul class="txt-list txt-list-row5">\n'
+                     '<li class="title"><span class="s1">类别</span><span class="s2">书名</span>'
+                     '<span class="s4">作者</span></li>\n')
+        for book_id in ids:
+            title, author = self.book(book_id)
+            parts.append(f'<li><span class="s1">[玄幻]</span><span class="s2">'
+                         f'<a href="{root}/book/{book_id}/">{title}</a></span>'
+                         f'<span class="s4">{author}</span><span class="s5">10-01</span></li>\n')
+        parts.append('</ul></div></div>\n</body>\n</html>\n')
+        return ''.join(parts).encode('gbk')
+
+    def detail_page(self, book_id):
+        title, author = self.book(book_id)
+        return ('<!DOCTYPE html>\n<html>\n<head>\n'
+                '<meta http-equiv="Content-Type" content="text/html; charset=gbk" />\n'
+                f'<title>{title}</title>\n</head>\n<body>\n'
+                f'<div class="wrap"><div class="detail"><div class="info"><h1>{title}</h1>'
+                f'<p>作者：{author}</p>\n<div class="btns">'
+                f'<a class="btn btn-read" href="/book/{book_id}/read.html">开始阅读</a>'
+                f'<a class="btn btn-dl" href="{DOWNLOAD_PATH}?id={book_id}">TXT下载</a>'
+                '</div></div></div></div>\n</body>\n</html>\n').encode('gbk')
+
+    def txt(self, book_id):
+        """小说正文（GBK），按章节组织"""
+        rng = random.Random(f"{self.seed}-txt-{book_id}")
+        title, author = self.book(book_id)
+        parts = [f"{title}\n作者：{author}\n\n"]
+        size = 0
+        chapter = 1
+        while size < self.txt_size:
+            body = '\n'.join('　　' + self._text(rng, rng.randint(40, 120))
+                             for _ in range(rng.randint(20, 40)))
+            text = f"第{chapter}章 {self._text(rng, 4)}\n{body}\n\n"
+            parts.append(text)
+            size += len(text) * 2
+            chapter += 1
+        return ''.join(parts).encode('gbk')
+
+    def _book_id(self, value):
+        try:
+            book_id = int(value)
+        except (TypeError, ValueError):
+            return None
+        category = (book_id - self.first_id) // CATEGORY_STRIDE + 1
+        offset = book_id - self.category_start(category)
+        if category in self.categories and 0 <= offset < self.categories[category]:
+            return book_id
+        return None
+
+    def resolve(self, path, query, root):
+        """请求路径对应的 (内容, Content-Type)，不存在返回None"""
+        if self.pages_dir:
+            root_dir = os.path.abspath(self.pages_dir)
+            recorded = os.path.abspath(os.path.join(root_dir, path.lstrip('/') or 'index.html'))
+            if recorded.startswith(root_dir + os.sep) and os.path.isfile(recorded):
+                with open(recorded, 'rb') as f:
+                    content_type = 'text/plain' if recorded.endswith('.txt') else 'text/html; charset=gbk'
+                    return f.read(), content_type
+
+        html = 'text/html; charset=gbk'
+        if path == LIST_PATH:
+            return self.list_page(1, root), html
+        match = LIST_PAGE_RE.match(path)
+        if match:
+            category, page = int(match.group(1)), int(match.group(2))
+            if category in self.categories and 1 <= page <= self.pages_for(category):
+                return self.list_page(page, root, category), html
+        match = BOOK_RE.match(path)
+        if match and self._book_id(match.group(1)) is not None:
+            return self.detail_page(int(match.group(1))), html
+        if path == DOWNLOAD_PATH:
+            book_id = self._book_id(parse_qs(query).get('id', [None])[0])
+            if book_id is not None:
+                return self.txt(book_id), 'text/plain'
+        return None
+
+    # ------------------------------------------------------------ 行为
+
+    def admit(self):
+        """令牌桶限流与错误注入，返回需要直接返回的状态码，正常处理返回None"""
+        with self.lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(float(self.rate_limit),
+                                  self.tokens + (now - self.token_time) * self.rate_limit)
+                self.token_time = now
+                if self.tokens < 1:
+                    return 429
+                self.tokens -= 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 503
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        return None
+
+    def record(self, path, status, nbytes):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += nbytes
+            self.stats['status'][status] = self.stats['status'].get(status, 0) + 1
+            kind = 'list' if path == LIST_PATH or LIST_PAGE_RE.match(path) else \
+                'detail' if BOOK_RE.match(path) else \
+                'download' if path == DOWNLOAD_PATH else 'other'
+            self.stats['paths'][kind] = self.stats['paths'].get(kind, 0) + 1
+
+    # ------------------------------------------------------------ 服务器
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host='127.0.0.1', port=0):
+        """在后台线程中启动，返回站点根地址"""
+        handler = type('Handler', (FixtureHandler,), {'site': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    site = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head):
+        site = self.site
+        parsed = urlparse(self.path)
+
+        status = site.admit()
+        if status is not None:
+            extra = {'Retry-After': str(site.retry_after)} if status == 429 else {}
+            self._send(status, b'', 'text/html; charset=gbk', extra, head)
+            site.record(parsed.path, status, 0)
+            return
+
+        host = self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]
+        resolved = site.resolve(parsed.path, parsed.query, f"http://{host}")
+        if resolved is None:
+            body = '<html><body>404 页面不存在</body></html>'.encode('gbk')
+            self._send(404, body, 'text/html; charset=gbk', {}, head)
+            site.record(parsed.path, 404, len(body))
+            return
+
+        body, content_type = resolved
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        extra = {'ETag': etag, 'Last-Modified': STARTED, 'Accept-Ranges': 'bytes'}
+
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', content_type, extra, head)
+            site.record(parsed.path, 304, 0)
+            return
+
+        status = 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == etag):
+            match = re.match(r'bytes=(\d+)-(\d*)$', range_header.strip())
+            if match:
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else len(body) - 1
+                if start >= len(body):
+                    extra['Content-Range'] = f"bytes */{len(body)}"
+                    self._send(416, b'', content_type, extra, head)
+                    site.record(parsed.path, 416, 0)
+                    return
+                end = min(end, len(body) - 1)
+                extra['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+                body = body[start:end + 1]
+                status = 206
+
+        self._send(status, body, content_type, extra, head)
+        site.record(parsed.path, status, 0 if head else len(body))
+
+    def _send(self, status, body, content_type, headers, head):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head and body:
+            self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地替身网站')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--books', type=int, default=300, help='小说数量')
+    parser.add_argument('--per-page', type=int, default=50, help='每页小说数')
+    parser.add_argument('--txt-size', type=int, default=200, help='正文大小（KB）')
+    parser.add_argument('--latency', type=float, default=0, help='基础延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='随机附加延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回503的比例')
+    parser.add_argument('--rate-limit', type=float, help='每秒允许的请求数')
+    parser.add_argument('--pages-dir', help='录制页面目录')
+    args = parser.parse_args()
+
+    site = FixtureSite(books=args.books, per_page=args.per_page, txt_size=args.txt_size * 1024,
+                       latency=args.latency / 1000, jitter=args.jitter / 1000,
+                       error_rate=args.error_rate, rate_limit=args.rate_limit,
+                       pages_dir=args.pages_dir)
+    url = site.start(args.host, args.port)
+    print(f"替身网站已启动: {url}{LIST_PATH}（{site.books} 本小说，{site.pages} 页）")
+    print(f"爬虫使用: python novel_spider.py --site-root {url} --max-pages {site.pages}")
+    try:
+        while True:
+            time.sleep(10)
+            print(site.stats)
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
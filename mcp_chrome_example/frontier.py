@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享爬取队列
+多个爬虫进程（可以在共享文件系统的不同机器上）通过同一个SQLite文件协作：
+工作项以租约方式领取，进程崩溃后租约到期自动回收；按主机记录下一次允许
+请求的时间，礼貌间隔对所有进程统一生效；完成操作是幂等的
+
+用法：
+    python frontier.py stats [队列文件]
+    python frontier.py reset-failed [队列文件]
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 工作项类型
+KIND_LIST = 'list'
+KIND_BOOK = 'book'
+
+# 工作项状态
+ITEM_PENDING = 'pending'
+ITEM_LEASED = 'leased'
+ITEM_DONE = 'done'
+ITEM_FAILED = 'failed'
+
+
+def default_worker_id():
+    """主机名+进程号，同一台机器上的多个进程互不相同"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Frontier:
+    """基于SQLite的共享工作队列，线程安全且可跨进程使用
+
+    - lease: 领取一个待处理项，租约在 lease_seconds 后过期，过期项会被其他进程重新领取；
+      已领取 max_attempts 次仍未完成的过期项（例如每次都让进程崩溃的页面）标记为失败，不再回收
+    - renew: 处理耗时较长时续约
+    - complete: 标记完成；已完成的项再次完成不会有任何效果
+    - fail: 失败后放回队列，超过 max_attempts 次标记为失败
+    - reserve: 为主机预约下一个请求时间，返回需要等待的秒数
+
+    所有写操作都在 BEGIN IMMEDIATE 事务中完成，多个进程不会领取到同一项。
+    队列文件放在网络文件系统上时不能使用WAL（依赖共享内存），因此保持默认的
+    回滚日志模式。时间使用墙上时钟，多台机器之间需要大致同步。
+    """
+
+    def __init__(self, db_path, lease_seconds=600, host_interval=2.0,
+                 max_attempts=3, retry_delay=30, timeout=60):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.host_interval = host_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+        with self._transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS items (
+                    url TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    added_at REAL,
+                    done_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS hosts (
+                    host TEXT PRIMARY KEY,
+                    next_time REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_items_ready
+                ON items (status, priority DESC, added_at)
+            ''')
+
+    @contextmanager
+    def _transaction(self):
+        """立即获取写锁的事务，保证领取与预约在多个进程间互斥"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def add(self, url, kind, payload=None, priority=0):
+        """加入一个工作项，已存在（包括已完成）时忽略，返回是否新加入"""
+        return self.add_many([(url, kind, payload, priority)]) == 1
+
+    def add_many(self, items):
+        """批量加入 (url, kind, payload, priority)，返回新加入的数量"""
+        now = time.time()
+        rows = [(url, kind, json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                 priority, now) for url, kind, payload, priority in items]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany('''
+                INSERT OR IGNORE INTO items (url, kind, payload, priority, added_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            return conn.total_changes - before
+
+    def lease(self, worker_id, kinds=None):
+        """领取一个可处理的工作项，没有时返回None
+
+        租约已过期的项视为待处理，领取次数（attempts）已达 max_attempts 的过期项先标记为失败。
+        返回的字典包含 url、kind、payload 和 attempts。
+        """
+        now = time.time()
+        query = '''
+            SELECT * FROM items
+            WHERE ((status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?))
+        '''
+        params = [ITEM_PENDING, now, ITEM_LEASED, now]
+        if kinds:
+            query += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        query += ' ORDER BY priority DESC, added_at LIMIT 1'
+
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE items SET status = ?, lease_owner = NULL, lease_until = NULL
+                WHERE status = ? AND lease_until < ? AND attempts >= ?
+            ''', (ITEM_FAILED, ITEM_LEASED, now, self.max_attempts))
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            conn.execute('''
+                UPDATE items SET status = ?, lease_owner = ?, lease_until = ?,
+                    attempts = attempts + 1
+                WHERE url = ?
+            ''', (ITEM_LEASED, worker_id, now + self.lease_seconds, row['url']))
+
+        return {
+            'url': row['url'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload']) if row['payload'] else None,
+            'attempts': row['attempts'] + 1
+        }
+
+    def renew(self, url, worker_id):
+        """延长租约，租约已被其他进程接管时返回False"""
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+                UPDATE items SET lease_until = ?
+                WHERE url = ? AND status = ? AND lease_owner = ?
+            ''', (time.time() + self.lease_seconds, url, ITEM_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, url, worker_id, result=None):
+        """标记完成，返回是否由本次调用完成（重复完成返回False）
+
+        租约过期后原进程仍可能完成该项，此时以先完成者为准。
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+                UPDATE items SET status = ?, lease_owner = ?, lease_until = NULL,
+                    result = ?, done_at = ?
+                WHERE url = ? AND status != ?
+            ''', (ITEM_DONE, worker_id,
+                  json.dumps(result, ensure_ascii=False) if result is not None else None,
+                  time.time(), url, ITEM_DONE))
+            return cursor.rowcount == 1
+
+    def fail(self, url, worker_id):
+        """处理失败：未超过重试次数时延后放回队列，否则标记失败
+
+        只处理本进程持有的租约，租约已被接管时不做任何修改。
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+                UPDATE items SET
+                    status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    lease_owner = NULL, lease_until = NULL, available_at = ?
+                WHERE url = ? AND status = ? AND lease_owner = ?
+            ''', (self.max_attempts, ITEM_FAILED, ITEM_PENDING, time.time() + self.retry_delay,
+                  url, ITEM_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def reserve(self, host, interval=None):
+        """为主机预约下一次请求，返回需要等待的秒数
+
+        所有进程共享同一张主机表，同一主机的请求之间至少间隔 interval 秒。
+        """
+        interval = self.host_interval if interval is None else interval
+        with self._transaction() as conn:
+            now = time.time()
+            row = conn.execute('SELECT next_time FROM hosts WHERE host = ?', (host,)).fetchone()
+            start = max(now, row['next_time']) if row else now
+            conn.execute('INSERT OR REPLACE INTO hosts (host, next_time) VALUES (?, ?)',
+                         (host, start + interval))
+        return start - now
+
+    def wait_for_host(self, url, interval=None):
+        """按URL的主机预约并等待，返回实际等待的秒数"""
+        delay = self.reserve(urlparse(url).netloc, interval)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def next_ready_in(self):
+        """距离下一个工作项可领取的秒数；队列已全部处理完返回None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT MIN(CASE WHEN status = ? THEN available_at ELSE lease_until END) AS t
+                FROM items WHERE status IN (?, ?)
+            ''', (ITEM_PENDING, ITEM_PENDING, ITEM_LEASED)).fetchone()
+        if row['t'] is None:
+            return None
+        return max(0.0, row['t'] - now)
+
+    def counts(self):
+        """按类型和状态统计工作项数量"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT kind, status, COUNT(*) AS n FROM items GROUP BY kind, status').fetchall()
+        counts = {}
+        for row in rows:
+            counts.setdefault(row['kind'], {})[row['status']] = row['n']
+        return counts
+
+    def reset_failed(self):
+        """把失败项重新放回队列，返回数量"""
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+                UPDATE items SET status = ?, attempts = 0, available_at = 0
+                WHERE status = ?
+            ''', (ITEM_PENDING, ITEM_FAILED))
+            return cursor.rowcount
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('stats', 'reset-failed'):
+        print(__doc__)
+        return 1
+
+    frontier = Frontier(sys.argv[2] if len(sys.argv) > 2 else os.path.join('novels', 'frontier.db'))
+    try:
+        if sys.argv[1] == 'stats':
+            for kind, statuses in sorted(frontier.counts().items()):
+                print(f"{kind}: {statuses}")
+        else:
+            print(f"已重置 {frontier.reset_failed()} 个失败项")
+    finally:
+        frontier.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
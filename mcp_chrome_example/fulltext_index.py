@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文索引
+以相邻两个字符（二元组）为词项，对下载的小说建立带位置的倒排索引。
+倒排表用varint差值编码写入不可变的段文件，新书写入新段，实现增量更新；
+查询时取最稀有的二元组生成候选位置，用其余二元组过滤，最后按字节偏移回读原文逐一验证
+
+用法：
+    python fulltext_index.py update [小说目录]
+    python fulltext_index.py search <短语> [小说目录]
+    python fulltext_index.py merge [小说目录]
+    python fulltext_index.py stats [小说目录]
+"""
+
+import codecs
+import hashlib
+import heapq
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import groupby, repeat
+
+INDEX_DIR = '.fulltext'
+
+# 词项表记录：二元组键、倒排表偏移、倒排表字节数、文档数；按键排序，mmap后二分查找
+TERM = struct.Struct('<QQII')
+SEGMENT_MAGIC = b'FTSG'
+SEGMENT_HEADER = struct.Struct('<4sII')  # 魔数、版本、词项数
+
+CHAR_BITS = 21  # Unicode码点最多21位，两个字符拼成一个42位的键
+
+
+def utf8_len(ch):
+    code = ord(ch)
+    if 0xDC80 <= code <= 0xDCFF:
+        return 1  # surrogateescape 解码得到的无效字节，原文中只占一个字节
+    return 1 if code < 0x80 else 2 if code < 0x800 else 3 if code < 0x10000 else 4
+
+
+def breaks_bigram(ch):
+    """空白字符与无效字节（surrogateescape）不参与二元组"""
+    return ch.isspace() or '\udc80' <= ch <= '\udcff'
+
+
+def iter_bigrams(text, offset=0, prev=None, prev_offset=0):
+    """生成 (键, 字节偏移)；空白字符与无效字节断开二元组
+
+    prev/prev_offset 为上一块末尾的字符及其偏移，用于分块处理时跨块衔接。
+    """
+    for ch in text:
+        if breaks_bigram(ch):
+            prev = None
+        else:
+            if prev is not None:
+                yield (ord(prev) << CHAR_BITS) | ord(ch), prev_offset
+            prev = ch
+            prev_offset = offset
+        offset += utf8_len(ch)
+
+
+def query_bigrams(phrase):
+    """短语中的二元组及其相对短语开头的字节偏移"""
+    return list(iter_bigrams(phrase))
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data, pos, end):
+    """解码 [pos, end) 区间内的全部varint"""
+    values = []
+    append = values.append
+    value = shift = 0
+    for byte in data[pos:end]:
+        if byte & 0x80:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        else:
+            append(value | (byte << shift))
+            value = shift = 0
+    return values
+
+
+class Segment:
+    """只读段：<名称>.terms（词项表）与 <名称>.post（倒排表），均通过mmap访问
+
+    倒排表格式（每个词项）：[文档ID差值, 位置数, 位置差值...] 重复 df 次
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self._files = []
+        self._terms = self._map(os.path.join(directory, name + '.terms'))
+        self._postings = self._map(os.path.join(directory, name + '.post'))
+        magic, _, count = SEGMENT_HEADER.unpack_from(self._terms, 0)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"不是有效的索引段: {name}")
+        self.count = count
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _key_at(self, i):
+        return struct.unpack_from('<Q', self._terms, SEGMENT_HEADER.size + i * TERM.size)[0]
+
+    def _find(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, key):
+        """词项的 (偏移, 字节数, 文档数)，不存在返回None"""
+        i = self._find(key)
+        if i < self.count:
+            term = TERM.unpack_from(self._terms, SEGMENT_HEADER.size + i * TERM.size)
+            if term[0] == key:
+                return term[1:]
+        return None
+
+    def postings(self, offset, length):
+        """解码倒排表，返回 {文档ID: [字节偏移, ...]}"""
+        values = _decode_varints(self._postings, offset, offset + length)
+        result = {}
+        doc_id = 0
+        i = 0
+        while i < len(values):
+            doc_id += values[i]
+            count = values[i + 1]
+            positions = []
+            position = 0
+            for delta in values[i + 2:i + 2 + count]:
+                position += delta
+                positions.append(position)
+            result[doc_id] = positions
+            i += 2 + count
+        return result
+
+    def iter_terms(self):
+        for i in range(self.count):
+            yield TERM.unpack_from(self._terms, SEGMENT_HEADER.size + i * TERM.size)
+
+    def close(self):
+        for value in (self._terms, self._postings):
+            if isinstance(value, mmap.mmap):
+                value.close()
+        for f in self._files:
+            f.close()
+
+
+def _encode_postings(docs):
+    """编码一个词项的倒排表；docs 为 {文档ID: 升序位置列表}"""
+    out = bytearray()
+    last_doc = 0
+    for doc_id in sorted(docs):
+        positions = docs[doc_id]
+        _encode_varint(doc_id - last_doc, out)
+        _encode_varint(len(positions), out)
+        last_position = 0
+        for position in positions:
+            _encode_varint(position - last_position, out)
+            last_position = position
+        last_doc = doc_id
+    return out
+
+
+def write_segment(directory, name, postings):
+    """写入段文件；postings 为 {键: {文档ID: 升序位置列表}}"""
+    write_segment_terms(directory, name, ((key, postings[key]) for key in sorted(postings)))
+
+
+def write_segment_terms(directory, name, terms):
+    """按键升序逐个写入词项；terms 为 (键, {文档ID: 位置列表}) 的迭代器，内存中只保留当前词项"""
+    post_path = os.path.join(directory, name + '.post')
+    terms_path = os.path.join(directory, name + '.terms')
+    with open(post_path + '.tmp', 'wb') as post, open(terms_path + '.tmp', 'wb') as table:
+        table.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 1, 0))
+        offset = count = 0
+        for key, docs in terms:
+            out = _encode_postings(docs)
+            post.write(out)
+            table.write(TERM.pack(key, offset, len(out), len(docs)))
+            offset += len(out)
+            count += 1
+        # 词项数写完才知道，最后回填文件头
+        table.seek(0)
+        table.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 1, count))
+    os.replace(post_path + '.tmp', post_path)
+    os.replace(terms_path + '.tmp', terms_path)
+
+
+def merge_terms(segments, live):
+    """按键多路归并各段（词项表均已排序），逐个生成 (键, {文档ID: 位置列表})
+
+    同一时刻只解码一个键的倒排表，已删除的文档被丢弃，没有存活文档的键不输出。
+    """
+    streams = [zip(segment.iter_terms(), repeat(i)) for i, segment in enumerate(segments)]
+    for key, group in groupby(heapq.merge(*streams), key=lambda item: item[0][0]):
+        docs = {}
+        for (_, offset, length, _), i in group:
+            for doc_id, positions in segments[i].postings(offset, length).items():
+                if doc_id in live:
+                    docs[doc_id] = positions
+        if docs:
+            yield key, docs
+
+
+class _Builder:
+    """内存中的新段：每个键对应并行的文档ID数组与位置数组"""
+
+    def __init__(self):
+        self.docs = {}
+        self.positions = {}
+        self.size = 0
+
+    def add(self, doc_id, bigrams):
+        docs = self.docs
+        positions = self.positions
+        for key, offset in bigrams:
+            doc_list = docs.get(key)
+            if doc_list is None:
+                docs[key] = doc_list = array('Q')
+                positions[key] = array('Q')
+            doc_list.append(doc_id)
+            positions[key].append(offset)
+            self.size += 1
+
+    def postings(self):
+        result = {}
+        for key, doc_list in self.docs.items():
+            by_doc = {}
+            for doc_id, position in zip(doc_list, self.positions[key]):
+                by_doc.setdefault(doc_id, []).append(position)
+            result[key] = by_doc
+        return result
+
+
+class FulltextIndex:
+    """小说全文索引，单写多读
+
+    目录结构（默认 <小说目录>/.fulltext/）：
+        index.db          文档表（按内容哈希去重）、路径表、段列表
+        <段名>.terms/.post 不可变的索引段
+    同一内容的多个别名（硬链接或复制）只索引一次，查询结果返回全部路径。
+    """
+
+    def __init__(self, index_dir, flush_postings=8_000_000, max_segments=8, chunk_size=1024 * 1024):
+        self.index_dir = index_dir
+        self.flush_postings = flush_postings
+        self.max_segments = max_segments
+        self.chunk_size = chunk_size
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(index_dir, 'index.db'), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id INTEGER PRIMARY KEY,
+                    content_hash TEXT UNIQUE NOT NULL,
+                    size INTEGER,
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    indexed_at REAL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS paths (
+                    path TEXT PRIMARY KEY,
+                    doc_id INTEGER NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_paths_doc ON paths (doc_id)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS segments (
+                    name TEXT PRIMARY KEY,
+                    created_at REAL
+                )
+            ''')
+
+        self._builder = _Builder()
+        self._segments = {}
+        self._maps = OrderedDict()  # 验证用的正文mmap，按最近使用淘汰
+        self._live = None
+
+    @classmethod
+    def for_novels(cls, novels_dir, **kwargs):
+        return cls(os.path.join(novels_dir, INDEX_DIR), **kwargs)
+
+    # ------------------------------------------------------------ 写入
+
+    def add(self, path, content_hash=None):
+        """索引一个UTF-8文本文件，返回是否新建了文档（内容已索引时只登记路径）"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM paths WHERE path = ?', (path,)).fetchone()
+            if row and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+                return False
+
+            content_hash = content_hash or self._hash_file(path)
+            doc = self.conn.execute('SELECT doc_id, deleted FROM docs WHERE content_hash = ?',
+                                    (content_hash,)).fetchone()
+            is_new = doc is None
+            if is_new:
+                doc_id = self._index_file(path, content_hash, stat.st_size)
+            else:
+                # 已删除但尚未合并的文档，倒排数据仍在段中，恢复即可
+                doc_id = doc['doc_id']
+                if doc['deleted']:
+                    with self.conn:
+                        self.conn.execute('UPDATE docs SET deleted = 0 WHERE doc_id = ?', (doc_id,))
+                    self._live = None
+            with self.conn:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO paths (path, doc_id, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                    (path, doc_id, stat.st_size, stat.st_mtime_ns))
+            if row and row['doc_id'] != doc_id:
+                self._drop_if_orphan(row['doc_id'])
+            if self._builder.size >= self.flush_postings:
+                self.commit()
+            return is_new
+
+    def remove(self, path):
+        """删除路径；文档不再有任何路径时标记删除，合并段时清除其倒排数据"""
+        path = os.path.abspath(path)
+        with self.lock:
+            row = self.conn.execute('SELECT doc_id FROM paths WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                return False
+            with self.conn:
+                self.conn.execute('DELETE FROM paths WHERE path = ?', (path,))
+            self._drop_if_orphan(row['doc_id'])
+            return True
+
+    def update(self, root):
+        """同步目录下的全部 .txt 文件：新增或变化的文件重新索引，已删除的文件移除
+
+        返回 {'added', 'removed'}。
+        """
+        root = os.path.abspath(root)
+        seen = set()
+        added = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if name.endswith('.txt'):
+                    path = os.path.join(dirpath, name)
+                    seen.add(path)
+                    added += self.add(path)
+
+        removed = 0
+        with self.lock:
+            known = [row['path'] for row in self.conn.execute('SELECT path FROM paths')]
+        for path in known:
+            if path.startswith(root + os.sep) and path not in seen:
+                removed += self.remove(path)
+        self.commit()
+        return {'added': added, 'removed': removed}
+
+    def commit(self):
+        """把内存中的新文档写成一个段；段数超过上限时合并"""
+        with self.lock:
+            if self._builder.size:
+                name = f"seg_{time.time_ns()}_{os.getpid()}"
+                write_segment(self.index_dir, name, self._builder.postings())
+                with self.conn:
+                    self.conn.execute('INSERT INTO segments (name, created_at) VALUES (?, ?)',
+                                      (name, time.time()))
+                self._builder = _Builder()
+            self.conn.commit()
+            self._live = None
+            if len(self._segment_names()) > self.max_segments:
+                self.merge()
+
+    def merge(self):
+        """把所有段流式合并为一个，同时清除已删除文档的倒排数据"""
+        with self.lock:
+            self.commit_pending()
+            names = self._segment_names()
+            if not names:
+                return
+            segments = [self._segment(name) for name in names]
+            new_name = f"seg_{time.time_ns()}_{os.getpid()}"
+            write_segment_terms(self.index_dir, new_name, merge_terms(segments, self._live_docs()))
+            with self.conn:
+                self.conn.execute('DELETE FROM segments')
+                self.conn.execute('INSERT INTO segments (name, created_at) VALUES (?, ?)',
+                                  (new_name, time.time()))
+                self.conn.execute('DELETE FROM docs WHERE deleted = 1')
+            for name in names:
+                segment = self._segments.pop(name, None)
+                if segment:
+                    segment.close()
+                for suffix in ('.terms', '.post'):
+                    path = os.path.join(self.index_dir, name + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def commit_pending(self):
+        """只写入内存中的新文档，不触发合并"""
+        if self._builder.size:
+            max_segments, self.max_segments = self.max_segments, float('inf')
+            try:
+                self.commit()
+            finally:
+                self.max_segments = max_segments
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _index_file(self, path, content_hash, size):
+        with self.conn:
+            doc_id = self.conn.execute(
+                'INSERT INTO docs (content_hash, size, deleted, indexed_at) VALUES (?, ?, 0, ?)',
+                (content_hash, size, time.time())).lastrowid
+        self._live = None
+
+        def bigrams():
+            # 按块解码，相邻块之间的二元组通过 prev 衔接；无效字节用 surrogateescape
+            # 逐字节保留为单个字符，偏移与原文字节一一对应（errors='replace' 会把它们算成3字节）
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogateescape')
+            offset = 0
+            prev = None
+            prev_offset = 0
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    text = decoder.decode(chunk, final=not chunk)
+                    if text:
+                        yield from iter_bigrams(text, offset, prev, prev_offset)
+                        offset += len(text.encode('utf-8', errors='surrogateescape'))
+                        last = text[-1]
+                        prev = None if breaks_bigram(last) else last
+                        prev_offset = offset - utf8_len(last)
+                    if not chunk:
+                        break
+
+        self._builder.add(doc_id, bigrams())
+        return doc_id
+
+    def _drop_if_orphan(self, doc_id):
+        with self.conn:
+            self.conn.execute('''
+                UPDATE docs SET deleted = 1
+                WHERE doc_id = ? AND NOT EXISTS (SELECT 1 FROM paths WHERE doc_id = ?)
+            ''', (doc_id, doc_id))
+        self._live = None
+
+    # ------------------------------------------------------------ 查询
+
+    def _segment_names(self):
+        return [row['name'] for row in
+                self.conn.execute('SELECT name FROM segments ORDER BY created_at')]
+
+    def _segment(self, name):
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = self._segments[name] = Segment(self.index_dir, name)
+        return segment
+
+    def _live_docs(self):
+        if self._live is None:
+            self._live = {row['doc_id'] for row in
+                          self.conn.execute('SELECT doc_id FROM docs WHERE deleted = 0')}
+        return self._live
+
+    def _term_postings(self, segments, key):
+        """合并各段中一个键的倒排表；每个文档只会出现在写入它的那个段中"""
+        result = {}
+        for segment in segments:
+            term = segment.lookup(key)
+            if term:
+                result.update(segment.postings(term[0], term[1]))
+        return result
+
+    def _term_cost(self, segments, key):
+        """词项在各段倒排表的总字节数，用来挑选最稀有的二元组"""
+        total = 0
+        for segment in segments:
+            term = segment.lookup(key)
+            if term:
+                total += term[1]
+        return total
+
+    def search(self, phrase, limit=100, context=30):
+        """查找短语，返回命中列表 [{'doc_id', 'path', 'paths', 'offset', 'snippet'}]
+
+        offset 为短语在文件中的字节偏移。短语至少包含两个相邻的非空白字符。
+        """
+        phrase = phrase.strip()
+        if not phrase:
+            return []
+        needle = phrase.encode('utf-8')
+
+        with self.lock:
+            self.commit_pending()
+            segments = [self._segment(name) for name in self._segment_names()]
+            live = self._live_docs()
+
+            grams = query_bigrams(phrase)
+            if not grams:
+                raise ValueError("查询需要至少两个相邻的非空白字符")
+
+            # 按倒排表大小排序：最稀有的生成候选，次稀有的两个用于过滤
+            grams = sorted(set(grams), key=lambda g: self._term_cost(segments, g[0]))
+            key, shift = grams[0]
+            candidates = self._term_postings(segments, key)
+            filters = grams[1:3]
+
+            filter_sets = []
+            for key, delta in filters:
+                postings = self._term_postings(segments, key)
+                filter_sets.append((delta, {doc_id: set(positions)
+                                            for doc_id, positions in postings.items()
+                                            if doc_id in candidates}))
+
+            hits = []
+            for doc_id in sorted(candidates):
+                if doc_id not in live:
+                    continue
+                for position in candidates[doc_id]:
+                    start = position - shift
+                    if any(start + delta not in positions.get(doc_id, ())
+                           for delta, positions in filter_sets):
+                        continue
+                    hit = self._verify(doc_id, start, needle, context)
+                    if hit:
+                        hits.append(hit)
+                        if len(hits) >= limit:
+                            return hits
+            return hits
+
+    def _verify(self, doc_id, start, needle, context):
+        """回读原文确认短语确实出现在该偏移"""
+        rows = self.conn.execute(
+            'SELECT path, mtime_ns FROM paths WHERE doc_id = ? ORDER BY path', (doc_id,)).fetchall()
+        paths = [row['path'] for row in rows]
+        data = None
+        for row in rows:
+            path = row['path']
+            data = self._open(path, row['mtime_ns'])
+            if data is not None:
+                break
+        if data is None or data[start:start + len(needle)] != needle:
+            return None
+
+        # 片段边界对齐到UTF-8字符开头
+        left = max(0, start - context * 3)
+        while left < start and (data[left] & 0xC0) == 0x80:
+            left += 1
+        right = min(len(data), start + len(needle) + context * 3)
+        while right < len(data) and (data[right] & 0xC0) == 0x80:
+            right += 1
+        return {
+            'doc_id': doc_id,
+            'path': path,
+            'paths': paths,
+            'offset': start,
+            'snippet': bytes(data[left:right]).decode('utf-8', errors='replace').replace('\n', ' ')
+        }
+
+    def _open(self, path, mtime_ns, cache_size=64):
+        """打开正文的mmap；按修改时间区分版本，文件变化后不会读到旧映射"""
+        cache_key = (path, mtime_ns)
+        data = self._maps.get(cache_key)
+        if data is not None:
+            self._maps.move_to_end(cache_key)
+            return data
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+        self._maps[cache_key] = data
+        if len(self._maps) > cache_size:
+            _, old = self._maps.popitem(last=False)
+            old.close()
+        return data
+
+    # ------------------------------------------------------------ 其他
+
+    def stats(self):
+        with self.lock:
+            docs = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM docs WHERE deleted = 0').fetchone()
+            paths = self.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0]
+            names = self._segment_names()
+        index_bytes = sum(os.path.getsize(os.path.join(self.index_dir, name + suffix))
+                          for name in names for suffix in ('.terms', '.post'))
+        return {'docs': docs[0], 'text_bytes': docs[1], 'paths': paths,
+                'segments': len(names), 'index_bytes': index_bytes,
+                'pending_postings': self._builder.size}
+
+    def close(self):
+        with self.lock:
+            self.commit_pending()
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+            for data in self._maps.values():
+                data.close()
+            self._maps.clear()
+            self.conn.close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('update', 'search', 'merge', 'stats'):
+        print(__doc__)
+        return 1
+
+    command = sys.argv[1]
+    if command == 'search':
+        if len(sys.argv) < 3:
+            print(__doc__)
+            return 1
+        root = sys.argv[3] if len(sys.argv) > 3 else 'novels'
+    else:
+        root = sys.argv[2] if len(sys.argv) > 2 else 'novels'
+
+    index = FulltextIndex.for_novels(root)
+    try:
+        if command == 'update':
+            start = time.perf_counter()
+            result = index.update(root)
+            print(f"新增 {result['added']}，移除 {result['removed']}，"
+                  f"耗时 {time.perf_counter() - start:.1f} 秒，{index.stats()}")
+        elif command == 'search':
+            start = time.perf_counter()
+            hits = index.search(sys.argv[2])
+            elapsed = (time.perf_counter() - start) * 1000
+            for hit in hits:
+                print(f"{os.path.basename(hit['path'])} @{hit['offset']}: {hit['snippet']}")
+            print(f"共 {len(hits)} 条，耗时 {elapsed:.1f} 毫秒")
+        elif command == 'merge':
+            index.merge()
+            print(index.stats())
+        else:
+            print(index.stats())
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,20 +6,132 @@
 """
 
 import requests
-from bs4 import BeautifulSoup
+import argparse
+import codecs
+import hashlib
+import json
 import time
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
 from urllib.parse import urljoin, urlparse
 from fake_useragent import UserAgent
 import random
+import threading
+
+import chapter_index
+import page_parser
+from crawl_metrics import CrawlMetrics
+from crawl_state import CrawlState, STATUS_DONE
+from fair_scheduler import FairScheduler
+from frontier import Frontier, KIND_BOOK, KIND_LIST, default_worker_id
+from novel_store import NovelStore
+from postprocess import PostProcessPool, default_pipeline
+from rate_control import parse_retry_after
+from url_filter import ScalableBloomFilter
 
 class NovelSpider:
-    def __init__(self):
-        self.base_url = "https://www.qishuxia.com/xuanhuanxiaoshuo/"
-        self.session = requests.Session()
+    def __init__(self, site_root="https://www.qishuxia.com", download_dir="novels"):
+        # 站点根地址可替换为本地替身网站（见 fixture_site.py），列表页地址由模板生成
+        # download_dir 在构造时创建，状态库等默认路径由它派生，因此需作为构造参数传入
+        self.site_root = site_root.rstrip('/')
+        self.base_url = f"{self.site_root}/xuanhuanxiaoshuo/"
+        self.category = 1  # base_url 所在的分类，第2页起按模板生成列表页地址
+        self.list_url_template = "/list/{category}_{page}.html"
+        # requests.Session 不是线程安全的：每个线程使用自己的Session，见 session 属性
+        self._local = threading.local()
+        # 状态库、内容存储与进程池在首次使用时创建，并发爬取时可能被多个线程同时访问
+        self._lazy_lock = threading.Lock()
         self.ua = UserAgent()
-        self.download_dir = "novels"
+        self.download_dir = download_dir
+        
+        # 页面解析后端：auto（有lxml时用lxml）、bs4、lxml、stream，见 page_parser.py
+        self.parser_backend = 'auto'
+        
+        # 解析进程池：大于0时把页面解析交给子进程，避免CPU密集的解析阻塞抓取
+        self.parse_workers = 0
+        self.parse_max_in_flight = None  # 在途解析任务上限，默认为进程数的2倍
+        self._parse_pool = None
+        
+        # 流式下载配置：按块读取，内存占用只与块大小相关
+        self.chunk_size = 64 * 1024
+        self.sample_size = 16 * 1024
+        self.encodings = ['utf-8', 'gbk', 'gb2312', 'big5']
+        
+        # 断点续传与分段并行下载配置
+        self.resume_downloads = True
+        self.range_workers = 1  # 大于1时，对大文件启用多连接分段下载
+        self.range_min_size = 4 * 1024 * 1024
+        
+        # 增量重爬配置：状态库记录已下载小说，重复运行时跳过或发条件请求
+        self.state_db = os.path.join(self.download_dir, 'crawl_state.db')
+        self.recheck_after = 7 * 24 * 3600  # 已下载小说的复查间隔（秒）
+        self.stop_on_known_page = True  # 列表页全是已下载小说时停止翻页
+        self.state_journal_mode = 'WAL'  # 多台机器共享状态库时改为 DELETE
+        self._state = None
+        
+        # URL去重：可扩展布隆过滤器记录见过的小说URL（每个约2字节），跨运行保存在 url_filter_path；
+        # 过滤器判断为新URL时不必查询状态库，判断为可能见过时再以状态库记录的运行标识为准
+        self.use_url_filter = True
+        self.url_filter_path = None  # 默认为 <download_dir>/seen_urls.bloom
+        self.run_id = None  # 本次运行的标识，crawl_pages / crawl_categories 开始时生成
+        self._url_filter = None
+        self._sighting_lock = threading.Lock()
+        
+        # 内容去重存储：相同正文只保存一份，标题/作者作为别名；可选gzip压缩
+        # 压缩后 novels/ 下不再有可直接打开的txt，需通过 NovelStore 读取
+        self.dedup_content = True
+        self.compress_store = False
+        self._store = None
+        
+        # 章节索引：下载后为正文生成 <文件>.chapters，可用 ChapterReader 按章节随机读取
+        # 压缩存储的正文无法mmap，不生成索引
+        self.index_chapters = True
+        
+        # 后处理：设置为 postprocess.Pipeline 实例（例如 default_pipeline()）后，下载完成的正文
+        # 交给进程池流式处理（全角转半角、删除广告行、整理空白等），处理完成后再存储与建索引
+        self.postprocess = None
+        self.postprocess_workers = 2
+        self.postprocess_max_in_flight = None  # 在途处理任务上限，默认为进程数的2倍
+        self._postprocess_pool = None
+        self._postprocess_pending = []
+        self._postprocess_lock = threading.Lock()
+        
+        # 全文索引：设置为 FulltextIndex 实例后，新下载的正文加入索引，crawl_pages 结束时写入段
+        # 索引只支持单个写入进程，共享队列多进程爬取后请运行 python fulltext_index.py update
+        self.fulltext = None
+        
+        # 页面缓存：设置为 ResponseCache 实例后 get_page 优先读缓存
+        # cache_offline 为True时只读缓存不访问网络，便于离线调试解析逻辑
+        self.cache = None
+        self.cache_offline = False
+        
+        # 下载链接快速路径：先探测按书籍ID构造的下载地址，失败再解析详情页
+        self.speculative_download = True
+        self.min_download_size = 1024
+        self.link_stats = {'direct_hit': 0, 'direct_miss': 0, 'detail_page': 0,
+                           'constructed': 0, 'not_found': 0}
+        self._link_stats_lock = threading.Lock()
+        
+        # 限速配置：固定范围的随机延时（秒）
+        self.request_delay = (1, 3)
+        self.retry_delay = (2, 5)
+        self.page_delay = (2, 4)
+        self.download_delay = (3, 6)
+        self.max_retry_after = 120
+        # 设置为 AdaptiveRateController 实例后，改由其根据服务器反馈控制每个请求的间隔，
+        # 上面的固定延时不再生效
+        self.rate_controller = None
+        
+        # 计量：每次 crawl_pages 重新开始，结束时写入 novels/crawl_report_*.json
+        self.metrics = CrawlMetrics()
+        self.write_report = True
+        
+        # 共享队列：设置为 Frontier 实例后可用 run_worker 多进程协作爬取，
+        # 同一主机的请求间隔由队列在所有进程间统一控制
+        self.frontier = None
+        self.worker_id = default_worker_id()
         
         # 创建下载目录
         if not os.path.exists(self.download_dir):
@@ -35,128 +147,350 @@ class NovelSpider:
             'Upgrade-Insecure-Requests': '1',
             'Cache-Control': 'max-age=0'
         }
-        self.session.headers.update(self.headers)
+    
+    @property
+    def session(self):
+        """当前线程的Session，首次使用时创建；并发爬取时各线程互不影响"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+    
+    @property
+    def state(self):
+        """爬取状态库，首次使用时打开"""
+        if self._state is None:
+            with self._lazy_lock:
+                if self._state is None:
+                    self._state = CrawlState(self.state_db, self.state_journal_mode)
+        return self._state
+    
+    @property
+    def url_filter(self):
+        """URL过滤器，首次使用时加载并补上状态库中尚未加入的URL；未启用时为None"""
+        if self._url_filter is None and self.use_url_filter:
+            self._url_filter = ScalableBloomFilter.open(self._url_filter_file())
+            if self._url_filter.watermark > self.state.max_rowid():
+                # 同步位置超出状态库，说明过滤器属于另一个状态库，重新建立
+                self._url_filter = ScalableBloomFilter()
+            self._sync_url_filter()
+        return self._url_filter
+    
+    def _url_filter_file(self):
+        return self.url_filter_path or os.path.join(self.download_dir, 'seen_urls.bloom')
+    
+    def _sync_url_filter(self):
+        """把状态库中 rowid 大于过滤器同步位置的URL加入过滤器
+        
+        过滤器上次没有保存（异常退出）或状态库被其他进程写入时，两者据此重新对齐，
+        保证过滤器判断为新URL时状态库中一定没有记录。
+        """
+        url_filter = self._url_filter
+        for rowid, url in self.state.urls_since(url_filter.watermark):
+            url_filter.add(url)
+            url_filter.watermark = rowid
+    
+    def save_url_filter(self):
+        """同步并保存URL过滤器"""
+        if self._url_filter is None:
+            return
+        with self._sighting_lock:
+            self._sync_url_filter()
+            if self._url_filter.dirty:
+                self._url_filter.save(self._url_filter_file())
+    
+    def _new_run(self):
+        self.run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{os.urandom(4).hex()}"
+    
+    def _first_sighting(self, novel):
+        """流式去重：记录一本出现在列表页中的小说，返回 (是否本次运行首次出现, 之前的状态记录)"""
+        book_id = self._extract_book_id(novel['url'])
+        with self._sighting_lock:
+            url_filter = self.url_filter
+            if url_filter is not None and url_filter.add(novel['url']):
+                # 过滤器中一定没有：状态库里也没有记录，直接插入
+                self.metrics.incr('filter_new')
+                self.state.mark_seen(novel, book_id, self.run_id)
+                return True, None
+            if url_filter is not None:
+                self.metrics.incr('filter_positive')
+            record = self.state.see(novel, book_id, self.run_id)
+        first = record is None or record['last_seen_run'] != self.run_id
+        if url_filter is not None and record is None:
+            self.metrics.incr('filter_false_positive')
+        return first, record
+    
+    @property
+    def store(self):
+        """小说内容存储，首次使用时打开"""
+        if self._store is None:
+            with self._lazy_lock:
+                if self._store is None:
+                    self._store = NovelStore(self.download_dir, compress=self.compress_store)
+        return self._store
+    
+    def _extract_book_id(self, novel_url):
+        """从小说URL中提取书籍ID"""
+        match = re.search(r'/book/(\d+)/?', novel_url)
+        return match.group(1) if match else None
     
     def get_page(self, url, retries=3):
         """获取页面内容，带重试机制"""
+        raw = self.fetch_page_bytes(url, retries)
+        if raw is None:
+            return None
+        return raw.decode('gbk', errors='replace')  # 网站使用gbk编码
+    
+    def fetch_page_bytes(self, url, retries=3, stage='page'):
+        """获取页面原始字节，带重试机制；配置了缓存时优先读取缓存
+        
+        stage 为计量阶段名，如 list、detail、read。
+        """
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached and (cached['fresh'] or self.cache_offline):
+                self.metrics.incr('cache_hits')
+                return cached['body']
+            if self.cache_offline:
+                print(f"离线模式缓存未命中: {url}")
+                return None
+        
+        # 缓存过期时发条件请求，页面未变化则不必重新传输
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        
         for i in range(retries):
             try:
                 # 随机延时，避免被反爬
-                time.sleep(random.uniform(1, 3))
+                self._throttle(self.request_delay, stage, url)
                 
-                # 随机更换User-Agent
-                self.session.headers['User-Agent'] = self.ua.random
+                # 随机更换User-Agent：随请求传递，不修改共享的Session请求头
+                headers['User-Agent'] = self.ua.random
                 
-                response = self.session.get(url, timeout=10)
-                response.encoding = 'gbk'  # 网站使用gbk编码
+                started = time.perf_counter()
+                response = None
+                response = self.session.get(url, timeout=10, headers=headers)
+                # 重试次数只在最后一次尝试时记录一次，每次都记 i 会把 0+1+2 累加进总数
+                final = (i == retries - 1 or response.status_code == 200
+                         or (response.status_code == 304 and cached))
+                self._record_response(stage, url, response, started,
+                                      len(response.content), retries=i if final else 0)
                 
-                if response.status_code == 200:
-                    return response.text
+                if response.status_code == 304 and cached:
+                    self.metrics.incr('cache_revalidated')
+                    self.cache.touch(url)
+                    return cached['body']
+                elif response.status_code == 200:
+                    if self.cache is not None:
+                        self.cache.put(url, response.content, response.headers)
+                    return response.content
                 else:
                     print(f"请求失败，状态码: {response.status_code}")
+                    # 未启用自适应限速时也遵守服务器给出的Retry-After
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after and self.rate_controller is None and i < retries - 1:
+                        retry_after = min(retry_after, self.max_retry_after)
+                        time.sleep(retry_after)
+                        self.metrics.add_sleep(stage, retry_after)
                     
             except Exception as e:
+                if isinstance(e, requests.RequestException) and response is None:
+                    self._record_response(stage, url, None, started,
+                                          retries=i if i == retries - 1 else 0)
                 print(f"请求出错 (尝试 {i+1}/{retries}): {e}")
                 if i < retries - 1:
-                    time.sleep(random.uniform(2, 5))
+                    self._pause(self.retry_delay, stage)
         
         return None
     
-    def parse_novel_list(self, html):
-        """解析小说列表页面"""
-        soup = BeautifulSoup(html, 'html.parser')
-        novels = []
-        
-        # 解析推荐小说（顶部大图区域）
-        featured_items = soup.find_all('div', class_='item')
-        for item in featured_items:
-            try:
-                title_link = item.find('dt').find('a')
-                if title_link:
-                    title = title_link.get_text().strip()
-                    url = title_link.get('href')
-                    author = item.find('dt').find('span').get_text().strip()
-                    
-                    novels.append({
-                        'title': title,
-                        'author': author,
-                        'url': url
-                    })
-            except Exception as e:
-                print(f"解析推荐小说出错: {e}")
-                continue
+    def _throttle(self, delay_range=None, stage='page', url=None):
+        """请求前等待：启用自适应限速时由控制器决定间隔，否则按固定范围随机延时
         
-        # 解析更新列表
-        list_items = soup.find('ul', class_='txt-list txt-list-row5')
-        if list_items:
-            for li in list_items.find_all('li'):
-                try:
-                    title_link = li.find('span', class_='s2').find('a')
-                    author_span = li.find('span', class_='s4')
-                    
-                    if title_link and author_span:
-                        title = title_link.get_text().strip()
-                        url = title_link.get('href')
-                        author = author_span.get_text().strip()
-                        
-                        novels.append({
-                            'title': title,
-                            'author': author,
-                            'url': url
-                        })
-                except Exception as e:
-                    print(f"解析列表小说出错: {e}")
-                    continue
+        使用共享队列时，先按主机在队列中预约，保证所有进程合计的请求间隔。
+        """
+        if self.frontier is not None and url:
+            self.metrics.add_sleep(stage, self.frontier.wait_for_host(url))
+        if self.rate_controller is not None:
+            waited = self.rate_controller.wait()
+        elif delay_range:
+            waited = random.uniform(*delay_range)
+            time.sleep(waited)
+        else:
+            return
+        self.metrics.add_sleep(stage, waited)
+    
+    def _pause(self, delay_range, stage='page'):
+        """阶段之间的固定延时；启用自适应限速时每个请求已单独限速，不再额外等待"""
+        if self.rate_controller is None:
+            waited = random.uniform(*delay_range)
+            time.sleep(waited)
+            self.metrics.add_sleep(stage, waited)
+    
+    def _record_response(self, stage, url, response, started, nbytes=0, retries=0):
+        """记录请求计量，并把响应（None表示超时或连接失败）反馈给自适应限速器"""
+        if response is None:
+            latency = time.perf_counter() - started
+            self.metrics.record_request(stage, url, None, latency, retries=retries)
+            if self.rate_controller is not None:
+                self.rate_controller.on_timeout()
+            return
         
-        return novels
+        latency = response.elapsed.total_seconds()
+        self.metrics.record_request(stage, url, response.status_code, latency, nbytes, retries)
+        if self.rate_controller is not None:
+            self.rate_controller.on_response(
+                response.status_code, latency,
+                parse_retry_after(response.headers.get('Retry-After')))
+    
+    def _iter_body(self, response, stage='download'):
+        """按块读取流式响应体，同时计量字节数"""
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            if chunk:
+                self.metrics.add_bytes(stage, len(chunk))
+                yield chunk
+    
+    def parse_novel_list(self, html):
+        """解析小说列表页面"""
+        return page_parser.parse_novel_list(html, self.parser_backend)
+    
+    @property
+    def parse_pool(self):
+        """解析进程池，parse_workers 大于0时首次使用时创建"""
+        if self._parse_pool is None and self.parse_workers > 0:
+            with self._lazy_lock:
+                if self._parse_pool is None:
+                    self._parse_pool = page_parser.ParsePool(
+                        self.parse_workers, self.parse_max_in_flight, self.parser_backend)
+        return self._parse_pool
+    
+    def parse_page(self, page_type, raw):
+        """解析页面原始字节；启用进程池时在子进程中解析，当前线程只等待结果"""
+        with self.metrics.timer('parse'):
+            pool = self.parse_pool
+            if pool is not None:
+                return pool.parse(page_type, raw)
+            return page_parser.parse_job(page_type, raw, 'gbk', self.parser_backend)
+    
+    def _novels_from_records(self, records):
+        """把解析任务返回的元组还原为小说字典，相对地址按站点根地址补全"""
+        return [{'title': title, 'author': author, 'url': urljoin(self.base_url, url) if url else url}
+                for title, author, url in records]
     
     def get_download_link(self, novel_url):
         """获取小说下载链接"""
-        import re
+        book_id = self._extract_book_id(novel_url)
+        
+        # 快速路径：URL中带有书籍ID时先探测构造的下载地址，省去详情页请求与解析
+        speculated = False
+        if self.speculative_download and book_id:
+            speculated = True
+            direct_url = self._direct_download_url(book_id)
+            if self._probe_download(direct_url):
+                self._count_link('direct_hit')
+                return direct_url
+            self._count_link('direct_miss')
+        
         # 首先尝试在详情页查找直接下载链接
-        html = self.get_page(novel_url)
-        if not html:
+        raw = self.fetch_page_bytes(novel_url, stage='detail')
+        if raw is None:
+            self._count_link('not_found')
             return None
         
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # 查找TXT下载链接，使用更精确的选择器
-        download_links = soup.find_all('a', class_=re.compile(r'.*btn-dl.*|.*download.*', re.I))
-        if not download_links:
-            download_links = soup.find_all('a', string=re.compile(r'TXT下载', re.I))
+        # 查找TXT下载链接
+        download_links = self.parse_page(page_parser.PAGE_DETAIL, raw)
         
-        for link in download_links:
-            href = link.get('href')
+        for href in download_links:
             if href:
+                self._count_link('detail_page')
                 if href.startswith('http'):
                     return href
                 elif href.startswith('/'):
-                    return f"https://www.qishuxia.com{href}"
+                    return f"{self.site_root}{href}"
                 else:
-                    return f"https://www.qishuxia.com/{href}"
+                    return f"{self.site_root}/{href}"
         
-        # 尝试构造下载链接，基于小说ID
-        # 从URL中提取小说ID
-        match = re.search(r'/book/(\d+)/?', novel_url)
-        if match:
-            book_id = match.group(1)
-            return f"https://www.qishuxia.com/modules/article/txtarticle.php?id={book_id}"
+        # 尝试构造下载链接，基于小说ID（快速路径已探测失败时不再重复）
+        if book_id and not speculated:
+            self._count_link('constructed')
+            return self._direct_download_url(book_id)
         
+        self._count_link('not_found')
         return None
     
+    def _count_link(self, kind):
+        with self._link_stats_lock:
+            self.link_stats[kind] += 1
+    
+    def _direct_download_url(self, book_id):
+        """根据书籍ID构造TXT下载地址"""
+        return f"{self.site_root}/modules/article/txtarticle.php?id={book_id}"
+    
+    def _probe_download(self, url):
+        """探测下载地址是否可用：状态200、非HTML且大小不低于下限"""
+        started = time.perf_counter()
+        try:
+            self._throttle(stage='probe', url=url)
+            started = time.perf_counter()
+            response = self.session.head(url, timeout=10, allow_redirects=True)
+            if response.status_code in (405, 501):
+                # 不支持HEAD时只读取响应头
+                response = self.session.get(url, timeout=10, stream=True)
+                response.close()
+            self._record_response('probe', url, response, started)
+        except Exception as e:
+            if isinstance(e, requests.RequestException):
+                self._record_response('probe', url, None, started)
+            print(f"探测下载地址出错: {e}")
+            return False
+        
+        if response.status_code != 200:
+            return False
+        content_type = response.headers.get('Content-Type', '').lower()
+        if 'html' in content_type:
+            # 下载地址失效时网站通常返回错误页面
+            return False
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) < self.min_download_size:
+            return False
+        return True
+    
+    def link_hit_rates(self):
+        """下载链接各获取路径的命中率"""
+        stats = self.link_stats
+        attempts = stats['direct_hit'] + stats['direct_miss']
+        lookups = (stats['direct_hit'] + stats['detail_page']
+                   + stats['constructed'] + stats['not_found'])
+        
+        def ratio(count, total):
+            return round(count / total, 3) if total else 0.0
+        
+        return {
+            'direct_hit_rate': ratio(stats['direct_hit'], attempts),
+            'direct_share': ratio(stats['direct_hit'], lookups),
+            'detail_page_share': ratio(stats['detail_page'], lookups),
+            'constructed_share': ratio(stats['constructed'], lookups),
+            'not_found_share': ratio(stats['not_found'], lookups),
+            **stats
+        }
+    
     def find_txt_in_read_page(self, read_url):
         """在阅读页面查找TXT下载链接"""
-        html = self.get_page(read_url)
-        if not html:
+        raw = self.fetch_page_bytes(read_url, stage='read')
+        if raw is None:
             return None
         
-        soup = BeautifulSoup(html, 'html.parser')
-        
         # 在阅读页面查找下载链接
-        download_links = soup.find_all('a', href=re.compile(r'.*\.(txt|TXT).*'))
+        href = self.parse_page(page_parser.PAGE_READ, raw)
         
-        if download_links:
-            return urljoin(read_url, download_links[0].get('href'))
+        if href:
+            return urljoin(read_url, href)
         
         return None
     
@@ -164,109 +498,956 @@ class NovelSpider:
         """下载小说文件"""
         print(f"正在处理: {novel_info['title']} - {novel_info['author']}")
         
+        record = self.state.get(novel_info['url'])
+        if record is None:
+            self.state.mark_seen(novel_info, self._extract_book_id(novel_info['url']))
+        
+        # 已下载的小说：未到复查时间直接跳过，否则对原下载地址发条件请求
+        download_url = None
+        conditional = None
+        if self._is_up_to_date(record):
+            print(f"已下载，跳过: {novel_info['title']}")
+            return True
+        if (record and record['status'] == STATUS_DONE and record['file_path']
+                and os.path.exists(record['file_path'])):
+            download_url = record['download_url']
+            conditional = {}
+            if record['etag']:
+                conditional['If-None-Match'] = record['etag']
+            if record['last_modified']:
+                conditional['If-Modified-Since'] = record['last_modified']
+        
         # 获取下载链接
-        download_url = self.get_download_link(novel_info['url'])
+        if not download_url:
+            download_url = self.get_download_link(novel_info['url'])
         
         if not download_url:
             print(f"未找到下载链接: {novel_info['title']}")
+            self.state.mark_failed(novel_info['url'])
             return False
         
+        # 清理文件名
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', novel_info['title'])
+        filename = f"{safe_title}_{novel_info['author']}.txt"
+        filepath = os.path.join(self.download_dir, filename)
+        
+        # 同一下载地址已经下载过（例如镜像书页指向同一文件），只添加别名，不再传输
+        if self.dedup_content and conditional is None:
+            content_hash = self.store.hash_for_source(download_url)
+            if content_hash:
+                saved_path = self.store.add_alias(
+                    content_hash, novel_info['title'], novel_info['author'],
+                    novel_info['url'], download_url, filepath)
+                self.state.mark_downloaded(novel_info['url'], download_url,
+                                           saved_path, content_hash)
+                self._index_novel(saved_path, content_hash)
+                print(f"下载地址已下载过，只保存别名: {filename}")
+                return True
+        
         try:
-            # 下载文件
-            response = self.session.get(download_url, timeout=30)
-            
-            if response.status_code == 200:
-                # 清理文件名
-                safe_title = re.sub(r'[<>:"/\\|?*]', '_', novel_info['title'])
-                filename = f"{safe_title}_{novel_info['author']}.txt"
-                filepath = os.path.join(self.download_dir, filename)
-                
-                # 处理编码并保存文件
-                content = response.content
-                
-                # 尝试不同的编码
-                encodings = ['utf-8', 'gbk', 'gb2312', 'big5']
-                decoded_content = None
-                
-                for encoding in encodings:
-                    try:
-                        decoded_content = content.decode(encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                if decoded_content is None:
-                    # 如果所有编码都失败，使用utf-8并忽略错误
-                    decoded_content = content.decode('utf-8', errors='ignore')
-                
-                # 以UTF-8编码保存文件
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(decoded_content)
-                
-                print(f"下载成功: {filename}")
+            result = self.fetch_to_file(download_url, filepath, conditional)
+            if result and result['not_modified']:
+                self.state.mark_unchanged(novel_info['url'])
+                print(f"未更新，跳过: {filename}")
+                return True
+            if result:
+                if self.postprocess is not None:
+                    # 交给后处理进程池，处理完成后再存储、建索引并标记完成
+                    future = self.postprocess_pool.submit(filepath)
+                    with self._postprocess_lock:
+                        self._postprocess_pending.append(
+                            (future, novel_info, download_url, filepath, result, record))
+                    print(f"下载完成，等待后处理: {filename} ({result['encoding']})")
+                    return True
+                self._finish_download(novel_info, download_url, filepath, result, record)
                 return True
-            else:
-                print(f"下载失败，状态码: {response.status_code}")
                 
         except Exception as e:
             print(f"下载出错: {e}")
         
+        self.state.mark_failed(novel_info['url'])
         return False
     
+    def _finish_download(self, novel_info, download_url, filepath, result, record):
+        """把下载（或后处理）完成的文件纳入存储、生成索引并记录状态"""
+        filename = os.path.basename(filepath)
+        saved_path = filepath
+        is_new = True
+        if self.dedup_content:
+            with self.metrics.timer('store'):
+                is_new, saved_path = self.store.commit(
+                    filepath, result['content_hash'], novel_info['title'],
+                    novel_info['author'], novel_info['url'], download_url)
+            if saved_path.endswith('.gz') and os.path.exists(chapter_index.index_path_for(filepath)):
+                # 后处理生成的章节索引对压缩存储无用
+                os.remove(chapter_index.index_path_for(filepath))
+        
+        self._index_novel(saved_path, result['content_hash'])
+        
+        if record and record['content_hash'] == result['content_hash']:
+            print(f"内容未变化: {filename}")
+        elif not is_new:
+            print(f"内容与已下载的小说相同，只保存别名: {filename}")
+        else:
+            print(f"下载成功: {filename} ({result['encoding']})")
+        self.state.mark_downloaded(
+            novel_info['url'], download_url, saved_path, result['content_hash'],
+            result['etag'], result['last_modified'])
+    
+    @property
+    def postprocess_pool(self):
+        """后处理进程池，设置 postprocess 后首次使用时创建"""
+        if self._postprocess_pool is None and self.postprocess is not None:
+            with self._lazy_lock:
+                if self._postprocess_pool is None:
+                    self._postprocess_pool = PostProcessPool(
+                        self.postprocess, self.postprocess_workers, self.postprocess_max_in_flight)
+        return self._postprocess_pool
+    
+    def finish_postprocessing(self, wait=False):
+        """收取已完成的后处理任务（wait 为True时等待全部完成），返回成功处理的数量
+        
+        处理出错时原文件保持不变，按未处理的内容存储。
+        """
+        with self._postprocess_lock:
+            if wait:
+                ready, self._postprocess_pending = self._postprocess_pending, []
+            else:
+                ready = [item for item in self._postprocess_pending if item[0].done()]
+                self._postprocess_pending = [item for item in self._postprocess_pending
+                                             if not item[0].done()]
+        
+        processed = 0
+        for future, novel_info, download_url, filepath, result, record in ready:
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"后处理出错，保存原文: {os.path.basename(filepath)} - {e}")
+                self.metrics.incr('postprocess_failed')
+            else:
+                processed += 1
+                result = dict(result, content_hash=stats['content_hash'])
+                self.metrics.add_work('postprocess', stats['seconds'])
+                self.metrics.incr('postprocessed')
+                self.metrics.incr('postprocess_bytes_saved', stats['bytes_in'] - stats['bytes_out'])
+                if stats.get('ads_dropped'):
+                    # 删除的水印行打印出来，误删时可以发现并调整规则
+                    self.metrics.incr('postprocess_ads_dropped', stats['ads_dropped'])
+                    print(f"后处理删除水印行 {stats['ads_dropped']} 行: {os.path.basename(filepath)}")
+                    for line in stats.get('dropped_lines', {}).get('ads', []):
+                        print(f"    {line}")
+            try:
+                self._finish_download(novel_info, download_url, filepath, result, record)
+            except Exception as e:
+                print(f"保存出错: {os.path.basename(filepath)} - {e}")
+                self.state.mark_failed(novel_info['url'])
+        return processed
+    
+    def _index_novel(self, path, content_hash=None):
+        """为正文生成章节索引（已有最新索引时跳过），并加入全文索引"""
+        if path.endswith('.gz'):
+            return
+        try:
+            with self.metrics.timer('index'):
+                if self.index_chapters:
+                    chapter_index.ensure_index(path)
+                if self.fulltext is not None:
+                    self.fulltext.add(path, content_hash)
+        except OSError as e:
+            print(f"生成索引出错: {e}")
+    
+    def _is_up_to_date(self, record):
+        """已下载、文件仍在且未到复查时间"""
+        return bool(record and record['status'] == STATUS_DONE and record['file_path']
+                    and os.path.exists(record['file_path'])
+                    and time.time() - (record['last_checked'] or 0) < self.recheck_after)
+    
+    def fetch_to_file(self, url, filepath, conditional=None):
+        """下载url并以UTF-8保存到filepath
+        
+        成功时返回包含 encoding、content_hash、etag、last_modified、not_modified
+        的字典，失败返回None。conditional 为条件请求头，服务器返回304时
+        not_modified 为True且不写文件。
+        原始字节先落盘到 filepath + '.<URL摘要>.download'，中断后再次下载会通过
+        Range 请求从断点继续；成功后删除该文件。临时文件名带下载地址的摘要，
+        同名同作者的不同书并发下载时不会写到同一个文件。
+        """
+        tag = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+        raw_path = f"{filepath}.{tag}.download"
+        result = {'encoding': None, 'content_hash': None, 'etag': None,
+                  'last_modified': None, 'not_modified': False}
+        
+        if self.range_workers > 1 and not conditional:
+            total, validator = self._probe_range_support(url, result)
+            if total and total >= self.range_min_size:
+                if not self.download_ranges(url, raw_path, total, validator):
+                    print("分段下载未完成，下次运行将继续")
+                    return None
+                result['encoding'], result['content_hash'] = self.save_stream(
+                    self._iter_file(raw_path), filepath, tag)
+                self._remove_download(raw_path)
+                return result
+        
+        if not self.resume_downloads:
+            response = self._open_download(url, conditional)
+            try:
+                if response.status_code == 304:
+                    result['not_modified'] = True
+                    return result
+                if response.status_code != 200:
+                    print(f"下载失败，状态码: {response.status_code}")
+                    return None
+                self._record_validators(response, result)
+                result['encoding'], result['content_hash'] = self.save_stream(
+                    self._iter_body(response), filepath, tag)
+                return result
+            finally:
+                response.close()
+        
+        chunks = self._resumable_chunks(url, raw_path, result, conditional)
+        if result['not_modified']:
+            return result
+        if chunks is None:
+            return None
+        result['encoding'], result['content_hash'] = self.save_stream(chunks, filepath, tag)
+        self._remove_download(raw_path)
+        return result
+    
+    def _open_download(self, url, headers=None, session=None):
+        """发起流式下载请求；禁用压缩，保证Range按原始字节计算"""
+        request_headers = {'Accept-Encoding': 'identity'}
+        if headers:
+            request_headers.update(headers)
+        session = session or self.session
+        self._throttle(stage='download', url=url)
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=request_headers, timeout=30, stream=True)
+        except requests.RequestException:
+            self._record_response('download', url, None, started)
+            raise
+        self._record_response('download', url, response, started)
+        return response
+    
+    def _resumable_chunks(self, url, raw_path, result, conditional=None):
+        """返回可续传的字节块迭代器：先回放已下载部分，再追加网络数据"""
+        meta = self._load_download_meta(raw_path)
+        offset = 0
+        if (meta.get('mode') == 'stream' and meta.get('url') == url
+                and os.path.exists(raw_path)):
+            offset = os.path.getsize(raw_path)
+        
+        if offset:
+            headers = {'Range': f'bytes={offset}-'}
+            if meta.get('validator'):
+                headers['If-Range'] = meta['validator']
+        else:
+            headers = dict(conditional or {})
+        
+        response = self._open_download(url, headers)
+        total = None
+        
+        if not offset and response.status_code == 304:
+            response.close()
+            result['not_modified'] = True
+            return None
+        elif offset and response.status_code == 206:
+            start, _, total = self._parse_content_range(response)
+            if start != offset:
+                response.close()
+                print(f"续传位置不一致: 期望 {offset}，服务器返回 {start}")
+                return None
+            result['etag'] = meta.get('etag')
+            result['last_modified'] = meta.get('last_modified')
+            print(f"从 {offset} 字节处继续下载")
+        elif offset and response.status_code == 416:
+            response.close()
+            match = re.search(r'\*/(\d+)', response.headers.get('Content-Range', ''))
+            if not (match and int(match.group(1)) == offset):
+                # 本地文件比服务器上的更长，说明文件已变化，重新下载
+                self._remove_download(raw_path)
+                return self._resumable_chunks(url, raw_path, result, conditional)
+            # 本地文件已经完整
+            result['etag'] = meta.get('etag')
+            result['last_modified'] = meta.get('last_modified')
+            response = None
+            total = offset
+        elif response.status_code == 200:
+            # 服务器忽略了Range或文件已变化，从头下载
+            offset = 0
+            length = response.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() else None
+            self._record_validators(response, result)
+            self._save_download_meta(raw_path, {
+                'mode': 'stream',
+                'url': url,
+                'validator': self._get_validator(response),
+                'etag': result['etag'],
+                'last_modified': result['last_modified']
+            })
+        else:
+            response.close()
+            print(f"下载失败，状态码: {response.status_code}")
+            return None
+        
+        def generate():
+            if offset:
+                yield from self._iter_file(raw_path, offset)
+            if response is None:
+                return
+            try:
+                with open(raw_path, 'ab' if offset else 'wb') as raw:
+                    for chunk in self._iter_body(response):
+                        raw.write(chunk)
+                        yield chunk
+            finally:
+                response.close()
+            
+            # 完整性检查：长度不符时保留原始文件以便续传
+            size = os.path.getsize(raw_path)
+            if total is not None and size != total:
+                raise IOError(f"下载不完整: {size}/{total} 字节")
+        
+        return generate()
+    
+    def _probe_range_support(self, url, result):
+        """探测服务器是否支持Range，返回(文件大小, 校验标识)"""
+        started = time.perf_counter()
+        try:
+            self._throttle(stage='probe', url=url)
+            started = time.perf_counter()
+            response = self.session.head(url, timeout=10, allow_redirects=True,
+                                         headers={'Accept-Encoding': 'identity'})
+            self._record_response('probe', url, response, started)
+        except Exception as e:
+            if isinstance(e, requests.RequestException):
+                self._record_response('probe', url, None, started)
+            print(f"探测Range支持出错: {e}")
+            return None, None
+        
+        length = response.headers.get('Content-Length', '')
+        if (response.status_code == 200 and length.isdigit()
+                and response.headers.get('Accept-Ranges', '').lower() == 'bytes'):
+            self._record_validators(response, result)
+            return int(length), self._get_validator(response)
+        return None, None
+    
+    def download_ranges(self, url, raw_path, total, validator=None):
+        """分段并行下载到raw_path，各段直接写入文件对应位置"""
+        segment_size = -(-total // self.range_workers)
+        segments = [(start, min(start + segment_size, total) - 1)
+                    for start in range(0, total, segment_size)]
+        
+        # done 只记录各段的起始偏移，分段方式（由连接数决定）变化后旧记录对应不上新分段，
+        # 继续使用会把未下载的字节当作已完成，因此段大小不一致时从头下载
+        meta = self._load_download_meta(raw_path)
+        if (meta.get('mode') == 'ranges' and meta.get('url') == url
+                and meta.get('total') == total and meta.get('validator') == validator
+                and meta.get('segment_size') == segment_size
+                and os.path.exists(raw_path) and os.path.getsize(raw_path) == total):
+            done = set(meta.get('done', []))
+        else:
+            done = set()
+            # 预分配文件，各段按偏移写入
+            with open(raw_path, 'wb') as raw:
+                raw.truncate(total)
+        
+        meta = {'mode': 'ranges', 'url': url, 'total': total, 'validator': validator,
+                'segment_size': segment_size, 'done': sorted(done)}
+        self._save_download_meta(raw_path, meta)
+        
+        pending = [seg for seg in segments if seg[0] not in done]
+        if pending:
+            print(f"分段下载: {len(pending)}/{len(segments)} 段，{self.range_workers} 个连接")
+        
+        with ThreadPoolExecutor(max_workers=self.range_workers) as pool:
+            futures = {
+                pool.submit(self._fetch_range, url, raw_path, start, end, total, validator): start
+                for start, end in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"分段下载出错: {e}")
+                    ok = False
+                if ok:
+                    done.add(futures[future])
+                    meta['done'] = sorted(done)
+                    self._save_download_meta(raw_path, meta)
+        
+        return len(done) == len(segments) and os.path.getsize(raw_path) == total
+    
+    def _fetch_range(self, url, raw_path, start, end, total, validator):
+        """下载单个分段，校验Content-Range与实际写入长度"""
+        headers = {'Range': f'bytes={start}-{end}'}
+        if validator:
+            headers['If-Range'] = validator
+        
+        # requests.Session 不保证线程安全，每个分段使用独立会话
+        with requests.Session() as session:
+            session.headers.update(self.session.headers)
+            response = self._open_download(url, headers, session)
+            try:
+                if response.status_code != 206:
+                    print(f"分段 {start}-{end} 失败，状态码: {response.status_code}")
+                    return False
+                if self._parse_content_range(response) != (start, end, total):
+                    print(f"分段 {start}-{end} 的Content-Range不匹配")
+                    return False
+                
+                written = 0
+                with open(raw_path, 'r+b') as raw:
+                    raw.seek(start)
+                    for chunk in self._iter_body(response):
+                        raw.write(chunk)
+                        written += len(chunk)
+            finally:
+                response.close()
+        
+        if written != end - start + 1:
+            print(f"分段 {start}-{end} 长度不符: {written}")
+            return False
+        return True
+    
+    def _parse_content_range(self, response):
+        """解析Content-Range头，返回(start, end, total)"""
+        match = re.match(r'bytes\s+(\d+)-(\d+)/(\d+|\*)',
+                         response.headers.get('Content-Range', ''))
+        if not match:
+            return None, None, None
+        total = match.group(3)
+        return (int(match.group(1)), int(match.group(2)),
+                int(total) if total.isdigit() else None)
+    
+    def _record_validators(self, response, result):
+        """记录ETag与Last-Modified，供下次条件请求使用"""
+        result['etag'] = response.headers.get('ETag')
+        result['last_modified'] = response.headers.get('Last-Modified')
+    
+    def _get_validator(self, response):
+        """取ETag（强校验）或Last-Modified作为If-Range的值"""
+        if response is None:
+            return None
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return response.headers.get('Last-Modified')
+    
+    def _iter_file(self, path, limit=None):
+        """按块读取本地文件，limit为最多读取的字节数"""
+        remaining = limit
+        with open(path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+    
+    def _load_download_meta(self, raw_path):
+        """读取续传元数据"""
+        try:
+            with open(raw_path + '.meta', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_download_meta(self, raw_path, meta):
+        """写入续传元数据"""
+        with open(raw_path + '.meta', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    
+    def _remove_download(self, raw_path):
+        """下载完成后清理原始文件与元数据"""
+        for path in (raw_path, raw_path + '.meta'):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def detect_encoding(self, sample):
+        """根据开头的字节样本判断编码，无法判断时返回None"""
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        
+        for encoding in self.encodings:
+            # 使用增量解码器，样本末尾被截断的多字节字符不会被当作错误
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                decoder.decode(sample, final=False)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        
+        return None
+    
+    def save_stream(self, chunks, filepath, tag=None):
+        """将字节块流式转码为UTF-8写入文件，返回(检测到的编码, 内容SHA-256)
+        
+        tag 用于区分临时文件名（如下载地址的摘要），并发写同一路径时互不覆盖
+        """
+        chunks = iter(chunks)
+        
+        # 读取开头样本用于编码检测
+        head = []
+        head_size = 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            head.append(chunk)
+            head_size += len(chunk)
+            if head_size >= self.sample_size:
+                break
+        sample = b''.join(head)
+        
+        encoding = self.detect_encoding(sample)
+        if encoding is None:
+            # 如果所有编码都失败，使用utf-8并忽略错误
+            encoding, errors = 'utf-8', 'ignore'
+        else:
+            # 样本之后偶尔出现的坏字节用替换字符代替，避免整本书下载失败
+            errors = 'replace'
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        
+        # 先写入临时文件，完成后再替换，避免留下不完整的小说文件
+        # 同时计算UTF-8内容的哈希，编码不同但内容相同的文件哈希一致
+        # 只统计转码与写盘耗时，等待网络数据的时间计入下载阶段
+        temp_path = f"{filepath}.{tag}.part" if tag else filepath + '.part'
+        digest = hashlib.sha256()
+        work = 0.0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chain([sample], chunks, [None]):
+                    started = time.perf_counter()
+                    if chunk is None:
+                        text = decoder.decode(b'', final=True)
+                    elif chunk:
+                        text = decoder.decode(chunk)
+                    else:
+                        continue
+                    data = text.encode('utf-8')
+                    digest.update(data)
+                    f.write(data)
+                    work += time.perf_counter() - started
+            os.replace(temp_path, filepath)
+            self.metrics.add_work('write', work)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        return encoding, digest.hexdigest()
+    
+    def _collect_list_page(self, page, novels, pending_novels):
+        """流式去重一页列表的解析结果，需要下载的小说加入 pending_novels，返回是否应停止翻页"""
+        print(f"第 {page} 页找到 {len(novels)} 本小说")
+        self.metrics.incr('found', len(novels))
+        
+        known_count = 0
+        for novel in novels:
+            first, record = self._first_sighting(novel)
+            if record is not None and record['status'] == STATUS_DONE:
+                known_count += 1
+            if not first:
+                continue
+            self.metrics.incr('unique')
+            # 已下载且未到复查时间的小说不再请求
+            if self._is_up_to_date(record):
+                self.metrics.incr('skipped')
+                continue
+            pending_novels.append(novel)
+        
+        # 列表按更新排序，整页都是已下载小说时后续页面也不会有新书
+        if self.stop_on_known_page and novels and known_count == len(novels):
+            print(f"第 {page} 页全部为已下载小说，停止翻页")
+            return True
+        return False
+    
+    def list_page_url(self, page, category=None):
+        """列表页地址；未指定分类时第1页为 base_url"""
+        if category is None:
+            if page == 1:
+                return self.base_url
+            category = self.category
+        return self.site_root + self.list_url_template.format(category=category, page=page)
+    
+    def seed_frontier(self, start_page=1, max_pages=10):
+        """把列表页加入共享队列，返回新加入的数量；已加入过的页面不会重复加入"""
+        added = self.frontier.add_many(
+            (self.list_page_url(page), KIND_LIST, {'page': page}, 1)
+            for page in range(start_page, max_pages + 2))
+        print(f"共享队列新增 {added} 个列表页")
+        return added
+    
+    def run_worker(self, exit_when_idle=True, idle_wait=1.0, poll_interval=0.05):
+        """从共享队列领取任务并处理，直到队列处理完（或一直运行）
+        
+        列表页任务解析出的小说作为新任务加入队列；小说任务下载后标记完成。
+        多个进程同时运行时，每项任务只会被一个进程持有；进程崩溃后租约到期，
+        任务由其他进程接管。返回本进程成功处理的任务数。
+        队列暂时没有可领取的任务时（例如其他进程正在解析列表页），从 poll_interval 秒开始
+        轮询，每次翻倍，最长 idle_wait 秒；已知下一项的可领取时间更早时提前醒来。
+        """
+        frontier = self.frontier
+        self.metrics = CrawlMetrics()
+        current = {'url': None}
+        stop = threading.Event()
+        
+        def heartbeat():
+            # 下载大文件时定期续约，避免租约在处理中过期
+            while not stop.wait(frontier.lease_seconds / 3):
+                url = current['url']
+                if url and not frontier.renew(url, self.worker_id):
+                    print(f"租约已被其他进程接管: {url}")
+        
+        keeper = threading.Thread(target=heartbeat, daemon=True)
+        keeper.start()
+        handled = 0
+        backoff = poll_interval
+        print(f"工作进程 {self.worker_id} 开始处理共享队列")
+        try:
+            while True:
+                item = frontier.lease(self.worker_id)
+                if item is None:
+                    wait = frontier.next_ready_in()
+                    if wait is None and exit_when_idle:
+                        break
+                    # 其他进程持有租约时 next_ready_in 是租约到期时间，可能很久；
+                    # 它们随时可能加入新任务，因此按退避间隔轮询，而不是一直等到租约到期
+                    pause = min(wait, backoff) if wait is not None else backoff
+                    time.sleep(pause)
+                    backoff = min(backoff * 2, idle_wait)
+                    continue
+                backoff = poll_interval
+                
+                current['url'] = item['url']
+                try:
+                    if item['kind'] == KIND_LIST:
+                        ok = self._process_list_item(item)
+                    else:
+                        ok = self._process_book_item(item)
+                except Exception as e:
+                    print(f"处理任务出错: {item['url']} - {e}")
+                    ok = False
+                finally:
+                    current['url'] = None
+                
+                if ok:
+                    frontier.complete(item['url'], self.worker_id)
+                    handled += 1
+                else:
+                    frontier.fail(item['url'], self.worker_id)
+        finally:
+            stop.set()
+            keeper.join()
+            self.finish_postprocessing(wait=True)
+        
+        print(f"\n工作进程 {self.worker_id} 结束，处理 {handled} 个任务，队列状态 {frontier.counts()}")
+        if self.write_report:
+            self.save_report(os.path.join(
+                self.download_dir,
+                f"crawl_report_{time.strftime('%Y%m%d_%H%M%S')}_{self.worker_id}.json"))
+        return handled
+    
+    def _process_list_item(self, item):
+        """处理列表页任务：解析出的小说加入共享队列"""
+        page = item['payload']['page']
+        print(f"\n正在爬取第 {page} 页...")
+        raw = self.fetch_page_bytes(item['url'], stage='list')
+        self.metrics.incr('list_pages')
+        if raw is None:
+            print(f"获取第 {page} 页失败")
+            return False
+        
+        novels = self._novels_from_records(self.parse_page(page_parser.PAGE_LIST, raw))
+        print(f"第 {page} 页找到 {len(novels)} 本小说")
+        for novel in novels:
+            self.state.mark_seen(novel, self._extract_book_id(novel['url']))
+        added = self.frontier.add_many((novel['url'], KIND_BOOK, novel, 0) for novel in novels)
+        self.metrics.incr('found', len(novels))
+        self.metrics.incr('unique', added)
+        return True
+    
+    def _process_book_item(self, item):
+        """处理小说任务：已下载且未到复查时间的直接完成，否则下载"""
+        novel = item['payload']
+        if self._is_up_to_date(self.state.get(novel['url'])):
+            self.metrics.incr('skipped')
+            return True
+        
+        with self.metrics.timer('book'):
+            ok = self.download_novel(novel)
+        self.metrics.incr('downloaded' if ok else 'failed')
+        self.finish_postprocessing()
+        return ok
+    
+    def close(self):
+        """等待后处理完成，保存URL过滤器，释放进程池、状态库与内容存储"""
+        if self._postprocess_pool is not None:
+            self.finish_postprocessing(wait=True)
+            self._postprocess_pool.shutdown()
+            self._postprocess_pool = None
+        if self._url_filter is not None:
+            self.save_url_filter()
+            self._url_filter = None
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+            self._parse_pool = None
+        if self._state is not None:
+            self._state.close()
+            self._state = None
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+    
     def crawl_pages(self, start_page=1, max_pages=10):
         """爬取指定页数的小说"""
-        all_novels = []
+        pending_novels = []
+        pool = self.parse_pool
+        pending = []
+        self.metrics = CrawlMetrics()
+        self._new_run()
         
         for page in range(start_page, max_pages + 2):
             print(f"\n正在爬取第 {page} 页...")
             
-            if page == 1:
-                url = self.base_url
-            else:
-                url = f"https://www.qishuxia.com/list/1_{page}.html"
+            url = self.list_page_url(page)
             
-            html = self.get_page(url)
-            if not html:
+            raw = self.fetch_page_bytes(url, stage='list')
+            self.metrics.incr('list_pages')
+            if raw is None:
                 print(f"获取第 {page} 页失败")
                 continue
             
-            novels = self.parse_novel_list(html)
-            print(f"第 {page} 页找到 {len(novels)} 本小说")
-            
-            all_novels.extend(novels)
+            if pool is None:
+                novels = self._novels_from_records(
+                    self.parse_page(page_parser.PAGE_LIST, raw))
+                if self._collect_list_page(page, novels, pending_novels):
+                    break
+            else:
+                # 解析交给进程池，抓取下一页不必等待；按页码顺序收取已完成的结果
+                # 提前停止翻页的判断会因此滞后，最多多抓取在途的几页
+                pending.append((page, pool.submit(page_parser.PAGE_LIST, raw)))
+                stop = False
+                while pending and pending[0][1].done():
+                    done_page, future = pending.pop(0)
+                    novels = self._novels_from_records(future.result())
+                    stop = self._collect_list_page(done_page, novels, pending_novels) or stop
+                if stop:
+                    break
             
             # 页面间延时
-            time.sleep(random.uniform(2, 4))
-        
-        print(f"\n总共找到 {len(all_novels)} 本小说")
+            self._pause(self.page_delay, 'list')
         
-        # 去重
-        unique_novels = []
-        seen_urls = set()
+        for done_page, future in pending:
+            self._collect_list_page(done_page, self._novels_from_records(future.result()),
+                                    pending_novels)
         
-        for novel in all_novels:
-            if novel['url'] not in seen_urls:
-                unique_novels.append(novel)
-                seen_urls.add(novel['url'])
-        
-        print(f"去重后剩余 {len(unique_novels)} 本小说")
+        counters = self.metrics.counters
+        print(f"\n总共找到 {counters.get('found', 0)} 本小说，"
+              f"去重后剩余 {counters.get('unique', 0)} 本")
+        skipped_count = counters.get('skipped', 0)
+        if skipped_count:
+            print(f"跳过 {skipped_count} 本已下载的小说")
+        self.save_url_filter()
         
         # 开始下载
         success_count = 0
-        for i, novel in enumerate(unique_novels, 1):
-            print(f"\n[{i}/{len(unique_novels)}] ", end="")
+        for i, novel in enumerate(pending_novels, 1):
+            print(f"\n[{i}/{len(pending_novels)}] ", end="")
             
-            if self.download_novel(novel):
+            with self.metrics.timer('book'):
+                ok = self.download_novel(novel)
+            if ok:
                 success_count += 1
+                self.metrics.incr('downloaded')
+            else:
+                self.metrics.incr('failed')
+            self.finish_postprocessing()
             
             # 下载间隔
-            time.sleep(random.uniform(3, 6))
+            self._pause(self.download_delay, 'download')
+        
+        self.finish_postprocessing(wait=True)
+        print(f"\n爬取完成！成功下载 {success_count}/{len(pending_novels)} 本小说")
+        
+        rates = self.link_hit_rates()
+        print(f"下载链接快速路径命中率 {rates['direct_hit_rate']:.0%} "
+              f"({rates['direct_hit']}/{rates['direct_hit'] + rates['direct_miss']})，"
+              f"详情页 {rates['detail_page_share']:.0%}，"
+              f"构造地址 {rates['constructed_share']:.0%}，"
+              f"未找到 {rates['not_found_share']:.0%}")
+        
+        if self.rate_controller is not None:
+            metrics = self.rate_controller.metrics()
+            print(f"自适应限速: 当前 {metrics['rate']:.2f} 次/秒，降速事件 {metrics['backoffs']}")
+        
+        if self.fulltext is not None:
+            with self.metrics.timer('index'):
+                self.fulltext.commit()
+            print(f"全文索引: {self.fulltext.stats()}")
+        
+        if self.write_report:
+            self.save_report()
+    
+    def save_report(self, path=None, extra=None):
+        """把本次爬取的计量报告写入JSON文件，返回报告字典"""
+        if path is None:
+            path = os.path.join(self.download_dir,
+                                f"crawl_report_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        extra = dict(extra or {}, link_stats=self.link_hit_rates())
+        if self.rate_controller is not None:
+            extra['rate_controller'] = self.rate_controller.metrics()
+        if self._url_filter is not None:
+            extra['url_filter'] = self._url_filter.stats()
+        report = self.metrics.write_report(path, extra)
+        
+        books_per_min = report.get('books_per_min')
+        print(f"耗时 {report['elapsed_seconds']:.1f} 秒，请求 {report['total_requests']} 次，"
+              f"下载 {report['total_bytes'] / 1024 / 1024:.1f} MB，限速等待 {report['sleep_seconds']:.1f} 秒"
+              + (f"，{books_per_min} 本/分钟" if books_per_min is not None else ""))
+        print(f"计量报告已保存: {path}")
+        return report
+    
+    def crawl_categories(self, categories, max_pages=10, concurrency=4, per_category_limit=None):
+        """并发爬取多个分类
+        
+        每个分类有独立的任务队列：列表页逐页加入（排在队首，保证持续发现新书），
+        解析出的小说排在其后。所有分类共享 concurrency 个并发额度，按轮转顺序分配，
+        大分类不会饿死小分类；per_category_limit 可以进一步限制单个分类占用的额度。
+        并发执行时不再有页面间、下载间的固定停顿，请求间隔统一由 _throttle 控制，
+        设置 rate_controller 后所有线程共用同一个速率。每个线程使用自己的Session，
+        User-Agent随请求传递，不修改共享状态。
+        
+        categories 为分类ID列表，列表页地址由 list_url_template 生成，每个分类最多 max_pages 页。
+        返回 {分类ID: 成功下载数}。
+        """
+        self.metrics = CrawlMetrics()
+        self._new_run()
+        scheduler = FairScheduler(concurrency, per_category_limit)
+        lock = threading.Lock()
+        downloaded = {category: 0 for category in categories}
         
-        print(f"\n爬取完成！成功下载 {success_count}/{len(unique_novels)} 本小说")
+        def handle(category, task):
+            kind, value = task
+            if kind == KIND_LIST:
+                return self._crawl_category_page(category, value, max_pages)
+            
+            with self.metrics.timer('book'):
+                ok = self.download_novel(value)
+            if ok:
+                with lock:
+                    downloaded[category] += 1
+                self.metrics.incr('downloaded')
+                self.metrics.incr(f'category_{category}_downloaded')
+            else:
+                self.metrics.incr('failed')
+                self.metrics.incr(f'category_{category}_failed')
+            self.finish_postprocessing()
+            return ()
+        
+        for category in categories:
+            scheduler.push(category, (KIND_LIST, 1))
+        scheduler.run(handle)
+        self.finish_postprocessing(wait=True)
+        self.save_url_filter()
+        
+        print(f"\n多分类爬取完成！")
+        for category, stats in scheduler.stats().items():
+            print(f"分类 {category}: 下载 {downloaded[category]} 本，任务 {stats['completed']}，"
+                  f"占用 {stats['busy_seconds']:.1f} 秒")
+        
+        if self.fulltext is not None:
+            with self.metrics.timer('index'):
+                self.fulltext.commit()
+        if self.write_report:
+            self.save_report(extra={'categories': scheduler.stats(),
+                                    'concurrency': concurrency})
+        return downloaded
+    
+    def _crawl_category_page(self, category, page, max_pages):
+        """处理一个分类列表页，返回后续任务：下一页（队首）与新发现的小说"""
+        url = self.list_page_url(page, category)
+        print(f"\n[分类 {category}] 正在爬取第 {page} 页...")
+        raw = self.fetch_page_bytes(url, stage='list')
+        self.metrics.incr('list_pages')
+        if raw is None:
+            print(f"[分类 {category}] 获取第 {page} 页失败")
+            return []
+        
+        novels = self._novels_from_records(self.parse_page(page_parser.PAGE_LIST, raw))
+        print(f"[分类 {category}] 第 {page} 页找到 {len(novels)} 本小说")
+        self.metrics.incr('found', len(novels))
+        
+        tasks = []
+        known_count = 0
+        for novel in novels:
+            first, record = self._first_sighting(novel)
+            if record is not None and record['status'] == STATUS_DONE:
+                known_count += 1
+            if not first:
+                continue
+            self.metrics.incr('unique')
+            if self._is_up_to_date(record):
+                self.metrics.incr('skipped')
+                continue
+            tasks.append(((KIND_BOOK, novel), False))
+        
+        if not novels:
+            return tasks
+        if self.stop_on_known_page and known_count == len(novels):
+            print(f"[分类 {category}] 第 {page} 页全部为已下载小说，停止翻页")
+        elif page < max_pages:
+            tasks.insert(0, ((KIND_LIST, page + 1), True))
+        return tasks
+
 
 def main():
-    spider = NovelSpider()
-    spider.crawl_pages(1, 10)  # 爬取前10页
+    parser = argparse.ArgumentParser(description='奇书网玄幻小说爬虫')
+    parser.add_argument('--site-root', default='https://www.qishuxia.com',
+                        help='站点根地址，例如本地替身网站 http://127.0.0.1:8000')
+    parser.add_argument('--categories', help='逗号分隔的分类ID，指定后并发爬取多个分类')
+    parser.add_argument('--concurrency', type=int, default=4, help='多分类爬取的全局并发数（默认4）')
+    parser.add_argument('--download-dir', default='novels', help='下载目录（默认novels）')
+    parser.add_argument('--start-page', type=int, default=1, help='起始页（默认1）')
+    parser.add_argument('--max-pages', type=int, default=10, help='爬取页数（默认10）')
+    parser.add_argument('--frontier', help='共享队列文件，指定后以工作进程方式运行')
+    parser.add_argument('--seed', action='store_true', help='把列表页加入共享队列')
+    parser.add_argument('--no-work', action='store_true', help='只加入队列，不处理任务')
+    parser.add_argument('--keep-running', action='store_true', help='队列处理完后继续等待新任务')
+    parser.add_argument('--worker-id', help='工作进程标识（默认主机名-进程号）')
+    parser.add_argument('--postprocess', type=int, metavar='N', default=0,
+                        help='用N个进程对下载的正文做后处理（全角转半角、整理空白）')
+    parser.add_argument('--strip-ads', action='store_true',
+                        help='后处理时删除整行的站点水印（删除的行会打印出来）')
+    args = parser.parse_args()
+    
+    spider = NovelSpider(args.site_root, args.download_dir)
+    if args.postprocess:
+        spider.postprocess = default_pipeline(chapters=spider.index_chapters,
+                                              strip_ads=args.strip_ads)
+        spider.postprocess_workers = args.postprocess
+    try:
+        if args.categories:
+            categories = [c.strip() for c in args.categories.split(',') if c.strip()]
+            spider.crawl_categories(categories, args.max_pages, args.concurrency)
+            return
+        if args.frontier is None:
+            spider.crawl_pages(args.start_page, args.max_pages)
+            return
+        
+        spider.frontier = Frontier(args.frontier)
+        if args.worker_id:
+            spider.worker_id = args.worker_id
+        if args.seed:
+            spider.seed_frontier(args.start_page, args.max_pages)
+        if not args.no_work:
+            spider.run_worker(exit_when_idle=not args.keep_running)
+    finally:
+        if spider.frontier is not None:
+            spider.frontier.close()
+        spider.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+小说内容存储
+按内容哈希去重保存小说正文，标题/作者作为别名指向同一份内容，支持可选的gzip压缩
+
+用法：
+    python novel_store.py list [存储目录]
+    python novel_store.py cat <标题> <作者> [存储目录]
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+
+class NovelStore:
+    """按内容哈希存储小说正文，同一内容只保存一份
+
+    目录结构：
+        <root>/.objects/<前两位>/<哈希>.txt[.gz]   正文（UTF-8）
+        <root>/.objects/store.db                 别名表与下载来源表
+        <root>/<标题>_<作者>.txt                  未压缩时为正文的硬链接，保持原有目录结构
+    """
+
+    def __init__(self, root, compress=False):
+        self.root = root
+        self.compress = compress
+        self.objects_dir = os.path.join(root, '.objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.objects_dir, 'store.db'),
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS aliases (
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    url TEXT,
+                    alias_path TEXT,
+                    created_at REAL,
+                    PRIMARY KEY (title, author)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS sources (
+                    download_url TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_aliases_hash ON aliases (content_hash)')
+
+    def object_path(self, content_hash, compressed=None):
+        """正文文件路径"""
+        compressed = self.compress if compressed is None else compressed
+        name = content_hash + ('.txt.gz' if compressed else '.txt')
+        return os.path.join(self.objects_dir, content_hash[:2], name)
+
+    def find_object(self, content_hash):
+        """已存储的正文路径（压缩或未压缩），不存在返回None"""
+        for compressed in (self.compress, not self.compress):
+            path = self.object_path(content_hash, compressed)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def hash_for_source(self, download_url):
+        """下载地址对应的已存储内容哈希，正文已不存在时返回None"""
+        with self.lock:
+            row = self.conn.execute('SELECT content_hash FROM sources WHERE download_url = ?',
+                                    (download_url,)).fetchone()
+        if row and self.find_object(row['content_hash']):
+            return row['content_hash']
+        return None
+
+    def commit(self, path, content_hash, title, author, url=None, download_url=None):
+        """把刚下载的文件纳入存储
+
+        内容已存在时删除该文件，只添加别名；否则移入对象目录（按配置压缩）。
+        未压缩时在原路径建立指向正文的硬链接。
+        返回 (是否为新内容, 可直接读取的文件路径)。
+        """
+        with self.lock:
+            object_path = self.find_object(content_hash)
+            is_new = object_path is None
+            if is_new:
+                object_path = self.object_path(content_hash)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                if self.compress:
+                    with open(path, 'rb') as src, gzip.open(object_path + '.tmp', 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    os.replace(object_path + '.tmp', object_path)
+                    os.remove(path)
+                else:
+                    os.replace(path, object_path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+        return is_new, self.add_alias(content_hash, title, author, url, download_url, path)
+
+    def add_alias(self, content_hash, title, author, url=None, download_url=None, alias_path=None):
+        """添加标题/作者别名，返回可直接读取的文件路径"""
+        object_path = self.find_object(content_hash)
+        readable_path = object_path
+        if alias_path and not object_path.endswith('.gz'):
+            if os.path.lexists(alias_path):
+                os.remove(alias_path)
+            try:
+                os.link(object_path, alias_path)
+            except OSError:
+                # 文件系统不支持硬链接时退化为复制
+                shutil.copyfile(object_path, alias_path)
+            readable_path = alias_path
+        else:
+            alias_path = None
+
+        with self.lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO aliases (title, author, content_hash, url, alias_path, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (title, author, content_hash, url, alias_path, time.time()))
+            if download_url:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO sources (download_url, content_hash) VALUES (?, ?)',
+                    (download_url, content_hash))
+        return readable_path
+
+    def lookup(self, title, author):
+        """按标题和作者查询内容哈希"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT content_hash FROM aliases WHERE title = ? AND author = ?',
+                (title, author)).fetchone()
+        return row['content_hash'] if row else None
+
+    def open_text(self, content_hash):
+        """以文本流方式打开正文，压缩存储时边读边解压"""
+        path = self.find_object(content_hash)
+        if path is None:
+            raise FileNotFoundError(f"内容不存在: {content_hash}")
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, 'r', encoding='utf-8')
+
+    def iter_chunks(self, content_hash, chunk_size=64 * 1024):
+        """按块读取正文文本"""
+        with self.open_text(content_hash) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def aliases(self):
+        """列出所有别名"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT * FROM aliases ORDER BY created_at').fetchall()
+        return [dict(row) for row in rows]
+
+    def gc(self):
+        """删除不再被任何别名引用的正文，返回删除数量"""
+        with self.lock:
+            referenced = {row['content_hash'] for row in
+                          self.conn.execute('SELECT DISTINCT content_hash FROM aliases')}
+            removed = 0
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for name in filenames:
+                    if not (name.endswith('.txt') or name.endswith('.txt.gz')):
+                        continue
+                    if name.split('.', 1)[0] not in referenced:
+                        os.remove(os.path.join(dirpath, name))
+                        removed += 1
+        return removed
+
+    def stats(self):
+        """存储统计：别名数、正文数与占用字节"""
+        objects = 0
+        stored_bytes = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                if name.endswith('.txt') or name.endswith('.txt.gz'):
+                    objects += 1
+                    stored_bytes += os.path.getsize(os.path.join(dirpath, name))
+        with self.lock:
+            aliases = self.conn.execute('SELECT COUNT(*) FROM aliases').fetchone()[0]
+        return {'aliases': aliases, 'objects': objects, 'stored_bytes': stored_bytes}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('list', 'cat'):
+        print(__doc__)
+        return 1
+
+    if sys.argv[1] == 'list':
+        store = NovelStore(sys.argv[2] if len(sys.argv) > 2 else 'novels')
+        for alias in store.aliases():
+            print(f"{alias['content_hash'][:12]}  {alias['title']} - {alias['author']}")
+        print(store.stats())
+        return 0
+
+    if len(sys.argv) < 4:
+        print(__doc__)
+        return 1
+    store = NovelStore(sys.argv[4] if len(sys.argv) > 4 else 'novels')
+    content_hash = store.lookup(sys.argv[2], sys.argv[3])
+    if content_hash is None:
+        print("未找到该小说")
+        return 1
+    for chunk in store.iter_chunks(content_hash):
+        sys.stdout.write(chunk)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
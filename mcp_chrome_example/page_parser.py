@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面解析后端
+同一组解析函数提供三种实现：
+- bs4:    BeautifulSoup + html.parser，构建完整文档树（原实现）
+- lxml:   基于C实现的lxml解析器，只遍历需要的节点
+- stream: 基于html.parser的流式提取器，不构建文档树，只跟踪目标节点
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+BACKENDS = ('bs4', 'lxml', 'stream')
+
+DOWNLOAD_CLASS_RE = re.compile(r'.*btn-dl.*|.*download.*', re.I)
+DOWNLOAD_TEXT_RE = re.compile(r'TXT下载', re.I)
+TXT_HREF_RE = re.compile(r'.*\.(txt|TXT).*')
+LIST_CLASS = 'txt-list txt-list-row5'
+
+# 页面类型，进程池任务按类型选择解析函数
+PAGE_LIST = 'list'
+PAGE_DETAIL = 'detail'
+PAGE_READ = 'read'
+
+# 没有结束标签的元素，流式提取器不入栈
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+
+def resolve_backend(backend='auto'):
+    """auto 优先使用lxml，未安装时回退到bs4"""
+    if backend == 'auto':
+        return 'lxml' if HAS_LXML else 'bs4'
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的解析后端: {backend}")
+    if backend == 'lxml' and not HAS_LXML:
+        raise ImportError("lxml未安装，请执行 pip install lxml")
+    return backend
+
+
+def parse_novel_list(html, backend='auto'):
+    """解析小说列表页面，返回 [{'title', 'author', 'url'}]"""
+    backend = resolve_backend(backend)
+    if not html.strip():
+        return []
+    if backend == 'lxml':
+        return _lxml_novel_list(html)
+    if backend == 'stream':
+        extractor = _ListPageExtractor()
+        extractor.feed(html)
+        extractor.close()
+        return extractor.featured + extractor.listed
+    return _bs4_novel_list(html)
+
+
+def find_download_hrefs(html, backend='auto'):
+    """查找详情页中的TXT下载链接，按文档顺序返回href（可能为None）"""
+    backend = resolve_backend(backend)
+    if not html.strip():
+        return []
+    if backend == 'lxml':
+        return _lxml_download_hrefs(html)
+    if backend == 'stream':
+        extractor = _AnchorExtractor()
+        extractor.feed(html)
+        extractor.close()
+        return extractor.class_hrefs or extractor.text_hrefs
+    return _bs4_download_hrefs(html)
+
+
+def find_txt_href(html, backend='auto'):
+    """查找阅读页中第一个指向txt文件的链接href，没有返回None"""
+    backend = resolve_backend(backend)
+    if not html.strip():
+        return None
+    if backend == 'lxml':
+        root = _lxml_root(html)
+        if root is None:
+            return None
+        for link in root.iter('a'):
+            href = link.get('href')
+            if href is not None and TXT_HREF_RE.search(href):
+                return href
+        return None
+    if backend == 'stream':
+        extractor = _AnchorExtractor()
+        extractor.feed(html)
+        extractor.close()
+        return extractor.txt_hrefs[0] if extractor.txt_hrefs else None
+    soup = BeautifulSoup(html, 'html.parser')
+    download_links = soup.find_all('a', href=TXT_HREF_RE)
+    return download_links[0].get('href') if download_links else None
+
+
+def parse_job(page_type, raw, encoding='gbk', backend='auto'):
+    """解析任务：解码原始HTML字节并解析，返回紧凑记录
+
+    - list:   [(title, author, url), ...]
+    - detail: [href, ...]
+    - read:   href 或 None
+    """
+    html = raw.decode(encoding, errors='replace')
+    if page_type == PAGE_LIST:
+        return [(novel['title'], novel['author'], novel['url'])
+                for novel in parse_novel_list(html, backend)]
+    if page_type == PAGE_DETAIL:
+        return find_download_hrefs(html, backend)
+    if page_type == PAGE_READ:
+        return find_txt_href(html, backend)
+    raise ValueError(f"未知的页面类型: {page_type}")
+
+
+class ParsePool:
+    """解析进程池
+
+    解析是CPU密集任务，放到子进程中执行，不阻塞抓取线程。
+    在途任务数超过 max_in_flight 时 submit 会阻塞，避免待解析页面无限堆积。
+    """
+
+    def __init__(self, workers=None, max_in_flight=None, backend='auto', encoding='gbk'):
+        # 与 ProcessPoolExecutor 的默认值相同：未指定时按CPU数
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.backend = resolve_backend(backend)
+        self.encoding = encoding
+
+    def submit(self, page_type, raw):
+        """提交解析任务，返回 Future"""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(parse_job, page_type, raw,
+                                          self.encoding, self.backend)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def parse(self, page_type, raw):
+        """提交并等待解析结果"""
+        return self.submit(page_type, raw).result()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+# ---------------------------------------------------------------- bs4
+
+def _bs4_novel_list(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    novels = []
+
+    # 解析推荐小说（顶部大图区域）
+    featured_items = soup.find_all('div', class_='item')
+    for item in featured_items:
+        try:
+            title_link = item.find('dt').find('a')
+            if title_link:
+                title = title_link.get_text().strip()
+                url = title_link.get('href')
+                author = item.find('dt').find('span').get_text().strip()
+
+                novels.append({
+                    'title': title,
+                    'author': author,
+                    'url': url
+                })
+        except Exception as e:
+            print(f"解析推荐小说出错: {e}")
+            continue
+
+    # 解析更新列表
+    list_items = soup.find('ul', class_=LIST_CLASS)
+    if list_items:
+        for li in list_items.find_all('li'):
+            try:
+                title_link = li.find('span', class_='s2').find('a')
+                author_span = li.find('span', class_='s4')
+
+                if title_link and author_span:
+                    title = title_link.get_text().strip()
+                    url = title_link.get('href')
+                    author = author_span.get_text().strip()
+
+                    novels.append({
+                        'title': title,
+                        'author': author,
+                        'url': url
+                    })
+            except Exception as e:
+                print(f"解析列表小说出错: {e}")
+                continue
+
+    return novels
+
+
+def _bs4_download_hrefs(html):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 查找TXT下载链接，使用更精确的选择器
+    download_links = soup.find_all('a', class_=DOWNLOAD_CLASS_RE)
+    if not download_links:
+        download_links = soup.find_all('a', string=DOWNLOAD_TEXT_RE)
+
+    return [link.get('href') for link in download_links]
+
+
+# ---------------------------------------------------------------- lxml
+
+def _normalize_class(value):
+    return ' '.join((value or '').split())
+
+
+def _has_class(element, name):
+    return name in (element.get('class') or '').split()
+
+
+def _first(element, tag, class_name=None):
+    """element 的第一个匹配后代，语义同 BeautifulSoup.find"""
+    for child in element.iterdescendants(tag):
+        if class_name is None or _has_class(child, class_name):
+            return child
+    return None
+
+
+def _lxml_root(html):
+    """解析文档；只有空白或注释等没有元素的文档lxml会报错，与其他后端一致地视为空页面"""
+    try:
+        return lxml.html.fromstring(html)
+    except etree.ParserError:
+        return None
+
+
+def _lxml_novel_list(html):
+    root = _lxml_root(html)
+    novels = []
+    if root is None:
+        return novels
+
+    for item in root.iter('div'):
+        if not _has_class(item, 'item'):
+            continue
+        dt = _first(item, 'dt')
+        title_link = _first(dt, 'a') if dt is not None else None
+        author_span = _first(dt, 'span') if dt is not None else None
+        if title_link is not None and author_span is not None:
+            novels.append({
+                'title': title_link.text_content().strip(),
+                'author': author_span.text_content().strip(),
+                'url': title_link.get('href')
+            })
+
+    for ul in root.iter('ul'):
+        if _normalize_class(ul.get('class')) != LIST_CLASS:
+            continue
+        for li in ul.iterdescendants('li'):
+            s2 = _first(li, 'span', 's2')
+            title_link = _first(s2, 'a') if s2 is not None else None
+            author_span = _first(li, 'span', 's4')
+            if title_link is not None and author_span is not None:
+                novels.append({
+                    'title': title_link.text_content().strip(),
+                    'author': author_span.text_content().strip(),
+                    'url': title_link.get('href')
+                })
+        break
+
+    return novels
+
+
+def _lxml_string(element):
+    """等价于 BeautifulSoup 的 Tag.string：只有唯一子节点时取其文本"""
+    children = list(element)
+    if not children:
+        return element.text
+    if len(children) == 1 and not element.text and not children[0].tail:
+        return _lxml_string(children[0])
+    return None
+
+
+def _lxml_download_hrefs(html):
+    root = _lxml_root(html)
+    if root is None:
+        return []
+    links = list(root.iter('a'))
+    hrefs = [link.get('href') for link in links
+             if DOWNLOAD_CLASS_RE.search(link.get('class') or '')]
+    if not hrefs:
+        for link in links:
+            string = _lxml_string(link)
+            if string is not None and DOWNLOAD_TEXT_RE.search(string):
+                hrefs.append(link.get('href'))
+    return hrefs
+
+
+# ---------------------------------------------------------------- stream
+
+class _StreamExtractor(HTMLParser):
+    """流式提取器基类：维护打开元素的栈，按深度通知元素闭合"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.captures = []  # 正在收集文本的元素 (深度, 文本片段列表)
+
+    def handle_starttag(self, tag, attrs):
+        depth = len(self.stack)
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+        self.on_start(tag, dict(attrs), depth)
+
+    def handle_startendtag(self, tag, attrs):
+        depth = len(self.stack)
+        self.on_start(tag, dict(attrs), depth)
+        self._end(depth)
+
+    def handle_endtag(self, tag):
+        # 容忍未闭合的标签：关闭到最近的同名元素为止
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index] == tag:
+                while len(self.stack) > index:
+                    self.stack.pop()
+                    self._end(len(self.stack))
+                return
+
+    def handle_data(self, data):
+        for _, parts in self.captures:
+            parts.append(data)
+        self.on_data(data)
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self.stack.pop()
+            self._end(len(self.stack))
+
+    def capture(self, depth):
+        parts = []
+        self.captures.append((depth, parts))
+        return parts
+
+    def _end(self, depth):
+        if self.captures:
+            self.captures = [c for c in self.captures if c[0] != depth]
+        self.on_end(depth)
+
+    def on_start(self, tag, attrs, depth):
+        pass
+
+    def on_end(self, depth):
+        pass
+
+    def on_data(self, data):
+        pass
+
+
+class _ListPageExtractor(_StreamExtractor):
+    """提取推荐区 div.item dt 与更新列表 ul.txt-list li 中的书名、作者和链接"""
+
+    def __init__(self):
+        super().__init__()
+        self.featured = []
+        self.listed = []
+        self.items = []
+        self.rows = []
+        self.ul_depth = None
+        self.ul_done = False
+        self.order = 0
+
+    def on_start(self, tag, attrs, depth):
+        classes = (attrs.get('class') or '').split()
+
+        if tag == 'div' and 'item' in classes:
+            self.order += 1
+            self.items.append({'depth': depth, 'order': self.order, 'dt': None,
+                               'dt_open': False, 'href': None, 'title': None, 'author': None})
+        for item in self.items:
+            if tag == 'dt' and item['dt'] is None:
+                item['dt'] = depth
+                item['dt_open'] = True
+            elif item['dt_open']:
+                if tag == 'a' and item['title'] is None:
+                    item['href'] = attrs.get('href')
+                    item['title'] = self.capture(depth)
+                elif tag == 'span' and item['author'] is None:
+                    item['author'] = self.capture(depth)
+
+        if (tag == 'ul' and self.ul_depth is None and not self.ul_done
+                and _normalize_class(attrs.get('class')) == LIST_CLASS):
+            self.ul_depth = depth
+        elif self.ul_depth is not None:
+            if tag == 'li':
+                self.order += 1
+                self.rows.append({'depth': depth, 'order': self.order, 's2': None,
+                                  's2_open': False, 'href': None, 'title': None, 'author': None})
+            for row in self.rows:
+                if tag == 'span' and 's2' in classes and row['s2'] is None:
+                    row['s2'] = depth
+                    row['s2_open'] = True
+                elif row['s2_open'] and tag == 'a' and row['title'] is None:
+                    row['href'] = attrs.get('href')
+                    row['title'] = self.capture(depth)
+                if tag == 'span' and 's4' in classes and row['author'] is None:
+                    row['author'] = self.capture(depth)
+
+    def on_end(self, depth):
+        for item in self.items:
+            if item['dt'] == depth:
+                item['dt_open'] = False
+        for row in self.rows:
+            if row['s2'] == depth:
+                row['s2_open'] = False
+
+        while self.items and self.items[-1]['depth'] >= depth:
+            self._emit(self.items.pop(), self.featured)
+        while self.rows and self.rows[-1]['depth'] >= depth:
+            self._emit(self.rows.pop(), self.listed)
+        if self.ul_depth is not None and self.ul_depth >= depth:
+            self.ul_depth = None
+            self.ul_done = True
+
+    def _emit(self, record, target):
+        if record['title'] is not None and record['author'] is not None:
+            target.append((record['order'], {
+                'title': ''.join(record['title']).strip(),
+                'author': ''.join(record['author']).strip(),
+                'url': record['href']
+            }))
+
+    def close(self):
+        super().close()
+        # 元素按闭合顺序收集，嵌套时恢复为与BeautifulSoup一致的文档顺序
+        self.featured = [novel for _, novel in sorted(self.featured, key=lambda x: x[0])]
+        self.listed = [novel for _, novel in sorted(self.listed, key=lambda x: x[0])]
+
+
+class _AnchorExtractor(_StreamExtractor):
+    """提取下载相关的a标签：按class匹配、按唯一文本匹配、按txt链接匹配"""
+
+    def __init__(self):
+        super().__init__()
+        self.class_hrefs = []
+        self.text_hrefs = []
+        self.txt_hrefs = []
+        self.frames = []  # a标签内各元素的子节点情况，用于计算唯一文本
+
+    def on_start(self, tag, attrs, depth):
+        if self.frames:
+            self._add_child(None)
+
+        if tag == 'a':
+            href = attrs.get('href')
+            if DOWNLOAD_CLASS_RE.search(attrs.get('class') or ''):
+                self.class_hrefs.append(href)
+            if href is not None and TXT_HREF_RE.search(href):
+                self.txt_hrefs.append(href)
+
+        if (tag == 'a' or self.frames) and tag not in VOID_TAGS:
+            self.frames.append({'tag': tag, 'depth': depth, 'href': attrs.get('href'),
+                                'children': 0, 'string': None, 'last_text': False})
+
+    def on_data(self, data):
+        if not self.frames:
+            return
+        frame = self.frames[-1]
+        if frame['last_text']:
+            frame['string'] += data
+        else:
+            self._add_child(data)
+
+    def _add_child(self, text):
+        frame = self.frames[-1]
+        frame['children'] += 1
+        frame['last_text'] = text is not None
+        frame['string'] = text
+
+    def on_end(self, depth):
+        while self.frames and self.frames[-1]['depth'] >= depth:
+            frame = self.frames.pop()
+            string = frame['string'] if frame['children'] == 1 else None
+            if frame['tag'] == 'a' and string is not None and DOWNLOAD_TEXT_RE.search(string):
+                self.text_hrefs.append(frame['href'])
+            if self.frames:
+                parent = self.frames[-1]
+                # 父元素唯一的子元素闭合后，父元素的唯一文本即子元素的唯一文本
+                if parent['children'] == 1 and not parent['last_text']:
+                    parent['string'] = string
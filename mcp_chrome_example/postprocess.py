@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载后处理
+可插拔的流式行处理管道：按块读取UTF-8正文，逐行经过各个处理步骤后写回原文件，
+每本书只读一遍、写一遍，内存占用只与块大小相关。爬虫中处理在进程池里进行，不阻塞下载
+
+内置步骤：
+    FullwidthToHalfwidth  全角字母数字转半角（可选连同全角标点）
+    StripAdLines          删除整行都是站点水印的行（默认管道中需要 strip_ads=True 才启用）
+    NormalizeWhitespace   去除首尾空白、统一段首缩进、合并连续空行
+    ChapterSplit          输出端步骤，写出正文的同时生成章节索引（见 chapter_index.py）
+
+用法：
+    python postprocess.py [--workers 4] [--strip-ads] <小说文件>...
+"""
+
+import argparse
+import codecs
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chapter_index
+
+
+class LineStep:
+    """逐行处理步骤：transform 返回处理后的行，返回None表示删除该行
+
+    需要跨行状态的步骤改写 process(lines, stats)，接收行的迭代器（不含换行符）并产出处理后的行。
+    删除的行计入 stats 的 <name>_dropped，前 max_logged 行原文记在 dropped 中，随处理结果返回，
+    便于发现误删。
+    """
+
+    name = 'step'
+    max_logged = 20
+
+    def start(self):
+        self.dropped = []
+
+    def drop(self, line, stats):
+        stats[f'{self.name}_dropped'] += 1
+        if len(self.dropped) < self.max_logged:
+            self.dropped.append(line)
+
+    def process(self, lines, stats):
+        transform = self.transform
+        for line in lines:
+            result = transform(line)
+            if result is None:
+                self.drop(line, stats)
+            else:
+                yield result
+
+    def transform(self, line):
+        return line
+
+
+class FullwidthToHalfwidth(LineStep):
+    """全角字母、数字转半角；punctuation 为True时全角标点与全角空格也一并转换
+
+    中文正文中的全角标点（，。！？：；）是正常排版，默认保留。
+    """
+
+    name = 'fullwidth'
+
+    def __init__(self, punctuation=False):
+        table = {}
+        for start, end in (('０', '９'), ('Ａ', 'Ｚ'), ('ａ', 'ｚ')):
+            for code in range(ord(start), ord(end) + 1):
+                table[code] = code - 0xFEE0
+        if punctuation:
+            for code in range(0xFF01, 0xFF5F):
+                table.setdefault(code, code - 0xFEE0)
+            table[0x3000] = ord(' ')
+        self.table = table
+
+    def transform(self, line):
+        return line.translate(self.table)
+
+
+# 盗版站水印行的完整形式，每条规则都与整行匹配（去掉首尾空白后），只出现在句子中间的“手机浏览”
+# “百度搜索”等词不会命中。域名中的点可能是全角或中文句号
+_PAD = r'[\s\W_]*'
+_DOMAIN = r'(?:www|wap|m)\s*[.．。]\s*[a-z0-9-]+\s*[.．。]\s*(?:com|net|org|cc|la|info|me|tw)'
+_PROMO = (r'(?:手机(?:用户)?请?(?:阅读|访问|浏览)|请记住本站(?:域名|网址)?|收藏本站|'
+          r'(?:最新|无弹窗|全文)(?:章节)?(?:免费)?(?:阅读|下载)?|免费阅读|阅读|TXT.{0,4}下载|首发|'
+          r'[^\s，。！？]{1,10}(?:网|小说网|书屋|文学))')
+AD_PATTERNS = [
+    # 域名，前后可以带推广语：“手机用户请浏览 m.xxx.com 阅读”“【www.xxx.com】无弹窗免费阅读”
+    rf'{_PAD}(?:{_PROMO}{_PAD})*{_DOMAIN}(?:{_PAD}{_PROMO})*{_PAD}',
+    # 不带域名的搜索引导：“百度搜索 XX小说网 即可找到本站”
+    rf'{_PAD}百度搜索{_PAD}.{{0,20}}(?:本站|最新章节|免费阅读|{_PROMO}){_PAD}(?:即可)?(?:找到|阅读)?.{{0,10}}',
+    # 打包水印：“本书由XX书屋整理”
+    rf'{_PAD}本书由.{{0,20}}(?:网|站|书屋|论坛|小说).{{0,6}}(?:整理|提供|上传|首发).{{0,20}}',
+]
+
+
+class StripAdLines(LineStep):
+    """删除整行与水印规则匹配的行；超过 max_length 字的正文段落不删除
+
+    删除的行数与前若干行原文在处理结果中（ads_dropped、dropped_lines），爬虫会打印出来。
+    """
+
+    name = 'ads'
+
+    def __init__(self, patterns=None, max_length=80):
+        self.pattern = re.compile('|'.join(f'(?:{p})' for p in (patterns or AD_PATTERNS)),
+                                  re.IGNORECASE)
+        self.max_length = max_length
+
+    def transform(self, line):
+        text = line.strip()
+        if text and len(text) <= self.max_length and self.pattern.fullmatch(text):
+            return None
+        return line
+
+
+class NormalizeWhitespace(LineStep):
+    """去除行首尾空白（含全角空格、不换行空格），正文段落统一加 indent 缩进，
+    章节标题不缩进；连续空行最多保留 max_blank_lines 行，文件开头的空行删除"""
+
+    name = 'whitespace'
+    STRIP = ' \t\r\u3000\xa0\ufeff'
+
+    def __init__(self, indent='　　', max_blank_lines=1):
+        self.indent = indent
+        self.max_blank_lines = max_blank_lines
+
+    def process(self, lines, stats):
+        strip = self.STRIP
+        heading = chapter_index.is_heading
+        blank_run = self.max_blank_lines  # 开头视为已有足够的空行
+        for line in lines:
+            text = line.strip(strip)
+            if not text:
+                blank_run += 1
+                if blank_run > self.max_blank_lines:
+                    stats[f'{self.name}_dropped'] += 1  # 多余的空行不记原文
+                    continue
+                yield ''
+                continue
+            blank_run = 0
+            if self.indent and not heading(text):
+                text = self.indent + text
+            yield text
+
+
+class ChapterSplit:
+    """输出端步骤：扫描写出的字节找出章节标题，处理完成后写入 <文件>.chapters，
+    不必为建立章节索引再读一遍正文"""
+
+    name = 'chapters'
+
+    def start(self):
+        self.indexer = chapter_index.ChapterIndexer()
+
+    def feed(self, data):
+        self.indexer.feed(data)
+
+    def finish(self, path, stats):
+        entries = self.indexer.close()
+        stat = os.stat(path)
+        chapter_index.write_index(chapter_index.index_path_for(path), entries,
+                                  stat.st_size, stat.st_mtime_ns)
+        stats['chapters'] = len(entries)
+
+
+class Pipeline:
+    """后处理管道：行处理步骤依次串联，输出端步骤（有 feed 方法）接收最终写出的字节
+
+    管道对象会被传到子进程执行，步骤需要可以pickle。
+    """
+
+    def __init__(self, steps, chunk_size=1024 * 1024, flush_lines=2048):
+        self.steps = [step for step in steps if not hasattr(step, 'feed')]
+        self.sinks = [step for step in steps if hasattr(step, 'feed')]
+        self.chunk_size = chunk_size
+        self.flush_lines = flush_lines
+
+    def run(self, path):
+        """处理一个UTF-8文件并原地替换，返回统计（含处理后内容的SHA-256）"""
+        started = time.perf_counter()
+        stats = Counter()
+        digest = hashlib.sha256()
+        for step in self.steps + self.sinks:
+            step.start()
+
+        temp_path = path + '.post'
+        try:
+            with open(path, 'rb') as src, open(temp_path, 'wb') as dst:
+                lines = self._read_lines(src, stats)
+                for step in self.steps:
+                    lines = step.process(lines, stats)
+
+                def flush(buffer):
+                    data = ('\n'.join(buffer) + '\n').encode('utf-8')
+                    digest.update(data)
+                    dst.write(data)
+                    for sink in self.sinks:
+                        sink.feed(data)
+                    stats['bytes_out'] += len(data)
+                    stats['lines_out'] += len(buffer)
+
+                buffer = []
+                for line in lines:
+                    buffer.append(line)
+                    if len(buffer) >= self.flush_lines:
+                        flush(buffer)
+                        buffer = []
+                if buffer:
+                    flush(buffer)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        for sink in self.sinks:
+            sink.finish(path, stats)
+        result = dict(stats)
+        result.update(path=path, content_hash=digest.hexdigest(),
+                      seconds=time.perf_counter() - started)
+        dropped = {step.name: step.dropped for step in self.steps if step.dropped}
+        if dropped:
+            result['dropped_lines'] = dropped
+        return result
+
+    def _read_lines(self, f, stats):
+        """按块解码并切分为行，只缓存最后一个不完整的行"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        tail = ''
+        while True:
+            chunk = f.read(self.chunk_size)
+            stats['bytes_in'] += len(chunk)
+            text = tail + decoder.decode(chunk, final=not chunk)
+            lines = text.split('\n')
+            tail = lines.pop()
+            stats['lines_in'] += len(lines)
+            yield from (line.rstrip('\r') for line in lines)
+            if not chunk:
+                break
+        if tail:
+            stats['lines_in'] += 1
+            yield tail.rstrip('\r')
+
+
+def default_pipeline(chapters=True, strip_ads=False):
+    """默认管道：全角转半角、整理空白，可选删除水印行、同时生成章节索引
+
+    删除水印行会改动正文，需要显式启用。
+    """
+    steps = [FullwidthToHalfwidth()]
+    if strip_ads:
+        steps.append(StripAdLines())
+    steps.append(NormalizeWhitespace())
+    if chapters:
+        steps.append(ChapterSplit())
+    return Pipeline(steps)
+
+
+def run_job(pipeline, path):
+    """子进程入口"""
+    return pipeline.run(path)
+
+
+class PostProcessPool:
+    """后处理进程池
+
+    在途任务数超过 max_in_flight 时 submit 会阻塞，下载速度快于处理速度时不会无限堆积。
+    """
+
+    def __init__(self, pipeline, workers=None, max_in_flight=None):
+        self.pipeline = pipeline
+        # 与 ProcessPoolExecutor 的默认值相同：未指定时按CPU数
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def submit(self, path):
+        """提交处理任务，返回 Future"""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(run_job, self.pipeline, path)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='小说正文后处理')
+    parser.add_argument('files', nargs='+', help='UTF-8小说文件')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认CPU核数）')
+    parser.add_argument('--no-chapters', action='store_true', help='不生成章节索引')
+    parser.add_argument('--strip-ads', action='store_true', help='删除整行的站点水印')
+    args = parser.parse_args()
+
+    pipeline = default_pipeline(chapters=not args.no_chapters, strip_ads=args.strip_ads)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_job, pipeline, path): path for path in args.files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"{futures[future]}: 处理出错 {e}")
+                continue
+            print(f"{result['path']}: {result['bytes_in']} -> {result['bytes_out']} 字节，"
+                  f"删除广告 {result.get('ads_dropped', 0)} 行、空行 {result.get('whitespace_dropped', 0)} 行，"
+                  f"{result.get('chapters', 0)} 章，{result['seconds']:.2f} 秒")
+            for line in result.get('dropped_lines', {}).get('ads', []):
+                print(f"    删除: {line}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应限速
+AIMD（加性增、乘性减）控制请求速率：服务器响应健康时逐步提速，
+遇到429/5xx、超时或延迟突增时成倍降速，并遵守 Retry-After
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """解析Retry-After头（秒数或HTTP日期），返回需要等待的秒数，无法解析返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateController:
+    """AIMD自适应限速器，线程安全
+
+    rate 为每秒请求数。每次成功响应 rate 增加 increase；
+    出现限流、服务器错误、超时或延迟超过均值的 latency_factor 倍时
+    rate 乘以 decrease。同一个请求间隔内只降速一次，避免并发请求
+    同时失败时速率被连续砍到最低。
+    """
+
+    def __init__(self, initial_rate=0.5, min_rate=0.05, max_rate=4.0,
+                 increase=0.05, decrease=0.5, latency_factor=3.0,
+                 max_retry_after=300, jitter=0.2):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.backoff_until = 0.0
+        self.last_decrease = 0.0
+        self.latency_ewma = None
+
+        self.requests = 0
+        self.successes = 0
+        self.waited_seconds = 0.0
+        self.backoffs = {'throttled': 0, 'server_error': 0, 'timeout': 0,
+                         'latency': 0, 'retry_after': 0}
+        self.events = deque(maxlen=100)
+
+    def wait(self):
+        """等到下一个允许发送请求的时刻，返回实际等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time, self.backoff_until)
+            interval = 1.0 / self.rate
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.next_time = start + interval
+            self.requests += 1
+            delay = start - now
+            self.waited_seconds += delay
+
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def on_response(self, status_code, latency, retry_after=None):
+        """根据响应状态码、延迟（秒）和Retry-After调整速率"""
+        with self.lock:
+            if status_code == 429 or status_code >= 500:
+                reason = 'throttled' if status_code == 429 else 'server_error'
+                self._decrease(reason, status_code)
+                if retry_after is not None:
+                    self._retry_after(retry_after)
+                return
+
+            spike = (self.latency_ewma is not None
+                     and latency > self.latency_ewma * self.latency_factor)
+            self.latency_ewma = (latency if self.latency_ewma is None
+                                 else self.latency_ewma * 0.8 + latency * 0.2)
+            if spike:
+                self._decrease('latency', round(latency, 3))
+            else:
+                self.successes += 1
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_timeout(self):
+        """请求超时或连接失败"""
+        with self.lock:
+            self._decrease('timeout')
+
+    def metrics(self):
+        """当前速率与降速事件统计"""
+        with self.lock:
+            return {
+                'rate': round(self.rate, 4),
+                'interval_seconds': round(1.0 / self.rate, 3),
+                'latency_ewma': round(self.latency_ewma, 4) if self.latency_ewma else None,
+                'requests': self.requests,
+                'successes': self.successes,
+                'waited_seconds': round(self.waited_seconds, 3),
+                'backoffs': dict(self.backoffs),
+                'recent_events': list(self.events)
+            }
+
+    def _decrease(self, reason, detail=None):
+        now = time.monotonic()
+        if now - self.last_decrease < 1.0 / self.rate:
+            return
+        self.last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.backoffs[reason] += 1
+        self.events.append({'time': time.time(), 'reason': reason,
+                            'detail': detail, 'rate': round(self.rate, 4)})
+
+    def _retry_after(self, seconds):
+        seconds = min(seconds, self.max_retry_after)
+        self.backoff_until = max(self.backoff_until, time.monotonic() + seconds)
+        self.backoffs['retry_after'] += 1
+        self.events.append({'time': time.time(), 'reason': 'retry_after',
+                            'detail': seconds, 'rate': round(self.rate, 4)})
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘HTTP响应缓存
+按内容哈希存储响应体，支持过期时间、按总大小淘汰和可选压缩
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """基于内容寻址的磁盘响应缓存
+
+    目录结构：
+        entries/<URL哈希>.json          URL对应的内容哈希、抓取时间、ETag等
+        blobs/<前两位>/<内容哈希>[.gz]   响应体，内容相同的页面只存一份
+
+    条目文件的修改时间即最近访问时间，淘汰时按此做LRU。
+    """
+
+    def __init__(self, cache_dir, ttl=6 * 3600, max_bytes=512 * 1024 * 1024, compress=True):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.lock = threading.Lock()
+
+        self.entries_dir = os.path.join(cache_dir, 'entries')
+        self.blobs_dir = os.path.join(cache_dir, 'blobs')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        self.total_bytes = sum(size for _, size in self._iter_blobs())
+
+    def get(self, url, ttl=None):
+        """读取缓存，未命中返回None
+
+        命中时返回包含 body、fresh、etag、last_modified、fetched_at 的字典，
+        fresh 表示是否仍在过期时间内。
+        """
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            body = self._read_blob(entry['content_hash'], entry.get('compressed', False))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # 记录访问时间
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        ttl = self.ttl if ttl is None else ttl
+        entry['body'] = body
+        entry['fresh'] = time.time() - entry['fetched_at'] < ttl
+        return entry
+
+    def put(self, url, body, headers=None):
+        """写入缓存"""
+        headers = headers or {}
+        content_hash = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(content_hash, self.compress)
+
+        with self.lock:
+            if not os.path.exists(blob_path):
+                data = gzip.compress(body) if self.compress else body
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                self._atomic_write(blob_path, data)
+                self.total_bytes += len(data)
+
+            entry = {
+                'url': url,
+                'content_hash': content_hash,
+                'compressed': self.compress,
+                'size': len(body),
+                'fetched_at': time.time(),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')
+            }
+            self._atomic_write(self._entry_path(url),
+                               json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def touch(self, url):
+        """条件请求返回304时刷新抓取时间"""
+        entry_path = self._entry_path(url)
+        with self.lock:
+            try:
+                with open(entry_path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return
+            entry['fetched_at'] = time.time()
+            self._atomic_write(entry_path, json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def stats(self):
+        """缓存统计信息"""
+        entries = sum(1 for name in os.listdir(self.entries_dir) if name.endswith('.json'))
+        return {'entries': entries, 'total_bytes': self.total_bytes, 'max_bytes': self.max_bytes}
+
+    def _evict(self):
+        """按最近访问时间淘汰条目，直到总大小降到上限的90%以下"""
+        target = self.max_bytes * 0.9
+        entries = []
+        referenced = {}
+        for name in os.listdir(self.entries_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.entries_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                atime = os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue
+            key = (entry['content_hash'], entry.get('compressed', False))
+            referenced[key] = referenced.get(key, 0) + 1
+            entries.append((atime, path, key))
+
+        entries.sort()
+        for _, path, key in entries:
+            if self.total_bytes <= target:
+                break
+            os.remove(path)
+            referenced[key] -= 1
+            if referenced[key] == 0:
+                blob_path = self._blob_path(*key)
+                try:
+                    self.total_bytes -= os.path.getsize(blob_path)
+                    os.remove(blob_path)
+                except OSError:
+                    pass
+
+        # 清理没有条目引用的响应体
+        for blob_path, size in list(self._iter_blobs()):
+            name = os.path.basename(blob_path)
+            key = (name[:-3], True) if name.endswith('.gz') else (name, False)
+            if not referenced.get(key):
+                os.remove(blob_path)
+                self.total_bytes -= size
+
+    def _read_blob(self, content_hash, compressed):
+        with open(self._blob_path(content_hash, compressed), 'rb') as f:
+            data = f.read()
+        return gzip.decompress(data) if compressed else data
+
+    def _iter_blobs(self):
+        for root, _, files in os.walk(self.blobs_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getsize(path)
+                except OSError:
+                    continue
+
+    def _entry_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.entries_dir, key + '.json')
+
+    def _blob_path(self, content_hash, compressed):
+        name = content_hash + ('.gz' if compressed else '')
+        return os.path.join(self.blobs_dir, content_hash[:2], name)
+
+    def _atomic_write(self, path, data):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
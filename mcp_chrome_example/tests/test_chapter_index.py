@@ -0,0 +1,41 @@
+import pytest
+
+from chapter_index import ChapterIndexer, ChapterReader, build_index, is_heading
+
+
+@pytest.mark.parametrize("line", [
+    "第一章 天命", "第一章天命", "第1章：开始", "　　第十二章", "第１２章 全角",
+    "第一节 初入江湖", "第三回 宴桃园", "第一卷：起点", "第一章 你好，世界", "尾声", "番外：后日谈",
+])
+def test_headings(line):
+    assert is_heading(line)
+
+
+@pytest.mark.parametrize("line", [
+    "第一节课", "第一节课，老师走进教室。", "第二部分的内容很多", "第五集合体",
+    "第三章节省下来的钱，他都存了起来", "尾声中，他们终于团聚了。", "第一章 他走了。", "第一章" + "长" * 60,
+])
+def test_body_lines(line):
+    assert not is_heading(line)
+
+
+def test_indexer_handles_lines_split_across_chunks():
+    text = "书名\n第一章 开始\n正文。\n第一节课很无聊。\n第二章 继续\n正文。\n".encode("utf-8")
+    indexer = ChapterIndexer()
+    for i in range(0, len(text), 5):
+        indexer.feed(text[i:i + 5])
+    entries = indexer.close()
+    assert [title for _, title in entries] == ["第一章 开始", "第二章 继续"]
+    assert [text[offset:].decode("utf-8").split("\n")[0] for offset, _ in entries] == [
+        "第一章 开始", "第二章 继续"]
+
+
+def test_reader_reads_chapters(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_text("简介\n第一章 开始\n甲。\n第二章 继续\n乙。\n", encoding="utf-8")
+    assert build_index(str(path)) == 2
+    with ChapterReader(str(path)) as reader:
+        assert reader.titles() == ["第一章 开始", "第二章 继续"]
+        assert reader.preface() == "简介\n"
+        assert reader.chapter(1) == "第二章 继续\n乙。\n"
+        assert reader.find("继续") == [1]
@@ -0,0 +1,22 @@
+from crawl_metrics import CrawlMetrics, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 0) == 1
+    assert percentile([1, 2, 3, 4], 25) == 1
+    assert percentile([1, 2, 3, 4], 75) == 3
+    # 秩不是整数时向上取整：round 会把1.2取成1、把2.5取成2
+    assert percentile(values, 12) == 2
+    assert percentile(values, 25) == 3
+    assert percentile([], 50) is None
+
+
+def test_record_request_sums_retries():
+    metrics = CrawlMetrics()
+    metrics.record_request('list', 'http://a/1', 503, 0.1)
+    metrics.record_request('list', 'http://a/1', 200, 0.1, retries=1)
+    assert metrics.retries['list'] == 1
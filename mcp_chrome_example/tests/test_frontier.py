@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from frontier import Frontier
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.db"), lease_seconds=60, max_attempts=2, retry_delay=0)
+    yield frontier
+    frontier.close()
+
+
+def expire(frontier, url):
+    with frontier.lock:
+        frontier.conn.execute("UPDATE items SET lease_until = ? WHERE url = ?", (time.time() - 1, url))
+
+
+def test_lease_complete_is_idempotent(frontier):
+    assert frontier.add("http://a/1", "book", {"title": "甲"})
+    assert not frontier.add("http://a/1", "book")
+    item = frontier.lease("w1")
+    assert (item["url"], item["payload"], item["attempts"]) == ("http://a/1", {"title": "甲"}, 1)
+    assert frontier.lease("w2") is None
+    assert frontier.complete("http://a/1", "w1")
+    assert not frontier.complete("http://a/1", "w2")
+    assert frontier.next_ready_in() is None
+
+
+def test_expired_lease_is_reclaimed(frontier):
+    frontier.add("http://a/1", "book")
+    frontier.lease("w1")
+    expire(frontier, "http://a/1")
+    item = frontier.lease("w2")
+    assert (item["url"], item["attempts"]) == ("http://a/1", 2)
+    assert not frontier.renew("http://a/1", "w1")
+    assert frontier.renew("http://a/1", "w2")
+
+
+def test_item_fails_after_max_reclaims(frontier):
+    frontier.add("http://a/1", "book")
+    for _ in range(2):
+        assert frontier.lease("w")["url"] == "http://a/1"
+        expire(frontier, "http://a/1")
+
+    assert frontier.lease("w") is None
+    assert frontier.counts() == {"book": {"failed": 1}}
+    assert frontier.reset_failed() == 1
+    assert frontier.lease("w")["attempts"] == 1
+
+
+def test_fail_requeues_until_max_attempts(frontier):
+    frontier.add("http://a/1", "book")
+    frontier.lease("w")
+    assert frontier.fail("http://a/1", "w")
+    frontier.lease("w")
+    assert frontier.fail("http://a/1", "w")
+    assert frontier.counts() == {"book": {"failed": 1}}
+
+
+def test_reserve_spaces_requests_per_host(frontier):
+    assert frontier.reserve("a", interval=10) == 0
+    assert frontier.reserve("a", interval=10) == pytest.approx(10, abs=0.5)
+    assert frontier.reserve("b", interval=10) == 0
@@ -0,0 +1,161 @@
+import os
+
+import pytest
+
+from fulltext_index import FulltextIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path))
+    yield index
+    index.close()
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_search_returns_byte_offset_and_snippet(tmp_path, index):
+    path = write(tmp_path / "a.txt", "第一章 开始\n少年走进了青云山，抬头望去。\n")
+    assert index.add(path) is True
+
+    hits = index.search("青云山")
+    assert len(hits) == 1
+    hit = hits[0]
+    assert hit["path"] == os.path.abspath(path)
+    data = (tmp_path / "a.txt").read_bytes()
+    assert data[hit["offset"]:].startswith("青云山".encode("utf-8"))
+    assert "青云山" in hit["snippet"]
+    assert index.search("紫云山") == []
+
+
+def test_candidates_are_verified_against_text(tmp_path, index):
+    # 二元组“青云”“云山”都出现，但不相邻组成短语
+    write(tmp_path / "a.txt", "青云直上，云山雾罩")
+    index.update(str(tmp_path))
+    assert index.search("青云山") == []
+
+
+def test_phrase_needs_two_characters(tmp_path, index):
+    write(tmp_path / "a.txt", "青云山")
+    index.update(str(tmp_path))
+    with pytest.raises(ValueError):
+        index.search("青")
+    assert index.search("   ") == []
+
+
+def test_same_content_is_indexed_once(tmp_path, index):
+    first = write(tmp_path / "a.txt", "同一本书的内容")
+    second = write(tmp_path / "b.txt", "同一本书的内容")
+    assert index.add(first) is True
+    assert index.add(second) is False
+
+    hits = index.search("一本书")
+    assert len(hits) == 1
+    assert hits[0]["paths"] == sorted([os.path.abspath(first), os.path.abspath(second)])
+    assert index.stats()["docs"] == 1
+
+
+def test_remove_and_restore(tmp_path, index):
+    path = write(tmp_path / "a.txt", "御剑飞行")
+    index.add(path)
+    assert index.remove(path) is True
+    assert index.search("御剑") == []
+    assert index.remove(path) is False
+
+    index.add(path)
+    assert len(index.search("御剑")) == 1
+
+
+def test_update_syncs_directory(tmp_path, index):
+    write(tmp_path / "a.txt", "甲书内容")
+    write(tmp_path / "b.txt", "乙书内容")
+    assert index.update(str(tmp_path)) == {"added": 2, "removed": 0}
+
+    os.remove(tmp_path / "a.txt")
+    write(tmp_path / "c.txt", "丙书内容")
+    assert index.update(str(tmp_path)) == {"added": 1, "removed": 1}
+    assert index.search("甲书") == []
+    assert len(index.search("丙书")) == 1
+
+
+def test_merge_drops_deleted_documents(tmp_path, index):
+    paths = [write(tmp_path / f"{i}.txt", f"第{i}本书：仙侠故事{i}") for i in range(3)]
+    for path in paths:
+        index.add(path)
+        index.commit()
+    assert index.stats()["segments"] == 3
+
+    index.remove(paths[0])
+    index.merge()
+    stats = index.stats()
+    assert stats["segments"] == 1
+    assert stats["docs"] == 2
+    assert sorted(hit["path"] for hit in index.search("仙侠故事")) == sorted(
+        os.path.abspath(path) for path in paths[1:])
+
+
+def test_commit_merges_when_too_many_segments(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path), max_segments=2)
+    try:
+        for i in range(4):
+            index.add(write(tmp_path / f"{i}.txt", f"内容{i}号"))
+            index.commit()
+            assert index.stats()["segments"] <= 2
+        assert len(index.search("内容")) == 4
+    finally:
+        index.close()
+
+
+def test_phrase_across_read_chunks(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path), chunk_size=4)
+    try:
+        path = write(tmp_path / "a.txt", "一二三四五六七八九十")
+        index.add(path)
+        assert [hit["offset"] for hit in index.search("四五六")] == [9]
+    finally:
+        index.close()
+
+
+def test_reopen_reads_committed_segments(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path))
+    index.add(write(tmp_path / "a.txt", "持久化的索引"))
+    index.close()
+
+    reopened = FulltextIndex.for_novels(str(tmp_path))
+    try:
+        assert len(reopened.search("索引")) == 1
+    finally:
+        reopened.close()
+
+
+def test_offsets_survive_invalid_utf8(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path), chunk_size=5)
+    try:
+        path = tmp_path / "a.txt"
+        data = "开头".encode("utf-8") + b"\xff\xfe\xe4" + "少年走进青云山".encode("utf-8")
+        path.write_bytes(data)
+        index.add(str(path))
+        hits = index.search("青云山")
+        assert [hit["offset"] for hit in hits] == [data.index("青云山".encode("utf-8"))]
+    finally:
+        index.close()
+
+
+def test_merge_keeps_postings_of_shared_terms(tmp_path):
+    index = FulltextIndex.for_novels(str(tmp_path))
+    try:
+        texts = ["青云山下", "上青云山", "无关内容", "青云山青云山"]
+        paths = [write(tmp_path / f"{i}.txt", text) for i, text in enumerate(texts)]
+        for path in paths:
+            index.add(path)
+            index.commit()
+        index.remove(paths[1])
+        index.merge()
+        hits = sorted((os.path.basename(hit["path"]), hit["offset"]) for hit in index.search("青云山"))
+        assert hits == [("0.txt", 0), ("3.txt", 0), ("3.txt", 9)]
+        assert index.search("上青") == []
+    finally:
+        index.close()
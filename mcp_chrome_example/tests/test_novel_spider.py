@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import novel_spider
+from fixture_site import DOWNLOAD_PATH, FixtureSite
+from novel_spider import NovelSpider
+
+
+@pytest.fixture
+def site():
+    site = FixtureSite(books=1, txt_size=64 * 1024)
+    site.start()
+    yield site
+    site.stop()
+
+
+@pytest.fixture
+def spider(site, tmp_path):
+    spider = NovelSpider(site.url, str(tmp_path / "novels"))
+    spider.request_delay = spider.page_delay = spider.download_delay = (0, 0)
+    spider.retry_delay = (0, 0)
+    yield spider
+    spider.close()
+
+
+def test_range_resume_with_different_worker_count(site, spider, tmp_path, monkeypatch):
+    url = f"{site.url}{DOWNLOAD_PATH}?id={site.first_id}"
+    body = site.txt(site.first_id)
+    raw_path = str(tmp_path / "book.download")
+    total, validator = spider._probe_range_support(url, {})
+    assert total == len(body)
+
+    # 第一次运行只完成第一段
+    fetch_range = spider._fetch_range
+    monkeypatch.setattr(spider, '_fetch_range',
+                        lambda url, path, start, *args: start == 0 and fetch_range(url, path, start, *args))
+    spider.range_workers = 4
+    assert not spider.download_ranges(url, raw_path, total, validator)
+    assert spider._load_download_meta(raw_path)['done'] == [0]
+
+    # 换成3个连接继续：旧的分段记录对应不上新分段，应从头下载而不是跳过第一段
+    monkeypatch.setattr(spider, '_fetch_range', fetch_range)
+    spider.range_workers = 3
+    assert spider.download_ranges(url, raw_path, total, validator)
+    with open(raw_path, 'rb') as f:
+        assert f.read() == body
+    meta = spider._load_download_meta(raw_path)
+    assert (meta['segment_size'], len(meta['done'])) == (-(-total // 3), 3)
+
+
+def test_retries_are_counted_once_per_page(spider, site):
+    site.error_rate = 1.0
+    assert spider.fetch_page_bytes(f"{site.url}/xuanhuanxiaoshuo/", retries=3, stage='list') is None
+    assert spider.metrics.retries['list'] == 2
+    assert spider.metrics.status_counts['list']['503'] == 3
+
+
+def test_lazy_resources_are_created_once(spider, monkeypatch):
+    created = []
+    original = novel_spider.CrawlState
+
+    def slow_state(*args):
+        created.append(args)
+        time.sleep(0.05)  # 拉长创建过程，让并发访问都落在检查与赋值之间
+        return original(*args)
+
+    monkeypatch.setattr(novel_spider, 'CrawlState', slow_state)
+    states = []
+    threads = [threading.Thread(target=lambda: states.append(spider.state)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(state is states[0] for state in states)
+
+
+def test_download_dir_is_a_constructor_parameter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    download_dir = str(tmp_path / "books")
+    spider = NovelSpider("http://127.0.0.1:9", download_dir)
+    try:
+        assert not (tmp_path / "novels").exists()
+        assert (tmp_path / "books").is_dir()
+        assert spider.state_db == str(tmp_path / "books" / "crawl_state.db")
+    finally:
+        spider.close()
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import page_parser
+from page_parser import BACKENDS, find_download_hrefs, find_txt_href, parse_job, parse_novel_list
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+backends = [backend for backend in BACKENDS if backend != 'lxml' or page_parser.HAS_LXML]
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('html', ['', '  \r\n\t', '<!-- 空页面 -->'])
+def test_empty_pages_parse_to_nothing(backend, html):
+    assert parse_novel_list(html, backend) == []
+    assert find_download_hrefs(html, backend) == []
+    assert find_txt_href(html, backend) is None
+    assert parse_job(page_parser.PAGE_LIST, html.encode('gbk'), backend=backend) == []
+
+
+@pytest.mark.parametrize('page_type, name', [
+    (page_parser.PAGE_LIST, 'list_page.html'),
+    (page_parser.PAGE_DETAIL, 'detail_page.html'),
+    (page_parser.PAGE_DETAIL, 'detail_page_text_link.html'),
+    (page_parser.PAGE_READ, 'read_page.html'),
+])
+def test_backends_agree_on_fixtures(page_type, name):
+    raw = fixture(name)
+    results = {backend: parse_job(page_type, raw, 'utf-8', backend) for backend in backends}
+    expected = results['bs4']
+    assert expected
+    assert all(result == expected for result in results.values()), results
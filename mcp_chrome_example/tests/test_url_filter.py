@@ -0,0 +1,84 @@
+import pytest
+
+from url_filter import ScalableBloomFilter
+
+
+@pytest.fixture
+def filled():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.001)
+    for i in range(1000):
+        bloom.add(f"https://example.com/book/{i}")
+    bloom.watermark = 1000
+    return bloom
+
+
+def test_add_reports_new_keys():
+    bloom = ScalableBloomFilter(initial_capacity=10)
+    assert bloom.add("a") is True
+    assert bloom.add("a") is False
+    assert "a" in bloom
+    assert "b" not in bloom
+    assert len(bloom) == 1
+
+
+def test_grows_beyond_initial_capacity(filled):
+    assert len(filled.filters) > 1
+    assert all(f"https://example.com/book/{i}" in filled for i in range(1000))
+    false_positives = sum(f"https://example.com/other/{i}" in filled for i in range(10000))
+    assert false_positives < 30
+
+
+def test_save_and_load_round_trip(tmp_path, filled):
+    path = str(tmp_path / "seen.bloom")
+    filled.save(path)
+    assert not filled.dirty
+
+    loaded = ScalableBloomFilter.load(path)
+    assert loaded.watermark == 1000
+    assert len(loaded) == len(filled)
+    assert len(loaded.filters) == len(filled.filters)
+    assert all(f"https://example.com/book/{i}" in loaded for i in range(1000))
+    assert loaded.stats()["estimated_error_rate"] == filled.stats()["estimated_error_rate"]
+
+
+def test_loaded_filter_keeps_growing(tmp_path, filled):
+    path = str(tmp_path / "seen.bloom")
+    filled.save(path)
+    loaded = ScalableBloomFilter.load(path)
+    assert loaded.add("https://example.com/new") is True
+    assert loaded.add("https://example.com/book/1") is False
+
+
+@pytest.mark.parametrize("keep", [0, 10, 40, 60, -5])
+def test_truncated_file_raises_value_error(tmp_path, filled, keep):
+    path = tmp_path / "seen.bloom"
+    filled.save(str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:keep])
+    with pytest.raises(ValueError):
+        ScalableBloomFilter.load(str(path))
+
+
+def test_bad_magic_raises_value_error(tmp_path, filled):
+    path = tmp_path / "seen.bloom"
+    filled.save(str(path))
+    path.write_bytes(b"XXXX" + path.read_bytes()[4:])
+    with pytest.raises(ValueError):
+        ScalableBloomFilter.load(str(path))
+
+
+def test_open_rebuilds_corrupt_file_from_scratch(tmp_path, filled, capsys):
+    path = tmp_path / "seen.bloom"
+    filled.save(str(path))
+    path.write_bytes(path.read_bytes()[:60])
+
+    bloom = ScalableBloomFilter.open(str(path))
+    assert len(bloom) == 0
+    assert bloom.watermark == 0  # 调用方据此从状态库重新加入全部URL
+    assert "重新建立" in capsys.readouterr().out
+
+
+def test_open_missing_file_creates_empty_filter(tmp_path):
+    bloom = ScalableBloomFilter.open(str(tmp_path / "missing.bloom"), initial_capacity=10)
+    assert len(bloom) == 0
+    assert bloom.initial_capacity == 10
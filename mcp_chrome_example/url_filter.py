@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+URL去重过滤器
+可扩展的布隆过滤器：容量用满时追加一个更大、误判率更低的子过滤器，总误判率保持在设定值以内；
+每个URL只占用2~3字节，可以保存到文件并在下次运行时加载。
+判断结果为“不存在”时一定没有见过；为“可能存在”时需要再用精确数据（爬取状态库）确认
+
+用法：
+    python url_filter.py stats [过滤器文件]
+"""
+
+import hashlib
+import math
+import os
+import struct
+import sys
+import threading
+
+MAGIC = b'SBLM'
+VERSION = 1
+HEADER = struct.Struct('<4sBdddQI')     # 魔数、版本、目标误判率、增长倍数、收紧比例、同步位置、子过滤器数
+FILTER_HEADER = struct.Struct('<QQIQ')  # 位数、容量、哈希函数个数、已加入数量
+
+
+class BloomFilter:
+    """固定容量的布隆过滤器，使用双重哈希生成 k 个位置"""
+
+    def __init__(self, capacity, error_rate, bits=None, hashes=None, count=0, data=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # 最优位数 m = -n·ln(p) / (ln2)^2，最优哈希数 k = m/n·ln2
+        self.bits = bits or max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = hashes or max(1, int(round(self.bits / capacity * math.log(2))))
+        self.count = count
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    def contains(self, h1, h2):
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % bits
+            if not data[p >> 3] & (1 << (p & 7)):
+                return False  # 不存在的键通常在前一两个位置就能确定
+        return True
+
+    def add(self, h1, h2):
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % bits
+            data[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+def _hash(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1, h2 = struct.unpack('<QQ', digest)
+    return h1, h2 | 1  # 第二个哈希为奇数，保证 k 个位置各不相同
+
+
+class ScalableBloomFilter:
+    """可扩展布隆过滤器，线程安全
+
+    第 i 个子过滤器的容量为 initial_capacity·growth^i，误判率为 error_rate·(1-ratio)·ratio^i，
+    各子过滤器误判率之和不超过 error_rate。
+    """
+
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=2.0, ratio=0.85):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.ratio = ratio
+        self.filters = []
+        self.watermark = 0  # 调用方记录的同步位置（例如已加入的状态库最大rowid），随文件保存
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def _new_filter(self):
+        i = len(self.filters)
+        capacity = int(self.initial_capacity * self.growth ** i)
+        error_rate = self.error_rate * (1 - self.ratio) * self.ratio ** i
+        self.filters.append(BloomFilter(capacity, error_rate))
+        return self.filters[-1]
+
+    def __contains__(self, key):
+        h1, h2 = _hash(key)
+        with self.lock:
+            return any(f.contains(h1, h2) for f in self.filters)
+
+    def add(self, key):
+        """加入一个键，返回它是否为新键（之前一定没有加入过）"""
+        h1, h2 = _hash(key)
+        with self.lock:
+            if any(f.contains(h1, h2) for f in self.filters):
+                return False
+            current = self.filters[-1] if self.filters else None
+            if current is None or current.full:
+                current = self._new_filter()
+            current.add(h1, h2)
+            self.dirty = True
+            return True
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    def stats(self):
+        with self.lock:
+            size = sum(len(f.data) for f in self.filters)
+            count = sum(f.count for f in self.filters)
+            # 实际误判率估计：1 - Π(1 - 各子过滤器当前填充率^k)
+            miss = 1.0
+            for f in self.filters:
+                miss *= 1 - (1 - math.exp(-f.hashes * f.count / f.bits)) ** f.hashes
+            return {
+                'count': count,
+                'filters': len(self.filters),
+                'bytes': size,
+                'bytes_per_key': round(size / count, 2) if count else None,
+                'estimated_error_rate': round(1 - miss, 6),
+                'watermark': self.watermark
+            }
+
+    def save(self, path):
+        """保存到文件（先写临时文件再替换）"""
+        with self.lock:
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.error_rate, self.growth,
+                                    self.ratio, self.watermark, len(self.filters)))
+                for bloom in self.filters:
+                    f.write(FILTER_HEADER.pack(bloom.bits, bloom.capacity, bloom.hashes, bloom.count))
+                    f.write(bloom.data)
+            os.replace(temp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path, initial_capacity=100000):
+        """从文件加载；文件被截断或内容无效时抛出 ValueError"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"不是有效的过滤器文件: {path}")
+            magic, version, error_rate, growth, ratio, watermark, count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不是有效的过滤器文件: {path}")
+            instance = cls(initial_capacity, error_rate, growth, ratio)
+            instance.watermark = watermark
+            for i in range(count):
+                filter_header = f.read(FILTER_HEADER.size)
+                if len(filter_header) < FILTER_HEADER.size:
+                    raise ValueError(f"过滤器文件不完整: {path}")
+                bits, capacity, hashes, added = FILTER_HEADER.unpack(filter_header)
+                data = bytearray(f.read((bits + 7) // 8))
+                if len(data) != (bits + 7) // 8 or not bits or not hashes:
+                    raise ValueError(f"过滤器文件不完整: {path}")
+                instance.filters.append(BloomFilter(
+                    capacity, error_rate * (1 - ratio) * ratio ** i,
+                    bits=bits, hashes=hashes, count=added, data=data))
+        if instance.filters:
+            instance.initial_capacity = instance.filters[0].capacity
+        return instance
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """文件存在时加载，否则新建
+        
+        文件损坏（如写入时断电）时也新建：同步位置为0，调用方会从精确数据重新加入全部URL。
+        """
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except ValueError as e:
+                print(f"URL过滤器文件无法加载，重新建立: {e}")
+        return cls(**kwargs)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'stats':
+        print(__doc__)
+        return 1
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join('novels', 'seen_urls.bloom')
+    print(ScalableBloomFilter.load(path).stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())